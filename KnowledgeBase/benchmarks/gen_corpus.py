@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库合成语料生成工具
+
+以现有Docs目录下的UGUI文档为模板，生成任意规模的Markdown语料，用于测试搜索和启动耗时
+随文档数量增长的变化。生成的文档包含中英文混合的段落、csharp代码块、mermaid图表和多级标题，
+并按“团队”分为多个分类目录，同时生成与之匹配的知识库索引.md。
+
+用法:
+    python gen_corpus.py --out /tmp/kb-corpus --docs 20000 --teams 40
+    DOCS_DIR=/tmp/kb-corpus python ../core/mcp_server.py
+"""
+
+import os
+import re
+import sys
+import json
+import random
+import argparse
+
+# 目录配置
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+TEMPLATE_DIR = os.path.join(ROOT_DIR, 'Docs')
+INDEX_NAME = '知识库索引.md'
+
+# 团队与主题，用于生成分类目录和文档名称
+TEAM_GENRES = ['RPG', 'SLG', 'MOBA', 'Card', 'Puzzle', 'Racing', 'Shooter', 'Idle', 'Sandbox', 'Rhythm']
+TOPICS = [
+    '布局优化', 'Canvas重建', '事件系统', '合批分析', '动画方案', '列表复用', '图集管理', '字体渲染',
+    '遮罩裁剪', '输入处理', '界面框架', '资源加载', '红点系统', '新手引导', 'Architecture', 'Performance',
+]
+
+# UGUI类型与方法，用于生成段落和代码
+UGUI_TYPES = [
+    'Canvas', 'CanvasScaler', 'CanvasRenderer', 'Graphic', 'MaskableGraphic', 'Image', 'RawImage', 'Text',
+    'RectTransform', 'RectMask2D', 'Mask', 'LayoutRebuilder', 'LayoutGroup', 'ContentSizeFitter',
+    'CanvasUpdateRegistry', 'GraphicRaycaster', 'EventSystem', 'StandaloneInputModule', 'Selectable',
+    'Button', 'ScrollRect', 'VertexHelper', 'CanvasGroup', 'GraphicRegistry', 'ClipperRegistry',
+]
+UGUI_METHODS = [
+    'SetVerticesDirty', 'SetMaterialDirty', 'SetLayoutDirty', 'Rebuild', 'OnPopulateMesh', 'MarkLayoutForRebuild',
+    'RegisterCanvasElementForLayoutRebuild', 'PerformUpdate', 'Raycast', 'OnPointerClick', 'OnDrag',
+    'UpdateGeometry', 'UpdateMaterial', 'CalculateLayoutInputHorizontal', 'SetLayoutHorizontal', 'Cull',
+]
+SENTENCE_TEMPLATES = [
+    '在{team}项目中，我们通过`{type}.{method}`来控制{topic}的触发时机。',
+    '{type}在每帧的`{method}`阶段会检查脏标记，频繁修改会导致{topic}开销上升。',
+    'When {type} is marked dirty, `{method}` is queued until the next canvas update, which affects {topic}.',
+    '实践中建议把静态元素和动态元素拆分到不同的{type}下，避免一次`{method}`影响整个界面。',
+    '{team}团队的经验是：先用Profiler定位`{method}`的调用次数，再决定是否需要调整{topic}。',
+    'Avoid calling `{method}` on {type} inside Update; batch the changes and apply them once per frame.',
+    '{topic}相关的问题通常出现在{type}层级较深、子节点较多的界面中。',
+    '对于{topic}，{team}使用对象池复用{type}，显著减少了GC Alloc。',
+]
+
+
+def load_templates(template_dir):
+    """从模板文档中提取标题、段落、csharp代码块和mermaid图表"""
+    pools = {'headings': [], 'paragraphs': [], 'csharp': [], 'mermaid': []}
+    fence_pattern = re.compile(r'^```(\w*)\s*$')
+    for dir_path, _, file_names in os.walk(template_dir):
+        for file_name in sorted(file_names):
+            if not file_name.endswith('.md'):
+                continue
+            with open(os.path.join(dir_path, file_name), 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+
+            fence_lang, fence_lines = None, []
+            for line in lines:
+                match = fence_pattern.match(line.strip())
+                if fence_lang is not None:
+                    if match and not match.group(1):
+                        if fence_lang in ('csharp', 'mermaid') and fence_lines:
+                            pools[fence_lang].append('\n'.join(fence_lines))
+                        fence_lang = None
+                    else:
+                        fence_lines.append(line)
+                elif match:
+                    fence_lang, fence_lines = match.group(1) or 'text', []
+                elif line.startswith('## ') or line.startswith('### '):
+                    # 去掉原有的编号，例如“## 2. 重建时序图”
+                    heading = re.sub(r'^#+\s*[\d.]*\s*', '', line).strip()
+                    if heading:
+                        pools['headings'].append(heading)
+                elif len(line.strip()) > 20 and not re.match(r'^\s*([#|>*-]|\d+\.)', line):
+                    pools['paragraphs'].append(line.strip())
+    return pools
+
+
+class CorpusGenerator:
+    """按模板生成合成文档"""
+
+    def __init__(self, pools, seed=0, sections=(4, 10)):
+        self.pools = pools
+        self.random = random.Random(seed)
+        self.sections = sections
+
+    def sentence(self, team, topic):
+        template = self.random.choice(SENTENCE_TEMPLATES)
+        return template.format(
+            team=team,
+            topic=topic,
+            type=self.random.choice(UGUI_TYPES),
+            method=self.random.choice(UGUI_METHODS),
+        )
+
+    def paragraph(self, team, topic):
+        parts = [self.sentence(team, topic) for _ in range(self.random.randint(1, 3))]
+        if self.pools['paragraphs'] and self.random.random() < 0.6:
+            parts.insert(self.random.randint(0, len(parts)), self.random.choice(self.pools['paragraphs']))
+        # 英文句子之间补充空格，中文句子直接连接
+        return ''.join(
+            part + (' ' if part.endswith(('.', ';', ':')) else '') for part in parts
+        ).strip()
+
+    def code_block(self, team):
+        if self.pools['csharp'] and self.random.random() < 0.7:
+            code = self.random.choice(self.pools['csharp'])
+            # 让部分类名带上团队前缀，模拟各团队自己的扩展代码
+            code = re.sub(r'\bclass (\w+)', lambda m: f'class {team}{m.group(1)}', code)
+        else:
+            type_name = self.random.choice(UGUI_TYPES)
+            method = self.random.choice(UGUI_METHODS)
+            code = (
+                f'public class {team}{type_name}Helper : MonoBehaviour\n'
+                '{\n'
+                f'    public {type_name} target;\n\n'
+                f'    public void Refresh()\n'
+                '    {\n'
+                f'        target.{method}();\n'
+                '    }\n'
+                '}'
+            )
+        return f'```csharp\n{code}\n```'
+
+    def mermaid_block(self):
+        if self.pools['mermaid'] and self.random.random() < 0.7:
+            return f"```mermaid\n{self.random.choice(self.pools['mermaid'])}\n```"
+        nodes = self.random.sample(UGUI_TYPES, 4)
+        edges = '\n'.join(f'    {a} --> {b}' for a, b in zip(nodes, nodes[1:]))
+        return f'```mermaid\ngraph TD\n{edges}\n```'
+
+    def heading(self, topic):
+        if self.pools['headings'] and self.random.random() < 0.7:
+            return self.random.choice(self.pools['headings'])
+        return f'{topic}：{self.random.choice(UGUI_TYPES)}'
+
+    def document(self, team, topic, title):
+        """生成一篇文档的Markdown内容"""
+        blocks = [f'# {title}', self.paragraph(team, topic)]
+        for index in range(1, self.random.randint(*self.sections) + 1):
+            blocks.append(f'## {index}. {self.heading(topic)}')
+            for _ in range(self.random.randint(1, 3)):
+                blocks.append(self.paragraph(team, topic))
+            roll = self.random.random()
+            if roll < 0.45:
+                blocks.append(self.code_block(team))
+            elif roll < 0.6:
+                blocks.append(self.mermaid_block())
+            if self.random.random() < 0.3:
+                blocks.append(f'### {index}.1 {self.heading(topic)}')
+                items = [f'- {self.sentence(team, topic)}' for _ in range(self.random.randint(2, 4))]
+                blocks.append('\n'.join(items))
+        return '\n\n'.join(blocks) + '\n'
+
+
+def team_names(count):
+    """生成团队（分类）名称"""
+    return [f'Team{index:03d}{TEAM_GENRES[index % len(TEAM_GENRES)]}' for index in range(count)]
+
+
+def write_index(out_dir, catalog):
+    """生成与语料匹配的知识库索引.md，格式与KnowledgeBase/docs/知识库索引.md一致"""
+    lines = [
+        '# UGUI知识库索引',
+        '',
+        '## 知识库概述',
+        '',
+        '本知识库由gen_corpus.py合成，用于测试搜索和启动耗时随文档规模的变化。',
+        '',
+        '## 知识分类',
+        '',
+    ]
+    for number, (team, docs) in enumerate(catalog.items(), 1):
+        lines += [
+            f'### {number}. {team}',
+            '',
+            '| 文档ID | 文档名称 | 文档路径 |',
+            '| ------ | ------ | ------ |',
+        ]
+        for doc_id, title, file_name in docs:
+            lines.append(f'| {doc_id} | {title} | [{file_name}](../Docs/{team}/{file_name}) |')
+        lines.append('')
+    with open(os.path.join(out_dir, INDEX_NAME), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+
+def generate_corpus(out_dir, docs, teams, seed=0, template_dir=TEMPLATE_DIR, sections=(4, 10)):
+    """生成语料，返回语料统计信息"""
+    pools = load_templates(template_dir)
+    generator = CorpusGenerator(pools, seed=seed, sections=sections)
+    names = team_names(teams)
+
+    catalog = {team: [] for team in names}
+    total_bytes = 0
+    for index in range(docs):
+        team = names[index % teams]
+        topic = generator.random.choice(TOPICS)
+        serial = index // teams
+        file_name = f'{team}_{topic}_{serial:05d}.md'
+        title = f'{team} {topic} #{serial}'
+        content = generator.document(team, topic, title).encode('utf-8')
+
+        team_dir = os.path.join(out_dir, team)
+        os.makedirs(team_dir, exist_ok=True)
+        with open(os.path.join(team_dir, file_name), 'wb') as f:
+            f.write(content)
+        total_bytes += len(content)
+        catalog[team].append((f'{team.lower()}_{serial:05d}', title, file_name))
+
+    write_index(out_dir, catalog)
+    stats = {
+        'docs': docs,
+        'teams': teams,
+        'seed': seed,
+        'total_bytes': total_bytes,
+        'template_dir': os.path.abspath(template_dir),
+    }
+    with open(os.path.join(out_dir, 'corpus.json'), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+    return stats
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='UGUI知识库合成语料生成工具')
+    parser.add_argument('--out', required=True, help='输出目录（作为DOCS_DIR使用）')
+    parser.add_argument('--docs', type=int, default=1000, help='文档数量')
+    parser.add_argument('--teams', type=int, default=20, help='团队（分类目录）数量')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，相同参数生成相同语料')
+    parser.add_argument('--min-sections', type=int, default=4, help='每篇文档的最少章节数')
+    parser.add_argument('--max-sections', type=int, default=10, help='每篇文档的最多章节数')
+    parser.add_argument('--template-dir', default=TEMPLATE_DIR, help='模板文档目录')
+    args = parser.parse_args()
+
+    if os.path.exists(args.out) and os.listdir(args.out):
+        print(f"错误: 输出目录不为空: {args.out}")
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    stats = generate_corpus(
+        args.out,
+        args.docs,
+        max(1, min(args.teams, args.docs)),
+        seed=args.seed,
+        template_dir=args.template_dir,
+        sections=(args.min_sections, args.max_sections),
+    )
+    print(f"已生成 {stats['docs']} 篇文档（{stats['teams']} 个分类，共 {stats['total_bytes'] / 1024 / 1024:.1f} MB）: {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库负载测试工具
+
+基于asyncio的HTTP负载生成器。按场景文件（scenarios/*.json）在本地启动MCP服务器或API服务器，
+用多个并发连接（keep-alive）持续发送请求，统计吞吐量和p50/p95/p99延迟，并以JSON格式输出，
+便于比较不同版本之间的性能变化。
+
+用法:
+    python loadgen.py scenarios/search_warm.json
+    python loadgen.py --all --output results.json
+    python loadgen.py scenarios/categories.json --url http://localhost:8000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import subprocess
+import urllib.parse
+from datetime import datetime, timezone
+
+# 目录配置
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+KB_DIR = os.path.dirname(SCRIPT_DIR)
+ROOT_DIR = os.path.dirname(KB_DIR)
+CORE_DIR = os.path.join(KB_DIR, 'core')
+SCENARIOS_DIR = os.path.join(SCRIPT_DIR, 'scenarios')
+
+# 被测服务器：启动脚本、端口环境变量、就绪检查地址
+SERVERS = {
+    'mcp': {
+        'script': os.path.join(CORE_DIR, 'mcp_server.py'),
+        'port_env': 'MCP_PORT',
+        'health_path': '/mcp/config',
+    },
+    'api': {
+        'script': os.path.join(CORE_DIR, 'api.py'),
+        'port_env': 'API_PORT',
+        'health_path': '/api/docs',
+    },
+}
+
+READY_TIMEOUT = 30.0
+REQUEST_TIMEOUT = 30.0
+
+
+class HttpConnection:
+    """最小化的HTTP/1.1 keep-alive连接"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        """发送请求，返回 (状态码, 响应头, 响应体)"""
+        if self.writer is None:
+            await self.connect()
+
+        payload = b''
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: keep-alive']
+        if body is not None:
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            lines.append('Content-Type: application/json')
+        lines.append(f'Content-Length: {len(payload)}')
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('连接已被服务器关闭')
+        version, status = status_line.decode('latin-1').split(' ', 2)[:2]
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await self.reader.read()
+
+        # HTTP/1.0或服务器要求关闭连接时，下次请求重新连接
+        if version == 'HTTP/1.0' or response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return int(status), response_headers, data
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+
+class ParamSource:
+    """场景参数来源：cycle模式循环使用参数列表，unique模式每个参数只使用一次"""
+
+    def __init__(self, params, mode='cycle', seed=0):
+        self.params = {name: list(values) for name, values in params.items()}
+        self.mode = mode
+        self.random = random.Random(seed)
+        self.counter = 0
+        if mode == 'unique':
+            for values in self.params.values():
+                self.random.shuffle(values)
+
+    def next(self):
+        """返回下一组参数，unique模式下参数用完时返回None"""
+        index = self.counter
+        self.counter += 1
+        values = {}
+        for name, options in self.params.items():
+            if self.mode == 'unique':
+                if index >= len(options):
+                    return None
+                values[name] = options[index]
+            else:
+                values[name] = options[index % len(options)]
+        return values
+
+
+def fill_template(template, values):
+    """将模板中的 {name} 占位符替换为参数值"""
+    if isinstance(template, str):
+        for name, value in values.items():
+            template = template.replace('{' + name + '}', str(value))
+        return template
+    if isinstance(template, dict):
+        return {key: fill_template(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [fill_template(value, values) for value in template]
+    return template
+
+
+def build_path(template, values):
+    """生成请求路径，路径中的参数需要URL编码"""
+    encoded = {name: urllib.parse.quote(str(value), safe='') for name, value in values.items()}
+    return fill_template(template, encoded)
+
+
+def percentile(sorted_values, pct):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies, errors, elapsed, response_bytes):
+    """汇总延迟（毫秒）与吞吐量"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / elapsed, 2) if elapsed > 0 else None,
+        'bytes_per_request': round(response_bytes / count) if count else None,
+        'latency_ms': {
+            'mean': round(sum(values) / count, 3) if count else None,
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': values[-1] if values else None,
+        },
+    }
+
+
+class LoadTest:
+    """执行一个场景"""
+
+    def __init__(self, scenario, host, port):
+        self.scenario = scenario
+        self.host = host
+        self.port = port
+        self.requests = scenario['requests']
+        self.weights = [item.get('weight', 1) for item in self.requests]
+        self.params = ParamSource(
+            scenario.get('params', {}),
+            scenario.get('param_mode', 'cycle'),
+            scenario.get('seed', 0),
+        )
+        self.random = random.Random(scenario.get('seed', 0))
+        self.recording = False
+        self.stop_at = 0.0
+        self.latencies = {item['name']: [] for item in self.requests}
+        self.errors = {item['name']: 0 for item in self.requests}
+        self.status_counts = {}
+        self.response_bytes = {item['name']: 0 for item in self.requests}
+
+    def next_request(self):
+        values = self.params.next()
+        if values is None:
+            return None
+        item = self.random.choices(self.requests, weights=self.weights)[0]
+        body = fill_template(item.get('body'), values) if 'body' in item else None
+        return item['name'], item.get('method', 'GET'), build_path(item['path'], values), body
+
+    async def worker(self, max_requests):
+        connection = HttpConnection(self.host, self.port)
+        try:
+            while time.perf_counter() < self.stop_at:
+                if max_requests is not None and max_requests[0] <= 0:
+                    break
+                request = self.next_request()
+                if request is None:
+                    break
+                if max_requests is not None:
+                    max_requests[0] -= 1
+                name, method, path, body = request
+
+                started = time.perf_counter()
+                try:
+                    status, _, data = await asyncio.wait_for(
+                        connection.request(method, path, body, self.scenario.get('headers')),
+                        REQUEST_TIMEOUT,
+                    )
+                except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    await connection.close()
+                    status, data = None, b''
+                latency_ms = (time.perf_counter() - started) * 1000
+
+                if not self.recording:
+                    continue
+                self.status_counts[str(status)] = self.status_counts.get(str(status), 0) + 1
+                if status is None or status >= 400:
+                    self.errors[name] += 1
+                else:
+                    self.latencies[name].append(round(latency_ms, 3))
+                    self.response_bytes[name] += len(data)
+        finally:
+            await connection.close()
+
+    async def phase(self, duration, max_requests=None, recording=True):
+        self.recording = recording
+        self.stop_at = time.perf_counter() + duration
+        budget = [max_requests] if max_requests is not None else None
+        started = time.perf_counter()
+        concurrency = self.scenario.get('concurrency', 8)
+        await asyncio.gather(*(self.worker(budget) for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    async def run(self):
+        warmup = self.scenario.get('warmup', 0)
+        if warmup > 0:
+            await self.phase(warmup, recording=False)
+
+        elapsed = await self.phase(
+            self.scenario.get('duration', 10),
+            self.scenario.get('max_requests'),
+        )
+
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        result = summarize(all_latencies, sum(self.errors.values()), elapsed, sum(self.response_bytes.values()))
+        result['elapsed_s'] = round(elapsed, 3)
+        result['status_counts'] = self.status_counts
+        result['per_request'] = {
+            name: summarize(self.latencies[name], self.errors[name], elapsed, self.response_bytes[name])
+            for name in self.latencies
+        }
+        return result
+
+
+def free_port():
+    """获取一个空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port, health_path, process, timeout=READY_TIMEOUT):
+    """轮询健康检查地址，返回就绪耗时（秒）"""
+    import urllib.error
+    import urllib.request
+
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f'服务器启动失败，退出码 {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}{health_path}', timeout=1):
+                return time.perf_counter() - started
+        except urllib.error.HTTPError:
+            return time.perf_counter() - started
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f'服务器在 {timeout:.0f} 秒内未就绪')
+
+
+def start_server(server, docs_dir, extra_env=None):
+    """在本地启动被测服务器，返回 (进程, 端口, 就绪耗时)"""
+    config = SERVERS[server]
+    port = free_port()
+    env = os.environ.copy()
+    env.update({
+        config['port_env']: str(port),
+        'DOCS_DIR': docs_dir,
+        'API_DEBUG': 'false',
+        'PYTHONUNBUFFERED': '1',
+    })
+    # gen_corpus.py生成的语料自带知识库索引
+    index_file = os.path.join(docs_dir, '知识库索引.md')
+    if os.path.exists(index_file):
+        env['KB_INDEX_FILE'] = index_file
+    env.update(extra_env or {})
+    process = subprocess.Popen(
+        [sys.executable, config['script']],
+        env=env,
+        cwd=CORE_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready_s = wait_ready(port, config['health_path'], process)
+    except Exception:
+        stop_server(process)
+        raise
+    return process, port, ready_s
+
+
+def stop_server(process):
+    """停止被测服务器"""
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def load_scenario(path):
+    """加载场景文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        scenario = json.load(f)
+    scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return scenario
+
+
+def git_revision():
+    """当前代码版本，便于比较不同版本的结果"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=ROOT_DIR)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_scenario(scenario, docs_dir, url=None, overrides=None):
+    """执行场景，返回结果字典"""
+    scenario = dict(scenario, **(overrides or {}))
+    result = {
+        'scenario': scenario['name'],
+        'description': scenario.get('description', ''),
+        'server': scenario['server'],
+        'concurrency': scenario.get('concurrency', 8),
+        'warmup_s': scenario.get('warmup', 0),
+        'duration_s': scenario.get('duration', 10),
+    }
+
+    process = None
+    if url:
+        parsed = urllib.parse.urlparse(url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        process, port, ready_s = start_server(scenario['server'], docs_dir, scenario.get('env'))
+        host = '127.0.0.1'
+        result['server_ready_s'] = round(ready_s, 3)
+
+    try:
+        result.update(asyncio.run(LoadTest(scenario, host, port).run()))
+    finally:
+        if process is not None:
+            stop_server(process)
+    return result
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='UGUI知识库负载测试工具')
+    parser.add_argument('scenarios', nargs='*', help='场景文件路径')
+    parser.add_argument('--all', action='store_true', help='执行scenarios目录下的所有场景')
+    parser.add_argument('--docs-dir', default=os.path.join(ROOT_DIR, 'Docs'), help='被测服务器使用的文档目录')
+    parser.add_argument('--url', help='使用已启动的服务器，不在本地启动')
+    parser.add_argument('--duration', type=float, help='覆盖场景的测试时长（秒）')
+    parser.add_argument('--concurrency', type=int, help='覆盖场景的并发连接数')
+    parser.add_argument('--output', help='结果输出文件，默认输出到标准输出')
+    args = parser.parse_args()
+
+    paths = list(args.scenarios)
+    if args.all:
+        paths += sorted(
+            os.path.join(SCENARIOS_DIR, name) for name in os.listdir(SCENARIOS_DIR) if name.endswith('.json')
+        )
+    if not paths:
+        parser.print_help()
+        return 1
+
+    overrides = {}
+    if args.duration is not None:
+        overrides['duration'] = args.duration
+    if args.concurrency is not None:
+        overrides['concurrency'] = args.concurrency
+
+    docs_dir = os.path.abspath(args.docs_dir)
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'docs_dir': docs_dir,
+        'results': [],
+    }
+    for path in paths:
+        scenario = load_scenario(path)
+        print(f"正在执行场景: {scenario['name']} ...", file=sys.stderr)
+        report['results'].append(run_scenario(scenario, docs_dir, args.url, overrides))
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
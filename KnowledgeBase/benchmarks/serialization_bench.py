@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库响应序列化微基准
+
+比较MCP工具响应在不同编码方式下的序列化耗时（随负载大小变化）：
+    - pydantic: ToolOutput模型校验 + jsonable_encoder + JSONResponse（FastAPI默认路径）
+    - json:     直接使用标准库json编码（未安装orjson时的回退路径）
+    - orjson:   serialization.tool_response的默认路径
+    - msgpack:  Accept: application/msgpack 时的路径
+
+负载使用Docs目录下的文档内容构造：不同大小的文档正文（get_document_content）和不同数量的搜索结果（search_documents）。
+
+用法:
+    python serialization_bench.py
+    python serialization_bench.py --output serialization.json
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+from typing import Any
+
+# 目录配置
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+KB_DIR = os.path.dirname(SCRIPT_DIR)
+ROOT_DIR = os.path.dirname(KB_DIR)
+CORE_DIR = os.path.join(KB_DIR, 'core')
+sys.path.insert(0, CORE_DIR)
+
+from pydantic import BaseModel
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import serialization
+
+# 文档正文大小（字节）和搜索结果数量
+DOCUMENT_SIZES = (1024, 16 * 1024, 256 * 1024, 1024 * 1024)
+SEARCH_RESULT_COUNTS = (10, 100, 1000)
+
+
+class ToolOutput(BaseModel):
+    """与mcp_server.ToolOutput相同的模型"""
+    result: Any
+
+
+def encode_pydantic(result):
+    return JSONResponse(jsonable_encoder(ToolOutput(result=result))).body
+
+
+def encode_json(result):
+    return json.dumps({'result': result}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def encoders():
+    """可用的编码方式"""
+    available = {'pydantic': encode_pydantic, 'json': encode_json}
+    if serialization.orjson is not None:
+        available['orjson'] = lambda result: serialization.dumps_json({'result': result})
+    if serialization.msgpack is not None:
+        available['msgpack'] = lambda result: serialization.dumps_msgpack({'result': result})
+    return available
+
+
+def load_text(docs_dir):
+    """读取所有文档内容，作为构造负载的素材"""
+    parts = []
+    for dir_path, _, file_names in os.walk(docs_dir):
+        for file_name in sorted(file_names):
+            if file_name.endswith('.md'):
+                with open(os.path.join(dir_path, file_name), 'r', encoding='utf-8') as f:
+                    parts.append(f.read())
+    if not parts:
+        raise SystemExit(f"错误: 文档目录中没有Markdown文件: {docs_dir}")
+    return '\n'.join(parts)
+
+
+def build_payloads(text):
+    """构造 [(负载名称, 工具返回值)]"""
+    payloads = []
+    encoded = text.encode('utf-8')
+    for size in DOCUMENT_SIZES:
+        # 按字节截取，重复素材直到达到目标大小
+        repeated = encoded * (size // len(encoded) + 1)
+        content = repeated[:size].decode('utf-8', errors='ignore')
+        payloads.append((f'document_{size // 1024}KB', content))
+    for count in SEARCH_RESULT_COUNTS:
+        results = []
+        for index in range(count):
+            offset = (index * 997) % max(len(text) - 200, 1)
+            results.append({
+                'category': f'Category{index % 8}',
+                'name': f'Document{index}',
+                'path': f'Category{index % 8}/Document{index}.md',
+                'preview': text[offset:offset + 200] + '...',
+            })
+        payloads.append((f'search_{count}_results', results))
+    return payloads
+
+
+def measure(function, argument):
+    """返回单次调用耗时（微秒）"""
+    timer = timeit.Timer(lambda: function(argument))
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=3, number=number))
+    return best / number * 1e6
+
+
+def run(docs_dir):
+    """执行基准测试，返回结果列表"""
+    available = encoders()
+    results = []
+    for name, payload in build_payloads(load_text(docs_dir)):
+        row = {'payload': name, 'bytes': len(encode_json(payload)), 'us': {}, 'encoded_bytes': {}}
+        for encoder_name, encoder in available.items():
+            row['us'][encoder_name] = round(measure(encoder, payload), 2)
+            row['encoded_bytes'][encoder_name] = len(encoder(payload))
+        results.append(row)
+    return list(available), results
+
+
+def print_table(encoder_names, results):
+    header = f"{'负载':<22}{'JSON字节':>10}" + ''.join(f'{name + "(us)":>14}' for name in encoder_names)
+    if 'pydantic' in encoder_names and 'orjson' in encoder_names:
+        header += f"{'orjson加速':>12}"
+    print(header)
+    for row in results:
+        line = f"{row['payload']:<22}{row['bytes']:>10}" + ''.join(f"{row['us'][name]:>14.1f}" for name in encoder_names)
+        if 'pydantic' in encoder_names and 'orjson' in encoder_names:
+            line += f"{row['us']['pydantic'] / row['us']['orjson']:>11.1f}x"
+        print(line)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='UGUI知识库响应序列化微基准')
+    parser.add_argument('--docs-dir', default=os.path.join(ROOT_DIR, 'Docs'), help='用于构造负载的文档目录')
+    parser.add_argument('--output', help='结果输出文件（JSON）')
+    args = parser.parse_args()
+
+    encoder_names, results = run(os.path.abspath(args.docs_dir))
+    print_table(encoder_names, results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'encoders': encoder_names, 'results': results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库结构化访问日志
+
+每个请求输出一行JSON，包含工具名称、参数摘要、结果大小和耗时分解（admission/queue/io/search/serialize等阶段）。
+请求线程只把日志记录放入队列，JSON格式化、参数摘要计算和写入都在后台线程中完成，
+不会阻塞请求处理或事件循环。
+
+配置（环境变量）:
+    KB_ACCESS_LOG   日志输出位置：off 为关闭（默认），- 为标准错误，其他值为日志文件路径
+
+代码中通过 timed('io') / begin('serialize') 标记阶段，阶段之间互斥：
+嵌套的阶段会暂停外层阶段计时，因此各阶段耗时之和不超过总耗时，剩余部分记为other。
+admission为等待准入控制名额的耗时，queue为提交到线程池后等待工作线程开始执行的耗时（见queued）。
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import hashlib
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+
+ACCESS_LOG = os.environ.get('KB_ACCESS_LOG', 'off')
+
+# MCP工具路由前缀，日志中的tool字段去掉该前缀
+TOOL_PREFIX = '/mcp/tools/'
+
+# 当前请求的阶段计时状态，未安装访问日志时为None
+_state = contextvars.ContextVar('kb_access_state', default=None)
+
+logger = logging.getLogger('kb.access')
+logger.propagate = False
+_listener = None
+
+
+def is_enabled():
+    """是否开启访问日志"""
+    return ACCESS_LOG.lower() != 'off'
+
+
+def _switch(state, phase):
+    now = time.perf_counter()
+    current = state['phase']
+    if current is not None:
+        timings = state['timings']
+        timings[current] = timings.get(current, 0.0) + now - state['since']
+    state['phase'] = phase
+    state['since'] = now
+    return current
+
+
+def begin(phase):
+    """从现在开始把耗时计入phase，直到下一个阶段开始或请求结束"""
+    state = _state.get()
+    if state is not None:
+        _switch(state, phase)
+
+
+@contextmanager
+def timed(phase):
+    """把代码块的耗时计入phase，结束后恢复外层阶段"""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous = _switch(state, phase)
+    try:
+        yield
+    finally:
+        _switch(state, previous)
+
+
+def queued(func):
+    """包装提交到线程池的函数：从提交到工作线程开始执行的耗时计入queue阶段，之后恢复原来的阶段"""
+    state = _state.get()
+    if state is None:
+        return func
+    previous = _switch(state, 'queue')
+
+    def run(*args, **kwargs):
+        _switch(state, previous)
+        return func(*args, **kwargs)
+
+    return run
+
+
+def detach():
+    """当前任务之后不再记录阶段
+
+    批量调用中并发执行的各个调用共享同一个请求的计时状态，各自记录阶段会互相打断，
+    因此每个调用在自己的任务中调用detach()，整个批次的耗时由外层计入一个阶段。
+    """
+    _state.set(None)
+
+
+def _start_request():
+    state = {'phase': None, 'since': 0.0, 'timings': {}, 'started': time.perf_counter()}
+    return state, _state.set(state)
+
+
+def _finish_request(state, token):
+    _switch(state, None)
+    _state.reset(token)
+    return time.perf_counter() - state['started']
+
+
+def args_digest(query, body, path_params=None):
+    """计算规范化后的请求参数摘要，相同参数（与顺序无关）得到相同摘要"""
+    args = dict(path_params or {})
+    if query:
+        args.update(parse_qsl(query))
+    if body:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            args['body'] = body.decode('utf-8', errors='replace')
+        else:
+            # MCP工具的参数位于args字段中
+            if isinstance(payload, dict):
+                payload = payload.get('args', payload)
+            if isinstance(payload, dict):
+                args.update(payload)
+            else:
+                args['body'] = payload
+    if not args:
+        return None
+    normalized = json.dumps(args, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+class JsonFormatter(logging.Formatter):
+    """在后台线程中把访问记录格式化为一行JSON"""
+
+    def format(self, record):
+        entry = dict(record.access)
+        query, body, path_params = entry.pop('query'), entry.pop('body'), entry.pop('path_params')
+        timings = entry.pop('timings')
+        duration = entry.pop('duration')
+        other = max(duration - sum(timings.values()), 0.0)
+        entry.update({
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'args_digest': args_digest(query, body, path_params),
+            'duration_ms': round(duration * 1000, 3),
+            'timings_ms': {
+                **{phase: round(seconds * 1000, 3) for phase, seconds in timings.items()},
+                'other': round(other * 1000, 3),
+            },
+        })
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _ensure_listener():
+    """创建队列日志处理器和后台写入线程"""
+    global _listener
+    if _listener is not None:
+        return
+    # 访问日志默认关闭，开启时才导入，缩短服务器启动时间
+    import queue
+    import logging.handlers
+
+    if ACCESS_LOG == '-':
+        handler = logging.StreamHandler(sys.stderr)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(ACCESS_LOG)), exist_ok=True)
+        # 支持logrotate等外部工具移动日志文件
+        handler = logging.handlers.WatchedFileHandler(ACCESS_LOG, encoding='utf-8')
+    handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    # 退出时写完队列中剩余的记录
+    atexit.register(_listener.stop)
+
+
+def emit(entry):
+    """把访问记录放入队列"""
+    # QueueHandler会在请求线程中格式化msg，这里使用固定字符串，实际内容由后台线程格式化
+    logger.info('access', extra={'access': entry})
+
+
+def tool_name(route):
+    if route.startswith(TOOL_PREFIX):
+        return route[len(TOOL_PREFIX):]
+    return route
+
+
+class AccessLogMiddleware:
+    """输出结构化访问日志的ASGI中间件，用于FastAPI"""
+
+    def __init__(self, app, server='mcp'):
+        self.app = app
+        self.server = server
+        _ensure_listener()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        body = []
+        response = {'status': 500, 'bytes': 0}
+        state, token = _start_request()
+
+        async def receive_wrapper():
+            message = await receive()
+            if message['type'] == 'http.request':
+                body.append(message.get('body', b''))
+            return message
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                # 响应头发送后，序列化阶段结束
+                _switch(state, None)
+            elif message['type'] == 'http.response.body':
+                response['bytes'] += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration = _finish_request(state, token)
+            route = getattr(scope.get('route'), 'path', None)
+            emit({
+                'server': self.server,
+                'method': scope['method'],
+                'path': scope['path'],
+                'tool': tool_name(route) if route else None,
+                'status': response['status'],
+                'result_bytes': response['bytes'],
+                'path_params': scope.get('path_params'),
+                'query': scope.get('query_string', b'').decode('latin-1'),
+                'body': b''.join(body),
+                'timings': state['timings'],
+                'duration': duration,
+            })
+
+
+def install_flask(app, server='api'):
+    """为Flask应用注册访问日志钩子"""
+    from flask import g, request
+
+    _ensure_listener()
+
+    @app.before_request
+    def _access_log_before_request():
+        g.access_log = _start_request()
+
+    @app.after_request
+    def _access_log_after_request(response):
+        if 'access_log' not in g:
+            return response
+        state, token = g.pop('access_log')
+        duration = _finish_request(state, token)
+        emit({
+            'server': server,
+            'method': request.method,
+            'path': request.path,
+            'tool': request.url_rule.rule if request.url_rule is not None else None,
+            'status': response.status_code,
+            'result_bytes': response.content_length or 0,
+            'path_params': request.view_args,
+            'query': request.query_string.decode('latin-1'),
+            'body': request.get_data(cache=True),
+            'timings': state['timings'],
+            'duration': duration,
+        })
+        return response
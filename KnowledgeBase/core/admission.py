@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库MCP工具准入控制
+
+为每个工具单独限制并发数和等待队列长度，并给请求设置开始处理的截止时间。
+无法在截止时间前开始处理的请求立即返回503和Retry-After，而不是在队列中堆积，
+避免一批昂贵的search_documents调用拖慢get_categories等廉价调用。
+
+配置（环境变量）:
+    KB_ADMISSION_<TOOL>=并发数,队列长度,最长等待毫秒   例如 KB_ADMISSION_SEARCH_DOCUMENTS=4,16,2000
+    KB_ADMISSION_DEFAULT=并发数,队列长度,最长等待毫秒  未单独配置的工具使用该值
+
+客户端可以通过请求头 X-KB-Deadline-Ms 缩短本次请求愿意等待的时间。
+
+批量调用（/mcp/batch）中的每个调用通过 controller(server).admit(tool) 使用相同的限制器，
+被拒绝的调用单独返回503，不影响同一批次的其他调用。
+"""
+
+import os
+import json
+import math
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+import metrics
+import access_log
+
+# 默认限制：(并发数, 等待队列长度, 最长等待秒数)
+DEFAULT_LIMIT = (32, 128, 1.0)
+DEFAULT_TOOL_LIMITS = {
+    'search_documents': (4, 16, 2.0),
+}
+
+# MCP工具路由前缀
+TOOL_PREFIX = '/mcp/tools/'
+DEADLINE_HEADER = b'x-kb-deadline-ms'
+
+# 平均处理耗时的平滑系数，用于估算Retry-After
+EWMA_ALPHA = 0.2
+
+# 服务器名称 -> 准入控制中间件，供批量调用使用
+_controllers = {}
+
+ADMISSION_REJECTED = metrics.REGISTRY.counter(
+    'kb_admission_rejected_total', '被准入控制拒绝的请求数', ('server', 'tool', 'reason'))
+ADMISSION_WAITING = metrics.REGISTRY.gauge(
+    'kb_admission_waiting', '等待开始处理的请求数', ('server', 'tool'))
+ADMISSION_WAIT = metrics.REGISTRY.histogram(
+    'kb_admission_wait_seconds', '请求开始处理前的等待时间（秒）', ('server', 'tool'))
+
+
+class Overloaded(Exception):
+    """请求无法在截止时间前开始处理"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, name='KB_ADMISSION_DEFAULT'):
+    """解析“并发数,队列长度,最长等待毫秒”格式的配置，格式错误时抛出ValueError"""
+    if not value:
+        return default
+    try:
+        concurrency, queue_size, wait_ms = (part.strip() for part in value.split(','))
+        concurrency, queue_size, wait = int(concurrency), int(queue_size), float(wait_ms) / 1000
+    except ValueError:
+        raise ValueError(f"{name}={value!r} 格式错误，应为“并发数,队列长度,最长等待毫秒”，例如 4,16,2000") from None
+    if concurrency < 1 or queue_size < 0 or not wait >= 0 or math.isinf(wait):
+        raise ValueError(f"{name}={value!r} 无效：并发数至少为1，队列长度和最长等待毫秒不能为负数")
+    return concurrency, queue_size, wait
+
+
+def load_limits(environ=os.environ):
+    """读取默认限制和各工具的限制，任一配置无效时抛出ValueError"""
+    default = parse_limit(environ.get('KB_ADMISSION_DEFAULT'))
+    limits = dict(DEFAULT_TOOL_LIMITS)
+    prefix = 'KB_ADMISSION_'
+    for key, value in environ.items():
+        if key.startswith(prefix) and key != 'KB_ADMISSION_DEFAULT':
+            limits[key[len(prefix):].lower()] = parse_limit(value, name=key)
+    return default, limits
+
+
+def request_deadline(scope):
+    """请求头X-KB-Deadline-Ms指定的最长等待秒数，未指定时为None"""
+    for name, value in scope.get('headers', ()):
+        if name == DEADLINE_HEADER:
+            try:
+                return max(float(value) / 1000, 0.0)
+            except ValueError:
+                return None
+    return None
+
+
+class ToolLimiter:
+    """单个工具的并发限制、有界等待队列和截止时间"""
+
+    def __init__(self, name, concurrency, queue_size, max_wait, server='mcp'):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.server = server
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 0.0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def retry_after(self):
+        """按平均处理耗时估算排空当前队列需要的秒数"""
+        backlog = (self.waiting + 1) / self.concurrency
+        return max(1, math.ceil(backlog * self.service_time))
+
+    def _reject(self, reason):
+        ADMISSION_REJECTED.inc(self.server, self.name, reason)
+        raise Overloaded(reason, self.retry_after())
+
+    async def acquire(self, deadline=None):
+        """等待一个并发名额，deadline为本次请求最多愿意等待的秒数"""
+        wait = self.max_wait if deadline is None else min(deadline, self.max_wait)
+        started = time.perf_counter()
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                self._reject('queue_full')
+            if wait <= 0:
+                self._reject('deadline')
+            self.waiting += 1
+            ADMISSION_WAITING.inc(self.server, self.name)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), wait)
+            except asyncio.TimeoutError:
+                self._reject('deadline')
+            finally:
+                self.waiting -= 1
+                ADMISSION_WAITING.dec(self.server, self.name)
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        ADMISSION_WAIT.observe(time.perf_counter() - started, self.server, self.name)
+        return time.perf_counter()
+
+    def release(self, admitted_at):
+        elapsed = time.perf_counter() - admitted_at
+        self.service_time += EWMA_ALPHA * (elapsed - self.service_time)
+        self.active -= 1
+        self._semaphore.release()
+
+
+class AdmissionMiddleware:
+    """按工具进行准入控制的ASGI中间件，用于FastAPI"""
+
+    def __init__(self, app, server='mcp', routes=None, environ=os.environ, limits=None):
+        self.app = app
+        self.server = server
+        # 应用的路由列表，只为已注册的工具创建限制器，未知路径直接交给应用返回404
+        self.routes = routes
+        # 中间件在处理第一个请求时才构造，服务器应在启动时调用load_limits()校验配置并通过limits传入
+        self.default_limit, self.tool_limits = limits or load_limits(environ)
+        self.limiters = {}
+        _controllers[server] = self
+
+    def _route(self, path):
+        for route in self.routes or ():
+            if getattr(route, 'path', None) == path:
+                return route
+        return None
+
+    def limiter(self, tool):
+        limiter = self.limiters.get(tool)
+        if limiter is None:
+            if self.routes is not None and self._route(TOOL_PREFIX + tool) is None:
+                return None
+            concurrency, queue_size, max_wait = self.tool_limits.get(tool, self.default_limit)
+            limiter = self.limiters[tool] = ToolLimiter(tool, concurrency, queue_size, max_wait, self.server)
+        return limiter
+
+    @asynccontextmanager
+    async def admit(self, tool, deadline=None):
+        """在路由之外（批量调用中）占用工具的一个并发名额，无法开始处理时抛出Overloaded"""
+        limiter = self.limiter(tool)
+        if limiter is None:
+            yield
+            return
+        admitted_at = await limiter.acquire(deadline)
+        try:
+            yield
+        finally:
+            limiter.release(admitted_at)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path', '') if scope['type'] == 'http' else ''
+        if not path.startswith(TOOL_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter(path[len(TOOL_PREFIX):])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            with access_log.timed('admission'):
+                admitted_at = await limiter.acquire(request_deadline(scope))
+        except Overloaded as exc:
+            # 请求不会到达路由，这里补充路由信息，使指标和访问日志按工具统计被拒绝的请求
+            route = self._route(path)
+            if route is not None:
+                scope['route'] = route
+            await self._overloaded(send, limiter.name, exc)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(admitted_at)
+
+    @staticmethod
+    async def _overloaded(send, tool, exc):
+        body = json.dumps({'detail': f'工具 {tool} 繁忙，请稍后重试', 'reason': exc.reason}, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 503,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('latin-1')),
+                (b'retry-after', str(exc.retry_after).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def controller(server='mcp'):
+    """服务器的准入控制中间件，应用处理第一个请求之前为None"""
+    return _controllers.get(server)
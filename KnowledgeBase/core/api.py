@@ -10,76 +10,143 @@ UGUI知识库API服务器
 import os
 import sys
 import json
-import glob
-import markdown
 from typing import Dict, List, Any
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
+import metrics
+import profiling
+import access_log
+import singleflight
+import suggest
+import corpora
+
 # 创建Flask应用
 app = Flask(__name__)
 CORS(app)  # 启用跨域资源共享
+metrics.instrument_flask(app, server='api')  # 请求指标统计
+if profiling.is_active():
+    app.wsgi_app = profiling.WSGIProfilingMiddleware(app.wsgi_app, server='api')  # 按需请求分析
+if access_log.is_enabled():
+    access_log.install_flask(app, server='api')  # 结构化访问日志
 
 # 获取项目根目录
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR = os.path.dirname(os.path.dirname(SCRIPT_DIR))
-DOCS_DIR = os.path.join(ROOT_DIR, 'Docs')
+DOCS_DIR = os.environ.get('DOCS_DIR', os.path.join(ROOT_DIR, 'Docs'))
+
+# 知识库内存索引（/api/suggest使用），挂载方式与MCP服务器相同
+registry = corpora.from_environment(DOCS_DIR)
+
+# 合并相同的并发请求
+flights = singleflight.SingleFlight(server='api')
 
-# 知识库索引缓存
+# 知识库索引缓存：建立后不再修改，重新加载时整体替换，请求开始时取得当前的索引并在请求期间使用
 doc_index = {}
+metrics.INDEX_SIZE.set_function(lambda: len(doc_index), 'api')
 
 
 def load_doc_index():
-    """加载知识库索引"""
+    """加载知识库索引，在新的字典中解析完成后一次赋值替换，读取方不会看到解析了一半的索引"""
     global doc_index
-    index_file = os.path.join(os.path.dirname(SCRIPT_DIR), 'docs', '知识库索引.md')
+    index_file = os.environ.get('KB_INDEX_FILE', os.path.join(os.path.dirname(SCRIPT_DIR), 'docs', '知识库索引.md'))
     
     if os.path.exists(index_file):
-        with open(index_file, 'r', encoding='utf-8') as f:
+        with access_log.timed('io'), open(index_file, 'r', encoding='utf-8') as f:
             content = f.read()
-            # 解析索引文件，提取文档ID和路径信息
-            # 简化实现，实际应用中可能需要更复杂的解析逻辑
-            doc_index = {}
-            for line in content.split('\n'):
-                if '|' in line and '[' in line and ']' in line:
-                    parts = line.split('|')
-                    if len(parts) >= 4:
-                        doc_id = parts[1].strip()
-                        doc_path = parts[3].strip()
-                        if '(' in doc_path and ')' in doc_path:
-                            path = doc_path[doc_path.find('(')+1:doc_path.find(')')]
-                            doc_index[doc_id] = path
+        # 解析索引文件，提取文档ID和路径信息
+        # 简化实现，实际应用中可能需要更复杂的解析逻辑
+        index = {}
+        for line in content.split('\n'):
+            if '|' in line and '[' in line and ']' in line:
+                parts = line.split('|')
+                if len(parts) >= 4:
+                    doc_id = parts[1].strip()
+                    doc_path = parts[3].strip()
+                    if '(' in doc_path and ')' in doc_path:
+                        path = doc_path[doc_path.find('(')+1:doc_path.find(')')]
+                        index[doc_id] = path
+        doc_index = index
+    return doc_index
+
+
+def current_doc_index():
+    """返回当前的索引，尚未加载时加载"""
+    return doc_index or load_doc_index()
+
+
+def resolve_doc_path(path):
+    """将索引中的文档路径（如 ../Docs/UGUI/xxx.md）解析为相对于文档目录的路径（如 UGUI/xxx.md）"""
+    parts = path.replace('\\', '/').split('/')
+    while parts and parts[0] in ('..', '.', 'Docs'):
+        parts.pop(0)
+    return '/'.join(parts)
+
+
+def read_doc(doc_path):
+    """从默认知识库的存储后端读取文档，不存在时返回None"""
+    with access_log.timed('io'):
+        return registry.get().storage.read(doc_path)
+
+
+def render_doc(doc_path):
+    """读取文档并渲染为HTML，文档不存在时返回None"""
+    content = read_doc(doc_path)
+    if content is None:
+        return None
+
+    # markdown只在获取文档内容时使用，延迟到首次调用时导入
+    import markdown
+
+    with access_log.timed('render'):
+        html = markdown.markdown(content)
+    return content, html
+
+
+def search_index(query, index):
+    """在索引中的所有文档内搜索关键词"""
+    results = []
+    with access_log.timed('search'):
+        for doc_id, path in index.items():
+            content = read_doc(resolve_doc_path(path))
+            if content is None:
+                continue
+            if query.lower() in content.lower():
+                results.append({
+                    'id': doc_id,
+                    'path': path,
+                    'preview': content[:200] + '...' if len(content) > 200 else content
+                })
+    return results
 
 
 @app.route('/api/docs', methods=['GET'])
 def get_docs():
     """获取所有文档列表"""
-    if not doc_index:
-        load_doc_index()
-    return jsonify(list(doc_index.keys()))
+    index = current_doc_index()
+    access_log.begin('serialize')
+    return jsonify(list(index.keys()))
 
 
 @app.route('/api/docs/<doc_id>', methods=['GET'])
 def get_doc(doc_id):
     """获取指定ID的文档内容"""
-    if not doc_index:
-        load_doc_index()
-    
-    if doc_id not in doc_index:
+    index = current_doc_index()
+    if doc_id not in index:
         return jsonify({'error': f'Document {doc_id} not found'}), 404
     
-    doc_path = os.path.join(ROOT_DIR, doc_index[doc_id])
-    if not os.path.exists(doc_path):
+    doc_path = resolve_doc_path(index[doc_id])
+    rendered = flights.do('get_doc', {'doc_id': doc_id}, render_doc, doc_path)
+    if rendered is None:
         return jsonify({'error': f'Document file not found: {doc_path}'}), 404
-    
-    with open(doc_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-        html = markdown.markdown(content)
-        return jsonify({
-            'id': doc_id,
-            'content': content,
-            'html': html
-        })
+
+    content, html = rendered
+    access_log.begin('serialize')
+    return jsonify({
+        'id': doc_id,
+        'content': content,
+        'html': html
+    })
 
 
 @app.route('/api/search', methods=['GET'])
@@ -89,25 +156,49 @@ def search_docs():
     if not query:
         return jsonify({'error': 'Query parameter is required'}), 400
     
-    if not doc_index:
-        load_doc_index()
-    
-    results = []
-    for doc_id, path in doc_index.items():
-        doc_path = os.path.join(ROOT_DIR, path)
-        if os.path.exists(doc_path):
-            with open(doc_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                if query.lower() in content.lower():
-                    results.append({
-                        'id': doc_id,
-                        'path': path,
-                        'preview': content[:200] + '...' if len(content) > 200 else content
-                    })
-    
+    index = current_doc_index()
+    results = flights.do('search', {'q': query}, search_index, query, index)
+    access_log.begin('serialize')
     return jsonify(results)
 
 
+@app.route('/api/suggest', methods=['GET'])
+def suggest_docs():
+    """输入补全：按前缀返回文档标题、章节标题、符号和高频词，kb参数指定知识库（默认所有知识库）"""
+    prefix = request.args.get('q', '')
+    if not prefix:
+        return jsonify({'error': 'Query parameter is required'}), 400
+    try:
+        limit = int(request.args.get('limit', suggest.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    kb = request.args.get('kb') or None
+    if kb is not None and kb not in registry.corpora:
+        return jsonify({'error': f'Knowledge base {kb} not found'}), 404
+
+    with access_log.timed('search'):
+        suggestions = registry.suggest(prefix, limit, kb=kb)
+    access_log.begin('serialize')
+    return jsonify(suggestions)
+
+
+@app.route('/api/reload', methods=['POST'])
+def reload_index():
+    """重新加载文档索引和知识库内存索引，加载期间的请求继续使用旧的索引"""
+    kb = request.args.get('kb') or None
+    if kb is not None and kb not in registry.corpora:
+        return jsonify({'error': f'Knowledge base {kb} not found'}), 404
+
+    index = load_doc_index()
+    # 不使用请求合并：重建期间收到的重建请求需要看到这之后的文件，由Corpus.reload排队处理
+    generations = registry.reload(kb)
+    access_log.begin('serialize')
+    return jsonify({
+        'documents': len(index),
+        'knowledge_bases': [dict(generation.describe(), kb=generation.name) for generation in generations],
+    })
+
+
 @app.route('/api/visualize/<viz_id>', methods=['GET'])
 def get_visualization(viz_id):
     """获取可视化图表"""
@@ -122,10 +213,22 @@ def get_visualization(viz_id):
         return jsonify(viz_data)
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus格式的监控指标"""
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+
 def start_api_server(host='0.0.0.0', port=5000, debug=False):
     """启动API服务器"""
     app.run(host=host, port=port, debug=debug)
 
 
 if __name__ == '__main__':
-    start_api_server(debug=True)
\ No newline at end of file
+    if '--profile-startup' in sys.argv:
+        from startup_profile import profile_startup
+        sys.exit(profile_startup(__file__))
+    start_api_server(
+        port=int(os.environ.get('API_PORT', '5000')),
+        debug=os.environ.get('API_DEBUG', 'true').lower() == 'true',
+    )
\ No newline at end of file
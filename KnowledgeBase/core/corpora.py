@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库多知识库管理
+
+一个服务器进程可以挂载多个命名的知识库（文档树），每个知识库有自己的索引和源码解析缓存：
+
+    KB_MOUNTS="ugui=/app/docs;engine=/data/engine-notes;uiframework="
+
+每项为 名称=文档目录，多项之间用分号分隔。文档目录可以为空（只索引源码）。
+源码目录通过 KB_SOURCE_DIRS_<名称大写> 设置；默认知识库（第一项）未设置时使用 KB_SOURCE_DIRS。
+未设置KB_MOUNTS时只挂载一个知识库，名称为KB_DEFAULT_NAME（默认ugui），文档目录为DOCS_DIR。
+
+所有知识库共享：
+    - 一个工作线程池（KB_WORKERS），同时作为事件循环的默认执行器
+    - 一个内存预算（KB_MEMORY_BUDGET_MB）：索引在首次使用时建立，已加载索引的估计内存超出预算时，
+      按最近最少使用的顺序卸载其他知识库的索引，下次使用时重新建立（源码解析结果仍然复用缓存）
+
+工具的kb参数指定知识库；搜索类工具省略kb时在所有知识库中搜索，结果按得分合并
+（部分知识库使用存储后端全文搜索时按名次交错合并，见Registry.search）。
+
+文档从存储后端读取（KB_STORAGE，见storage.py）。使用SQLite后端时，数据库默认为
+KnowledgeBase/cache/<名称>/documents.sqlite，可以通过 KB_SQLITE_PATH_<名称大写> 指定
+（默认知识库也可以用KB_SQLITE_PATH）；普通查询直接在数据库中全文搜索，
+启动时不预先建立内存索引，只在使用需要内存索引的工具时建立。
+
+索引分代（Generation）：每次建立索引产生新的一代，建立完成后不再修改。
+    - 请求开始时取得（pin）各知识库的当前一代，整个请求都使用它，读取不加锁
+    - 重建（reload）在旁边建立新的一代，完成后用一次赋值发布，之后开始的请求使用新的一代，
+      正在执行的请求不会看到建立了一半的索引
+    - 旧的一代在最后一个使用它的请求结束后由引用计数释放；卸载索引同样只是清空当前一代的引用
+"""
+
+import os
+import re
+import time
+import weakref
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import kb_index
+import symbols
+import suggest
+import facets
+import csharp_source
+import query_language
+import storage
+
+DEFAULT_NAME = os.environ.get('KB_DEFAULT_NAME', 'ugui')
+MEMORY_BUDGET = int(float(os.environ.get('KB_MEMORY_BUDGET_MB', '1024')) * 1024 * 1024)
+WORKERS = int(os.environ.get('KB_WORKERS', str(min(32, (os.cpu_count() or 1) + 4))))
+
+# 每个知识库的缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
+
+_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+CORPUS_MEMORY = metrics.REGISTRY.gauge('kb_corpus_memory_bytes', '已加载知识库索引的估计内存（字节）', ('kb',))
+CORPUS_EVICTIONS = metrics.REGISTRY.counter('kb_corpus_evictions_total', '因内存预算卸载索引的次数', ('kb',))
+CORPUS_GENERATION = metrics.REGISTRY.gauge('kb_index_generation', '当前索引的代数，未加载时为0', ('kb',))
+CORPUS_LIVE_GENERATIONS = metrics.REGISTRY.gauge('kb_index_live_generations', '仍在内存中的索引代数（当前一代和仍在被请求使用的旧代）', ('kb',))
+CORPUS_RELOADS = metrics.REGISTRY.counter('kb_index_reloads_total', '重建索引的次数', ('kb',))
+
+
+class UnknownKnowledgeBase(KeyError):
+    """请求的知识库没有挂载"""
+
+
+def parse_mounts(value, docs_dir):
+    """解析KB_MOUNTS，返回 [(名称, 文档目录)]；value为空时返回默认知识库"""
+    if not value or not value.strip():
+        return [(DEFAULT_NAME, docs_dir)]
+    mounts = []
+    for item in value.split(';'):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, path = item.partition('=')
+        name = name.strip()
+        if not _NAME.match(name):
+            raise ValueError(f"知识库名称只能包含字母、数字、下划线和连字符: {name!r}")
+        if any(name == existing for existing, _ in mounts):
+            raise ValueError(f"知识库名称重复: {name}")
+        mounts.append((name, path.strip()))
+    if not mounts:
+        raise ValueError("KB_MOUNTS中没有知识库")
+    return mounts
+
+
+class Generation:
+    """知识库索引的一代，建立后不再修改"""
+
+    __slots__ = ('name', 'number', 'index', 'built_at', '__weakref__')
+
+    def __init__(self, name, number, index):
+        self.name = name
+        self.number = number
+        self.index = index
+        self.built_at = time.time()
+
+    def describe(self):
+        return {
+            'generation': self.number,
+            'built_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.built_at)),
+            'stats': self.index.stats(),
+        }
+
+
+class Corpus:
+    """一个命名的知识库，当前一代索引按需建立，可以被重建或卸载"""
+
+    def __init__(self, name, docs_dir, source_root=None, source_dirs=None, document_storage=None):
+        self.name = name
+        self.docs_dir = docs_dir
+        self.storage = document_storage or storage.FileSystemStorage(docs_dir)
+        self.source_root = source_root or os.environ.get('KB_SOURCE_ROOT') or \
+            os.path.dirname(os.path.abspath(docs_dir or '.'))
+        self.source_dirs = source_dirs if source_dirs is not None else []
+        self.parser = csharp_source.SourceParser(os.path.join(CACHE_DIR, name, 'csharp_sources.json'))
+        # 当前一代；只通过一次赋值替换，读取方不加锁
+        self.generation = None
+        self.builds = 0
+        # 仍在内存中的各代（弱引用，最后一个使用者结束后自动移除）
+        self.live = weakref.WeakSet()
+        # 串行化建立过程，读取不使用这个锁
+        self.lock = threading.Lock()
+        # 重建请求的序号，以及已发布的一代覆盖到的序号（开始建立之前收到的请求都已包含在内）
+        self.reload_requests = 0
+        self.reload_covered = 0
+        self._requests_lock = threading.Lock()
+        CORPUS_GENERATION.set_function(lambda: self.generation.number if self.generation else 0, name)
+        CORPUS_LIVE_GENERATIONS.set_function(lambda: len(self.live), name)
+
+    def _build(self):
+        """建立新的一代并发布，调用方持有self.lock"""
+        index = kb_index.KnowledgeIndex(self.docs_dir, source_root=self.source_root, source_dirs=self.source_dirs,
+                                        parser=self.parser, storage=self.storage).build()
+        self.builds += 1
+        generation = Generation(self.name, self.builds, index)
+        self.live.add(generation)
+        # 发布：一次属性赋值，之后开始的请求取得新的一代
+        self.generation = generation
+        return generation
+
+    def pin(self):
+        """取得当前一代，尚未建立时建立；调用方在请求期间持有返回值"""
+        generation = self.generation
+        if generation is None:
+            with self.lock:
+                generation = self.generation
+                if generation is None:
+                    generation = self._build()
+        return generation
+
+    def reload(self):
+        """在旁边建立新的一代并替换当前一代，建立期间请求继续使用旧的一代
+
+        返回的一代一定是在本次调用之后才开始建立的。正在建立时收到的重建请求不能合并到这次建立中
+        （它可能读到的是修改之前的文件），而是等这次完成后再建立一次，期间收到的请求共享这一次。
+        """
+        with self._requests_lock:
+            self.reload_requests += 1
+            ticket = self.reload_requests
+        with self.lock:
+            generation = self.generation
+            if self.reload_covered >= ticket and generation is not None:
+                return generation
+            with self._requests_lock:
+                covered = self.reload_requests
+            generation = self._build()
+            self.reload_covered = covered
+        CORPUS_RELOADS.inc(self.name)
+        return generation
+
+    def evict(self):
+        """清空当前一代的引用，正在使用它的请求不受影响"""
+        self.generation = None
+
+    def describe(self):
+        generation = self.generation
+        result = {
+            'name': self.name,
+            'docs_dir': self.docs_dir,
+            'source_dirs': self.source_dirs,
+            'storage': self.storage.describe(),
+            'loaded': generation is not None,
+            'builds': self.builds,
+            'live_generations': len(self.live),
+        }
+        result.update(generation.describe() if generation else {'generation': None, 'stats': None})
+        return result
+
+
+class Registry:
+    """已挂载的知识库，以及共享的工作线程池和内存预算"""
+
+    def __init__(self, corpora, memory_budget=MEMORY_BUDGET, workers=WORKERS):
+        self.corpora = collections.OrderedDict((corpus.name, corpus) for corpus in corpora)
+        self.default = next(iter(self.corpora))
+        self.memory_budget = memory_budget
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kb-worker')
+        # 已加载的知识库，按最近使用排序
+        self._loaded = collections.OrderedDict()
+        self._lock = threading.Lock()
+        for name in self.corpora:
+            CORPUS_MEMORY.set_function(lambda name=name: self._memory(name), name)
+
+    def _memory(self, name):
+        generation = self.corpora[name].generation
+        return generation.index.memory_estimate() if generation is not None else 0
+
+    def names(self):
+        return list(self.corpora)
+
+    def get(self, name=None):
+        name = name or self.default
+        corpus = self.corpora.get(name)
+        if corpus is None:
+            raise UnknownKnowledgeBase(name)
+        return corpus
+
+    def select(self, name=None):
+        """搜索范围：指定的知识库，或者省略时的所有知识库"""
+        return [self.get(name)] if name else list(self.corpora.values())
+
+    def loaded(self, name=None):
+        """搜索范围内的知识库是否都已加载索引"""
+        return all(corpus.generation is not None for corpus in self.select(name))
+
+    def current(self, name=None):
+        """已加载的当前一代索引，未加载时返回None"""
+        generation = self.get(name).generation
+        return generation.index if generation is not None else None
+
+    def pin(self, name=None):
+        """取得知识库的当前一代（未加载时建立），并按内存预算卸载其他索引"""
+        corpus = self.get(name)
+        generation = corpus.pin()
+        self._touch(corpus)
+        return generation
+
+    def snapshot(self, name=None):
+        """请求开始时取得搜索范围内各知识库的当前一代，请求期间都使用这些索引"""
+        return [self.pin(corpus.name) for corpus in self.select(name)]
+
+    def index(self, name=None):
+        return self.pin(name).index
+
+    def reload(self, name=None):
+        """重建知识库（省略时为所有知识库）的索引，返回新的各代"""
+        generations = []
+        for corpus in self.select(name):
+            generations.append(corpus.reload())
+            self._touch(corpus)
+        return generations
+
+    def _touch(self, corpus):
+        with self._lock:
+            self._loaded[corpus.name] = corpus
+            self._loaded.move_to_end(corpus.name)
+            self._enforce_budget(keep=corpus.name)
+
+    def _enforce_budget(self, keep):
+        used = sum(self._memory(name) for name in self._loaded)
+        for name in list(self._loaded):
+            if used <= self.memory_budget:
+                break
+            if name == keep:
+                continue
+            corpus = self._loaded.pop(name)
+            used -= self._memory(name)
+            corpus.evict()
+            CORPUS_EVICTIONS.inc(name)
+
+    def documents(self):
+        """已加载索引中的文档数量"""
+        generations = [corpus.generation for corpus in self.corpora.values()]
+        return sum(len(generation.index.documents) for generation in generations if generation is not None)
+
+    def warm(self):
+        """在工作线程中按挂载顺序建立索引，超出内存预算后停止；提供全文搜索的存储后端不预先建立"""
+        def run():
+            for name, corpus in self.corpora.items():
+                if corpus.storage.full_text:
+                    continue
+                self.pin(name)
+                with self._lock:
+                    if sum(self._memory(loaded) for loaded in self._loaded) >= self.memory_budget:
+                        break
+        return self.executor.submit(run)
+
+    def _search(self, generations, query, collapse, filters):
+        results = []
+        for generation in generations:
+            for result in generation.index.search(query, collapse=collapse, filters=filters):
+                result['kb'] = generation.name
+                results.append(result)
+        if len(generations) > 1:
+            results.sort(key=lambda result: -result['score'])
+        return results
+
+    @staticmethod
+    def _interleave(ranked):
+        """按名次交错合并各知识库的结果列表（每个列表已按本知识库的得分排序）
+
+        内存索引的BM25得分和存储后端全文搜索的得分尺度不同，不能直接比较：
+        各知识库的第1名排在最前面，然后是各自的第2名，依此类推；
+        同一名次内按相对于本知识库最高分的比例排序。
+        """
+        merged = []
+        for order, results in enumerate(ranked):
+            top = max((result['score'] for result in results), default=0) or 1
+            merged.extend((rank, -result['score'] / top, order, result) for rank, result in enumerate(results))
+        merged.sort(key=lambda item: item[:3])
+        return [item[3] for item in merged]
+
+    def search(self, query, kb=None, collapse=True, filters=None):
+        """搜索文档，多个知识库的结果按得分合并，filters为分面过滤条件
+
+        存储后端提供全文搜索时，不含查询语法和过滤条件的查询直接在存储中搜索，
+        这类结果不合并近似重复（collapse不起作用，alternates为空），其余查询使用内存索引。
+        同时使用两种搜索时得分尺度不同，结果按名次交错合并（见_interleave）。
+        """
+        corpora = self.select(kb)
+        plain = not filters and query_language.parse_query(query) is None
+        if not plain or not any(corpus.storage.full_text for corpus in corpora):
+            return self._search([self.pin(corpus.name) for corpus in corpora], query, collapse, filters)
+
+        ranked = []
+        for corpus in corpora:
+            if corpus.storage.full_text:
+                ranked.append([dict(result, kb=corpus.name) for result in corpus.storage.search(query)])
+            else:
+                ranked.append(self._search([self.pin(corpus.name)], query, collapse, filters))
+        if len(ranked) == 1:
+            return ranked[0]
+        return self._interleave(ranked)
+
+    def faceted_search(self, query, kb=None, collapse=True, filters=None):
+        """搜索文档并统计命中文档的分面，多个知识库时增加kb分面"""
+        generations = self.snapshot(kb)
+        results = self._search(generations, query, collapse, filters)
+        merged = facets.merge_counts(generation.index.facet_counts(query, filters) for generation in generations)
+        totals = [(generation.name, generation.index.match_count(query, filters)) for generation in generations]
+        if len(generations) > 1:
+            merged['kb'] = [{'value': name, 'count': count} for name, count in totals if count]
+        return {'results': results, 'total': sum(count for _, count in totals), 'facets': merged}
+
+    def retrieve_passages(self, query, budget=kb_index.DEFAULT_TOKEN_BUDGET, kb=None, filters=None):
+        """按token预算检索段落，多个知识库的段落按得分合并后统一装入预算"""
+        ranked = []
+        owners = {}
+        for generation in self.snapshot(kb):
+            owners[id(generation.index)] = generation.name
+            ranked.extend(generation.index.rank_passages(query, filters))
+        ranked.sort(key=lambda item: -item[0])
+
+        def describe(score, passage):
+            result = passage.describe(score)
+            result['kb'] = owners[id(passage.section.doc.index)]
+            return result
+
+        return kb_index.pack_passages(query, ranked, budget, describe)
+
+    def find_symbol(self, symbol, prefix=False, kb=None):
+        """查找符号，每个结果标注所属知识库"""
+        matches = []
+        for generation in self.snapshot(kb):
+            for match in generation.index.find_symbol(symbol, prefix=prefix):
+                matches.append(dict(match, kb=generation.name))
+        if prefix and len(matches) > 1:
+            matches.sort(key=lambda match: (match['symbol'].lower(), -match['count']))
+            matches = matches[:symbols.DEFAULT_SYMBOL_LIMIT]
+        return matches
+
+    def suggest(self, prefix, limit=suggest.DEFAULT_LIMIT, kb=None):
+        """输入补全，多个知识库的相同候选合并权重"""
+        generations = self.snapshot(kb)
+        if len(generations) == 1:
+            return [dict(item, kb=generations[0].name) for item in generations[0].index.suggest(prefix, limit)]
+        merged = {}
+        for generation in generations:
+            for item in generation.index.suggest(prefix, limit):
+                key = item['text'].lower()
+                if key in merged:
+                    merged[key]['weight'] += item['weight']
+                else:
+                    merged[key] = dict(item, kb=generation.name)
+        return sorted(merged.values(), key=lambda item: -item['weight'])[:limit]
+
+    def duplicate_report(self, kb=None):
+        report = []
+        for generation in self.snapshot(kb):
+            report.extend(dict(cluster, kb=generation.name) for cluster in generation.index.duplicate_report())
+        return report
+
+    def describe(self):
+        return {
+            'default': self.default,
+            'memory_budget_bytes': self.memory_budget,
+            'knowledge_bases': [corpus.describe() for corpus in self.corpora.values()],
+        }
+
+
+def from_environment(docs_dir):
+    """按环境变量创建知识库注册表，docs_dir为未设置KB_MOUNTS时默认知识库的文档目录
+
+    存储后端无法使用时抛出storage.StorageError。
+    """
+    mounts = parse_mounts(os.environ.get('KB_MOUNTS', ''), docs_dir)
+    corpora = []
+    kind = os.environ.get('KB_STORAGE', storage.FILESYSTEM)
+    for position, (name, path) in enumerate(mounts):
+        path = os.path.abspath(path) if path else ''
+        source_root = os.environ.get('KB_SOURCE_ROOT') or os.path.dirname(path or os.getcwd())
+        suffix = name.upper().replace("-", "_")
+        value = os.environ.get(f'KB_SOURCE_DIRS_{suffix}')
+        if value is None:
+            # 默认知识库沿用KB_SOURCE_DIRS，其他知识库默认不索引源码
+            value = None if position == 0 else ''
+        db_path = os.environ.get(f'KB_SQLITE_PATH_{suffix}') or \
+            (os.environ.get('KB_SQLITE_PATH') if position == 0 else None) or storage.default_db_path(name)
+        # 只索引源码的知识库没有文档，不需要数据库
+        document_storage = storage.open_storage(kind if path else storage.FILESYSTEM, path, db_path)
+        corpora.append(Corpus(name, path, source_root, csharp_source.source_dirs(source_root, value), document_storage))
+    return Registry(corpora)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库C#源码解析
+
+把项目中的C#源码（默认为 Assets/Scripts/UIFramework）解析为声明列表：命名空间之外的类型、方法、
+构造函数、属性、字段和事件，每个声明包含限定名和行范围（包括前面的///文档注释和特性），
+知识库索引据此把源码文件切分为章节，搜索和取章节时可以只返回一个方法。
+
+解析只做花括号匹配和声明头的正则识别，不是完整的C#语法分析，但对常规的Unity脚本足够。
+解析结果按文件内容的SHA-1缓存在内存和缓存文件中，源码没有变化时重建索引不再重新解析。
+
+用法:
+    python csharp_source.py ../../Assets/Scripts/UIFramework/Core/ObjectPool.cs
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import threading
+
+import symbols
+
+# 解析器版本，解析规则变化时修改，使旧的缓存失效
+PARSER_VERSION = 1
+
+# 默认索引的源码目录（相对于项目根目录），以及解析结果缓存文件
+DEFAULT_SOURCE_DIRS = 'Assets/Scripts/UIFramework'
+CACHE_FILE = os.environ.get(
+    'KB_SOURCE_CACHE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'csharp_sources.json'))
+
+# 声明头的最大长度（签名）
+SIGNATURE_LENGTH = 200
+
+# 有代码体、可以作为章节返回的声明
+TYPE_KINDS = ('class', 'struct', 'interface', 'enum')
+MEMBER_KINDS = ('method', 'constructor', 'property', 'indexer', 'operator', 'event', 'field')
+
+_ATTRIBUTES = re.compile(r'^\s*(?:\[[^\]]*\]\s*)+')
+_NAMESPACE = re.compile(r'^namespace\s+([\w.]+)')
+_TYPE = re.compile(r'\b(class|struct|interface|enum)\s+([A-Za-z_]\w*)')
+_CALLABLE = re.compile(r'([A-Za-z_]\w*)\s*(?:<[^()]*>)?\s*\(')
+_LAST_IDENTIFIER = re.compile(r'([A-Za-z_]\w*)\s*$')
+_GENERIC = re.compile(r'<[^<>]*>')
+_IGNORED = re.compile(r'^(using|return|if|else|for|foreach|while|switch|case|default|try|catch|finally|do)\b')
+
+
+def content_hash(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def _classify(header, end_char, containers):
+    """识别以end_char（{或;）结束的声明头，返回 (类别, 名称) 或 None；containers为外层类型名"""
+    text = _ATTRIBUTES.sub('', header).strip()
+    if not text or _IGNORED.match(text):
+        return None
+    match = _NAMESPACE.match(text)
+    if match:
+        return 'namespace', match.group(1)
+    paren = text.find('(')
+    match = _TYPE.search(text)
+    if match and (paren < 0 or match.start() < paren):
+        return match.group(1), match.group(2)
+    if not containers:
+        return None
+
+    arrow = text.find('=>')
+    assign = re.search(r'(?<![=!<>])=(?![=>])', text)
+    if 'operator' in text.split() and paren >= 0:
+        return 'operator', text[text.index('operator'):paren].replace(' ', '')
+    if re.search(r'\bthis\s*\[', text):
+        return 'indexer', 'this[]'
+    if paren >= 0 and (assign is None or assign.start() > paren) and (arrow < 0 or arrow > paren):
+        match = _CALLABLE.search(text)
+        if not match:
+            return None
+        name = match.group(1)
+        kind = 'constructor' if name == containers[-1] else 'method'
+        return kind, name
+
+    # 字段、属性和事件：名称是初始化或属性体之前的最后一个标识符
+    end = len(text)
+    for position in (assign.start() if assign else -1, arrow):
+        if 0 <= position < end:
+            end = position
+    match = _LAST_IDENTIFIER.search(_GENERIC.sub('', text[:end]))
+    if not match:
+        return None
+    if re.search(r'\bevent\b', text):
+        kind = 'event'
+    elif assign is None and (end_char == '{' or arrow >= 0):
+        # { get; set; } 或 => 表达式体
+        kind = 'property'
+    else:
+        kind = 'field'
+    return kind, match.group(1)
+
+
+def parse(content):
+    """解析C#源码，返回声明列表（按起始行排序）
+
+    每个声明为dict：kind、name、qualified（外层类型名.名称）、namespace、signature、
+    start_line（包括文档注释和特性）、line（声明头所在行）、end_line、depth（类型嵌套层数）。
+    """
+    declarations = []
+    # 打开的代码块：[(声明或None, 是否是类型或命名空间)]
+    blocks = []
+    header, header_line, doc_line = [], None, None
+    in_comment = False
+
+    def scope():
+        """当前位置是否可以出现声明（文件顶层、命名空间或类型体中）"""
+        return all(is_container for _, is_container in blocks)
+
+    def containers():
+        return [block['name'] for block, _ in blocks if block and block['kind'] in TYPE_KINDS]
+
+    def declare(end_char, number):
+        text = ' '.join(''.join(header).split())
+        result = _classify(text, end_char, containers()) if text and scope() else None
+        if result is None:
+            return None
+        kind, name = result
+        outer = containers()
+        namespace = '.'.join(block['name'] for block, _ in blocks if block and block['kind'] == 'namespace')
+        declaration = {
+            'kind': kind,
+            'name': name,
+            'qualified': '.'.join(outer + [name]) if kind != 'namespace' else name,
+            'namespace': namespace,
+            'signature': _ATTRIBUTES.sub('', text).rstrip(' ={')[:SIGNATURE_LENGTH],
+            'start_line': min(line for line in (doc_line, header_line) if line is not None),
+            'line': header_line,
+            'end_line': number,
+            'depth': len(outer),
+        }
+        if kind != 'namespace':
+            declarations.append(declaration)
+        return declaration
+
+    for number, line in enumerate(content.splitlines(), 1):
+        code, _, in_comment = symbols.strip_code(line, in_comment)
+        stripped = line.strip()
+        if not header:
+            if stripped.startswith('///'):
+                if doc_line is None:
+                    doc_line = number
+            elif not code.strip() and not stripped.startswith('//') and not in_comment:
+                # 空行之前的文档注释不属于后面的声明
+                doc_line = None
+        for char in code:
+            if char == '{':
+                declaration = declare(char, number)
+                is_container = scope() and (declaration is None or declaration['kind'] in TYPE_KINDS + ('namespace',))
+                blocks.append((declaration, is_container))
+                header, header_line, doc_line = [], None, None
+            elif char == '}':
+                if blocks:
+                    declaration, _ = blocks.pop()
+                    if declaration:
+                        declaration['end_line'] = number
+                header, header_line, doc_line = [], None, None
+            elif char == ';':
+                declare(char, number)
+                header, header_line, doc_line = [], None, None
+            else:
+                if header_line is None and not char.isspace():
+                    header_line = number
+                if header_line is not None:
+                    header.append(char)
+        if header_line is not None:
+            header.append(' ')
+
+    # 初始化器中带lambda的字段在花括号结束时记录结束行，后面的分号不再产生声明
+    declarations.sort(key=lambda item: (item['start_line'], item['depth']))
+    return declarations
+
+
+class SourceParser:
+    """带缓存的源码解析器，缓存键为文件内容的SHA-1"""
+
+    def __init__(self, cache_file=CACHE_FILE):
+        self.cache_file = cache_file
+        self._cache = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.reused = 0
+
+    def _load(self):
+        if self._cache is not None:
+            return
+        self._cache = {}
+        if self.cache_file and os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == PARSER_VERSION:
+                    self._cache = data.get('files', {})
+            except (OSError, ValueError):
+                self._cache = {}
+
+    def parse(self, content):
+        """返回源码的声明列表，内容没有变化时使用缓存"""
+        digest = content_hash(content)
+        with self._lock:
+            self._load()
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self.reused += 1
+                return cached
+        declarations = parse(content)
+        with self._lock:
+            self._cache[digest] = declarations
+            self._dirty = True
+            self.parsed += 1
+        return declarations
+
+    def save(self, keep=None):
+        """写回缓存文件；keep为当前仍在使用的哈希集合，其余条目被清理"""
+        with self._lock:
+            if self._cache is None or not self.cache_file:
+                return
+            if keep is not None and set(self._cache) - set(keep):
+                self._cache = {digest: value for digest, value in self._cache.items() if digest in keep}
+                self._dirty = True
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+                temp_file = f'{self.cache_file}.{os.getpid()}.tmp'
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'version': PARSER_VERSION, 'files': self._cache}, f, ensure_ascii=False)
+                os.replace(temp_file, self.cache_file)
+                self._dirty = False
+            except OSError as e:
+                print(f"警告: 无法写入源码解析缓存 {self.cache_file}: {e}", file=sys.stderr)
+
+
+def source_dirs(root_dir, value=None):
+    """解析KB_SOURCE_DIRS（逗号分隔，相对于项目根目录），只返回存在的目录"""
+    if value is None:
+        value = os.environ.get('KB_SOURCE_DIRS', DEFAULT_SOURCE_DIRS)
+    result = []
+    for item in value.split(','):
+        item = item.strip()
+        if item:
+            path = item if os.path.isabs(item) else os.path.join(root_dir, item)
+            if os.path.isdir(path):
+                result.append(os.path.normpath(path))
+    return result
+
+
+def main():
+    """主函数：输出文件中的声明"""
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[-1])
+        return 1
+    for file_path in sys.argv[1:]:
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            declarations = parse(f.read())
+        print(file_path)
+        for item in declarations:
+            print(f"  {item['start_line']:>4}-{item['end_line']:<4} {'  ' * item['depth']}{item['kind']:<12}{item['qualified']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
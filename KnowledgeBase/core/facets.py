@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库分面统计
+
+建立索引时为每个分面值预先计算一个文档位图（Python整数，第n位表示序号为n的文档）：
+    - category  文档分类（文档目录下的子目录名，源码为源码目录名）
+    - type      文档类型：markdown或source
+    - depth     文档包含的章节层级（Markdown标题级别，源码为声明的嵌套层数+1），一篇文档可以有多个值
+
+搜索时把命中的文档也表示为位图，每个分面值的数量是两个位图按位与之后的1的个数，
+与命中文档数量无关，只与分面值数量和文档总数/64成正比。
+
+过滤条件为 {分面: 值或值列表}：同一分面的多个值之间为OR，不同分面之间为AND。
+统计某个分面时不应用该分面自己的过滤条件（其他分面的条件照常应用），
+因此按category过滤后仍然可以看到其他分类的数量，方便切换。
+"""
+
+# 支持的分面，按返回顺序排列
+FACETS = ('category', 'type', 'depth')
+
+# 文档类型
+MARKDOWN = 'markdown'
+SOURCE = 'source'
+
+
+class FacetFilterError(ValueError):
+    """分面过滤条件无效"""
+
+
+def bitset(numbers):
+    """把文档序号转换为位图"""
+    numbers = list(numbers)
+    if not numbers:
+        return 0
+    data = bytearray(max(numbers) // 8 + 1)
+    for number in numbers:
+        data[number >> 3] |= 1 << (number & 7)
+    return int.from_bytes(data, 'little')
+
+
+def members(bits):
+    """位图中的文档序号（从小到大）"""
+    numbers = []
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for offset, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            numbers.append(offset * 8 + low.bit_length() - 1)
+            byte ^= low
+    return numbers
+
+
+class FacetIndex:
+    """分面值 -> 文档位图"""
+
+    def __init__(self, documents):
+        """documents为 [(文档序号, {分面: [值]})]"""
+        self.bits = {facet: {} for facet in FACETS}
+        numbers = {facet: {} for facet in FACETS}
+        count = 0
+        for number, values in documents:
+            count = max(count, number + 1)
+            for facet in FACETS:
+                for value in values.get(facet, ()):
+                    numbers[facet].setdefault(value, []).append(number)
+        for facet in FACETS:
+            self.bits[facet] = {value: bitset(docs) for value, docs in numbers[facet].items()}
+        self.all = (1 << count) - 1
+        # 过滤条件中的值不区分大小写
+        self._lookup = {facet: {str(value).lower(): value for value in self.bits[facet]} for facet in FACETS}
+
+    def normalize(self, filters):
+        """检查并规范化过滤条件，返回 {分面: [值]}；不存在的值保留（匹配不到任何文档）"""
+        if not filters:
+            return {}
+        if not isinstance(filters, dict):
+            raise FacetFilterError('filters必须是对象，例如 {"category": "UGUI"}')
+        normalized = {}
+        for facet, values in filters.items():
+            if facet not in FACETS:
+                raise FacetFilterError(f"不支持的分面: {facet}（可用: {', '.join(FACETS)}）")
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            normalized[facet] = [self._lookup[facet].get(str(value).lower(), value) for value in values]
+        return normalized
+
+    def mask(self, filters, skip=None):
+        """满足过滤条件（跳过分面skip）的文档位图"""
+        bits = self.all
+        for facet, values in filters.items():
+            if facet == skip:
+                continue
+            allowed = 0
+            for value in values:
+                allowed |= self.bits[facet].get(value, 0)
+            bits &= allowed
+        return bits
+
+    def counts(self, matched, filters):
+        """命中文档位图中各分面值的数量，返回 {分面: [{'value': 值, 'count': 数量}]}（按数量从多到少）"""
+        result = {}
+        for facet in FACETS:
+            base = matched & self.mask(filters, skip=facet)
+            values = []
+            for value, bits in self.bits[facet].items():
+                count = (base & bits).bit_count()
+                if count:
+                    values.append({'value': value, 'count': count})
+            values.sort(key=lambda item: (-item['count'], str(item['value'])))
+            result[facet] = values
+        return result
+
+
+def merge_counts(facet_counts):
+    """合并多个知识库的分面统计"""
+    merged = {}
+    for counts in facet_counts:
+        for facet, values in counts.items():
+            totals = merged.setdefault(facet, {})
+            for item in values:
+                totals[item['value']] = totals.get(item['value'], 0) + item['count']
+    return {facet: sorted(({'value': value, 'count': count} for value, count in totals.items()),
+                          key=lambda item: (-item['count'], str(item['value'])))
+            for facet, totals in merged.items()}
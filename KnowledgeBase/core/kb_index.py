@@ -0,0 +1,881 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库内存索引
+
+启动后一次性读取文档目录下的所有Markdown文档，按标题切分为章节，并在建立索引时完成：
+    - 文档和章节的小写内容，搜索时不再读取文件
+    - 章节级的近似重复检测（MinHash/LSH），搜索结果中的重复命中会被合并
+    - 把章节按段落切分为段落块（passage），预先估算token数并建立BM25倒排索引，
+      用于按token预算返回与查询最相关的段落
+    - 提取代码块和行内代码中的标识符，建立C#符号表（见symbols.py）
+    - 文档标题、章节标题、符号和高频词的前缀补全（见suggest.py）
+    - 项目中的C#源码（KB_SOURCE_DIRS，默认为 Assets/Scripts/UIFramework）按类型和成员声明切分为章节，
+      与文档一起参与搜索、段落检索和符号查找（见csharp_source.py）
+    - 文档级的位置倒排索引，用于执行布尔、短语和字段查询（见query_language.py）
+    - 分类、文档类型和章节层级的分面位图，用于统计和过滤搜索结果（见facets.py）
+
+用法:
+    python kb_index.py --duplicates            # 输出近似重复章节报告
+    python kb_index.py --docs-dir /tmp/corpus --duplicates
+    python kb_index.py --passages "Canvas重建" --budget 800
+    python kb_index.py --symbol Graphic.SetVerticesDirty
+    python kb_index.py --symbol Layout --prefix
+    python kb_index.py --suggest Canv
+    python kb_index.py --search 'Canvas AND Rebuild NOT Layout'
+    python kb_index.py --section Assets/Scripts/UIFramework/Core/ObjectPool.cs ObjectPool.Get
+"""
+
+import os
+import re
+import sys
+import math
+import bisect
+import time
+import threading
+import collections
+from array import array
+
+import minhash
+import symbols
+import suggest
+import csharp_source
+import query_language
+import storage as storage_module
+import facets
+
+# 近似重复的相似度阈值，以及参与检测的章节最少shingle数量（过短的章节如“概述”不参与）
+DUPLICATE_THRESHOLD = float(os.environ.get('KB_DUPLICATE_THRESHOLD', '0.8'))
+MIN_DUPLICATE_SHINGLES = 40
+
+# 搜索结果预览长度
+PREVIEW_LENGTH = 200
+
+# 段落块的目标token数，以及retrieve_passages默认和最大的token预算
+PASSAGE_TOKENS = int(os.environ.get('KB_PASSAGE_TOKENS', '200'))
+DEFAULT_TOKEN_BUDGET = 1000
+MAX_TOKEN_BUDGET = 16000
+
+# 作为补全候选的高频词：最短长度和最少出现次数
+SUGGEST_TERM_LENGTH = 3
+SUGGEST_TERM_COUNT = 3
+
+# 每个索引缓存的最近查询的命中文档数量，按分面过滤缩小结果时不再重新执行查询
+MATCH_CACHE_SIZE = 64
+
+# 索引占用内存与文档内容字符数之比的估计值。文档只保存原文和一份小写副本，章节和段落块按行号引用原文，
+# 其余是BM25倒排索引、位置倒排索引、符号表和补全候选。
+# 用tracemalloc测量建立完成后仍被索引引用的内存（Python 3.11，不含源码目录）：
+#   Docs目录（18篇，21.8万字符）约63倍，建立过程中的峰值约73倍；
+#   benchmarks/gen_corpus.py --docs 1000 生成的语料（727万字符）约50倍，峰值约60倍。
+# 取65，略高于测量值中较大的一个；文档结构或索引内容变化较大时应重新测量
+MEMORY_FACTOR = 65
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_FENCE = re.compile(r'^\s*(```|~~~)')
+
+# token估算：每个汉字、每个英文单词（或数字）、每个标点各算一个token
+_TOKEN = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]|[^\W_]+|[^\w\s]')
+# 检索用的词项：英文单词和数字，汉字按相邻两字切分
+_WORD = re.compile(r'[a-z0-9_]+|[\u3400-\u9fff\uf900-\ufaff]+')
+_CJK = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+
+
+def count_tokens(text):
+    """估算文本的token数量，与常见LLM分词器的结果接近但不完全相同"""
+    return len(_TOKEN.findall(text))
+
+
+def terms(text):
+    """把文本切分为检索词项（小写英文单词；汉字单字和相邻两字）"""
+    result = []
+    for word in _WORD.findall(text.lower()):
+        if _CJK.match(word):
+            result.extend(word)
+            result.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            result.append(word)
+    return result
+
+
+def line_offsets(text):
+    """每行在text中的起始偏移，最后一项为text的长度；行的划分与str.splitlines一致"""
+    offsets = array('I', [0])
+    position = 0
+    for line in text.splitlines(True):
+        position += len(line)
+        offsets.append(position)
+    return offsets
+
+
+class Section:
+    """文档中的一个章节：从一个标题到下一个标题之前"""
+
+    def __init__(self, doc, position, heading, level, start_line, end_line):
+        self.doc = doc
+        self.position = position
+        self.heading = heading
+        self.level = level
+        # 从一级标题到本章节的标题路径，由parse_sections填写
+        self.heading_path = [heading] if heading else []
+        # 行号从1开始，包含标题行；内容不单独保存，需要时从文档内容中截取
+        self.start_line = start_line
+        self.end_line = end_line
+        # 近似重复簇编号，不属于任何簇时为None
+        self.cluster = None
+        # 源码章节的声明类别；container表示类型声明，其范围包含成员章节
+        self.kind = 'section'
+        self.container = False
+
+    @property
+    def key(self):
+        return self.doc.path, self.position
+
+    @property
+    def text(self):
+        return self.doc.line_text(self.start_line, self.end_line)
+
+    def contains_text(self, lowered):
+        """章节内容是否包含lowered（不区分大小写），直接在文档的小写内容中按章节范围查找"""
+        offsets = self.doc.lowered_offsets
+        return self.doc.lowered.find(lowered, offsets[self.start_line - 1], offsets[self.end_line]) >= 0
+
+    def describe(self):
+        return {
+            'category': self.doc.category,
+            'name': self.doc.name,
+            'path': self.doc.path,
+            'section': self.heading,
+            'start_line': self.start_line,
+            'end_line': self.end_line,
+        }
+
+    def contains(self, line):
+        return self.start_line <= line <= self.end_line
+
+
+class Document:
+    """一篇Markdown文档"""
+
+    def __init__(self, category, path, content):
+        self.category = category
+        # 相对于文档目录的路径，统一使用/分隔
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.content = content
+        self.lowered = content.lower()
+        # 每行在content和lowered中的起始偏移；个别字符转换为小写后长度会变化，此时两者不同
+        self.offsets = line_offsets(content)
+        self.lowered_offsets = self.offsets if len(self.lowered) == len(content) else line_offsets(self.lowered)
+        # 所属的索引和在索引中的序号，由KnowledgeIndex.build填写（近似重复簇编号只在同一索引内有意义）
+        self.index = None
+        self.number = None
+        # 每行第一个词在位置索引中的位置，用于把命中位置换算为行号
+        self.line_starts = None
+        self.sections = self._parse_sections(content)
+        self.section_starts = [section.start_line for section in self.sections]
+
+    def _parse_sections(self, content):
+        return parse_sections(self, content)
+
+    def preview(self):
+        return self.content[:PREVIEW_LENGTH] + '...'
+
+    def line_text(self, start_line, end_line):
+        """第start_line到end_line行（从1开始，包含两端）的内容，以换行符连接"""
+        return '\n'.join(self.content[self.offsets[start_line - 1]:self.offsets[end_line]].splitlines())
+
+    def section_at(self, line):
+        """包含指定行的最内层章节：从起始行不晚于line的最后一个章节向前找第一个包含该行的章节"""
+        for position in range(bisect.bisect_right(self.section_starts, line) - 1, -1, -1):
+            if self.sections[position].contains(line):
+                return self.sections[position]
+        return None
+
+    def find_section(self, name):
+        """按标题或标题路径（以 > 分隔）查找章节"""
+        for section in self.sections:
+            if section.heading == name or ' > '.join(section.heading_path) == name:
+                return section
+        return None
+
+
+class SourceDocument(Document):
+    """一个C#源码文件，章节为其中的类型和成员声明（不包括字段）"""
+
+    def __init__(self, category, path, content, declarations):
+        self.declarations = declarations
+        super().__init__(category, path, content)
+
+    def _parse_sections(self, content):
+        count = len(self.offsets) - 1
+        sections = []
+        for declaration in self.declarations:
+            if declaration['kind'] == 'field':
+                continue
+            start, end = declaration['start_line'], min(declaration['end_line'], count)
+            section = Section(self, len(sections), declaration['qualified'], declaration['depth'] + 1, start, end)
+            section.heading_path = declaration['qualified'].split('.')
+            section.kind = declaration['kind']
+            section.container = declaration['kind'] in csharp_source.TYPE_KINDS
+            sections.append(section)
+        return sections
+
+    def leaf_sections(self):
+        """不包含其他章节的章节：成员，以及没有成员章节的类型（如枚举）"""
+        return [section for section in self.sections
+                if not section.container
+                or not any(other is not section and section.contains(other.start_line) for other in self.sections)]
+
+
+def parse_sections(doc, content):
+    """按Markdown标题切分章节，忽略代码块中以#开头的行；第一个标题之前的内容作为无标题章节"""
+    sections = []
+    heading, level, start, lines = '', 0, 1, []
+    in_fence = False
+    for number, line in enumerate(content.splitlines(), 1):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING.match(line)
+        if match:
+            if lines and (heading or any(part.strip() for part in lines)):
+                sections.append(Section(doc, len(sections), heading, level, start, number - 1))
+            heading, level, start, lines = match.group(2), len(match.group(1)), number, []
+        lines.append(line)
+    if lines and (heading or any(part.strip() for part in lines)):
+        sections.append(Section(doc, len(sections), heading, level, start, start + len(lines) - 1))
+
+    # 标题路径：保留层级更高的上级标题
+    parents = []
+    for section in sections:
+        if not section.heading:
+            continue
+        while parents and parents[-1].level >= section.level:
+            parents.pop()
+        section.heading_path = [parent.heading for parent in parents] + [section.heading]
+        parents.append(section)
+    return sections
+
+
+class Passage:
+    """章节中连续的若干段落，是retrieve_passages返回的最小单位"""
+
+    def __init__(self, section, start_line, lines):
+        self.section = section
+        self.start_line = start_line
+        self.end_line = start_line + len(lines) - 1
+        text = self.text
+        self.title = ' > '.join(section.heading_path)
+        # 返回给客户端的内容包含标题路径，token数一并计算
+        self.tokens = count_tokens(self.title) + count_tokens(text)
+        # 词项字符串在所有段落块之间共享，不为每个段落块各保存一份
+        self.term_counts = {}
+        for term in terms(self.title + '\n' + text):
+            term = sys.intern(term)
+            self.term_counts[term] = self.term_counts.get(term, 0) + 1
+        self.length = sum(self.term_counts.values())
+
+    @property
+    def text(self):
+        return self.section.doc.line_text(self.start_line, self.end_line).strip('\n')
+
+    def describe(self, score):
+        doc = self.section.doc
+        return {
+            'category': doc.category,
+            'name': doc.name,
+            'path': doc.path,
+            'section': self.title,
+            'start_line': self.start_line,
+            'end_line': self.end_line,
+            'tokens': self.tokens,
+            'score': round(score, 3),
+            'text': self.text,
+        }
+
+
+def _blocks(section):
+    """把章节切分为段落块 [(起始行号, [行])]：空行分隔段落，代码块整体作为一个段落"""
+    blocks = []
+    current, start = [], section.start_line
+    in_fence = False
+    for number, line in enumerate(section.text.split('\n'), section.start_line):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        if not in_fence and not line.strip():
+            if current:
+                blocks.append((start, current))
+            current, start = [], number + 1
+            continue
+        if not current:
+            start = number
+        current.append(line)
+    if current:
+        blocks.append((start, current))
+    return blocks
+
+
+def split_passages(section, target_tokens=PASSAGE_TOKENS):
+    """合并相邻段落直到接近target_tokens；单个段落超过目标时按行切分"""
+    passages = []
+    current, start, size = [], section.start_line, 0
+
+    def flush():
+        # 只有标题行（下面紧接着子标题）的段落块没有内容，不参与检索
+        if any(line.strip() and not _HEADING.match(line) for line in current):
+            passages.append(Passage(section, start, current))
+
+    for block_start, block in _blocks(section):
+        block_tokens = count_tokens('\n'.join(block))
+        if current and size + block_tokens > target_tokens:
+            flush()
+            current, size = [], 0
+        if block_tokens > target_tokens:
+            # 超长段落（通常是大段代码）按行切分
+            for offset, line in enumerate(block):
+                line_tokens = count_tokens(line)
+                if current and size + line_tokens > target_tokens:
+                    flush()
+                    current, size = [], 0
+                if not current:
+                    start = block_start + offset
+                current.append(line)
+                size += line_tokens
+            continue
+        if not current:
+            start = block_start
+        else:
+            # 保留段落之间的空行，行号保持连续
+            current.extend([''] * (block_start - start - len(current)))
+        current.extend(block)
+        size += block_tokens
+    flush()
+    return passages
+
+
+# 源码解析结果在进程内共享，重建索引时未变化的文件不再解析
+_source_parser = csharp_source.SourceParser()
+
+
+class KnowledgeIndex:
+    """文档目录（以及项目源码）的内存索引"""
+
+    def __init__(self, docs_dir, duplicate_threshold=DUPLICATE_THRESHOLD, source_root=None, source_dirs=None,
+                 parser=None, storage=None):
+        self.docs_dir = docs_dir
+        # 文档从存储后端读取，默认直接读取文档目录
+        self.storage = storage or storage_module.FileSystemStorage(docs_dir)
+        self.duplicate_threshold = duplicate_threshold
+        # 源码路径相对于项目根目录，默认为文档目录的上一级
+        self.source_root = source_root or os.environ.get('KB_SOURCE_ROOT') or \
+            os.path.dirname(os.path.abspath(docs_dir))
+        self.source_dirs = source_dirs if source_dirs is not None else csharp_source.source_dirs(self.source_root)
+        self.parser = parser or _source_parser
+        self.source_stats = {'files': 0, 'parsed': 0, 'reused': 0}
+        self.documents = []
+        self.by_path = {}
+        self.clusters = []
+        self.passages = []
+        # 词项 -> [(段落块序号, 词频)]
+        self.postings = {}
+        self.average_length = 0.0
+        self.symbols = symbols.SymbolTable()
+        self.suggester = suggest.Suggester(())
+        # 位置倒排索引：词 -> PostingList，有序的词表，小写分类 -> 有序的文档序号
+        self.doc_postings = {}
+        self.vocabulary = []
+        self.category_docs = {}
+        self.facets = facets.FacetIndex(())
+        # 查询 -> (命中, 得分, 命中位图)；索引建立后不再变化，缓存不需要失效
+        self._matches = collections.OrderedDict()
+        self._matches_lock = threading.Lock()
+        self.build_seconds = 0.0
+
+    def build(self):
+        """读取所有文档并建立索引"""
+        started = time.perf_counter()
+        # 文档目录为空时只索引源码
+        for category, path, content in self.storage.iter_documents():
+            doc = Document(category, path, content)
+            doc.index = self
+            self.documents.append(doc)
+            self.by_path[path] = doc
+        self._load_sources()
+        self._detect_duplicates()
+        self._build_passages()
+        self._build_symbols()
+        self._build_suggester()
+        self._build_positions()
+        self._build_facets()
+        self.build_seconds = time.perf_counter() - started
+        return self
+
+    def _load_sources(self):
+        """读取并解析源码目录下的C#文件，解析结果按内容哈希复用"""
+        parser = self.parser
+        parsed, reused = parser.parsed, parser.reused
+        digests = set()
+        for source_dir in self.source_dirs:
+            category = os.path.basename(source_dir)
+            for dir_path, dir_names, file_names in os.walk(source_dir):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    if not file_name.endswith('.cs'):
+                        continue
+                    file_path = os.path.join(dir_path, file_name)
+                    with open(file_path, 'r', encoding='utf-8-sig') as f:
+                        content = f.read()
+                    digests.add(csharp_source.content_hash(content))
+                    path = os.path.relpath(file_path, self.source_root).replace(os.sep, '/')
+                    doc = SourceDocument(category, path, content, parser.parse(content))
+                    doc.index = self
+                    self.documents.append(doc)
+                    self.by_path[path] = doc
+        if self.source_dirs:
+            parser.save(keep=digests)
+        self.source_stats = {
+            'files': len(digests),
+            'parsed': parser.parsed - parsed,
+            'reused': parser.reused - reused,
+        }
+
+    def sections(self):
+        for doc in self.documents:
+            yield from doc.sections
+
+    def leaf_sections(self):
+        """互不包含的章节：文档的所有章节，源码中不包含成员的声明"""
+        for doc in self.documents:
+            if isinstance(doc, SourceDocument):
+                yield from doc.leaf_sections()
+            else:
+                yield from doc.sections
+
+    def _detect_duplicates(self):
+        """计算章节的MinHash签名并聚类"""
+        sections = {}
+        signatures = {}
+        for section in self.leaf_sections():
+            hashes = minhash.shingle_hashes(section.text)
+            if len(hashes) >= MIN_DUPLICATE_SHINGLES:
+                sections[section.key] = section
+                signatures[section.key] = minhash.signature(hashes)
+
+        self.clusters = []
+        for members in minhash.find_clusters(signatures, self.duplicate_threshold):
+            cluster_id = len(self.clusters)
+            cluster = [sections[key] for key in members]
+            for section in cluster:
+                section.cluster = cluster_id
+            first = signatures[members[0]]
+            self.clusters.append({
+                'id': cluster_id,
+                'similarity': round(min(minhash.similarity(first, signatures[key]) for key in members[1:]), 3),
+                'sections': cluster,
+            })
+
+    def _build_passages(self):
+        """切分段落块并建立BM25倒排索引"""
+        self.passages = []
+        for section in self.leaf_sections():
+            self.passages.extend(split_passages(section))
+        self.postings = {}
+        for number, passage in enumerate(self.passages):
+            for term, count in passage.term_counts.items():
+                self.postings.setdefault(term, []).append((number, count))
+        total = sum(passage.length for passage in self.passages)
+        self.average_length = total / len(self.passages) if self.passages else 0.0
+
+    def _build_symbols(self):
+        """提取所有章节中代码块和行内代码的符号，建立符号表"""
+        self.symbols = symbols.SymbolTable()
+        for doc in self.documents:
+            if isinstance(doc, SourceDocument):
+                self._add_source_symbols(doc)
+                continue
+            for section in doc.sections:
+                self.symbols.add_markdown(section.text.split('\n'), section.start_line, _location(doc, section))
+        self.symbols.freeze()
+
+    def _add_source_symbols(self, doc):
+        """源码的定义直接来自解析出的声明，引用按行归属到最内层的声明"""
+        for declaration in doc.declarations:
+            location = _location(doc, doc.section_at(declaration['line']))
+            for name in (declaration['name'], declaration['qualified']):
+                self.symbols.add(name, declaration['line'], 'definition', declaration['signature'], location)
+        for symbol, line, kind, context in symbols.extract(doc.content.splitlines()):
+            self.symbols.add(symbol, line, kind, context, _location(doc, doc.section_at(line)))
+
+    def _build_suggester(self):
+        """收集补全候选：文档标题、Markdown章节标题、符号和高频英文词"""
+        entries = []
+        for doc in self.documents:
+            entries.append((doc.name, 'title', 1, doc.path))
+            if isinstance(doc, SourceDocument):
+                continue
+            for section in doc.sections:
+                if section.heading:
+                    entries.append((suggest.normalize_heading(section.heading), 'heading', 1, doc.path))
+        for symbol, occurrences in self.symbols.exact.items():
+            entries.append((symbol, 'symbol', len(occurrences), occurrences[0].get('path')))
+        counts = {}
+        for passage in self.passages:
+            for term, count in passage.term_counts.items():
+                counts[term] = counts.get(term, 0) + count
+        for term, count in counts.items():
+            if count >= SUGGEST_TERM_COUNT and len(term) >= SUGGEST_TERM_LENGTH and term[0].isascii() \
+                    and term[0].isalpha():
+                entries.append((term, 'term', count, None))
+        self.suggester = suggest.Suggester(entries)
+
+    def _build_positions(self):
+        """建立文档级的位置倒排索引（查询语言使用）"""
+        # 词 -> (文档序号, 位置偏移, 位置)，文档按序号依次加入，两个列表都保持有序
+        lists = {}
+        categories = {}
+        for number, doc in enumerate(self.documents):
+            doc.number = number
+            categories.setdefault(doc.category.lower(), []).append(number)
+            positions = {}
+            line_starts = []
+            position = 0
+            for line in doc.lowered.split('\n'):
+                line_starts.append(position)
+                for token in query_language.tokenize(line):
+                    positions.setdefault(token, []).append(position)
+                    position += 1
+            doc.line_starts = array('I', line_starts)
+            for token, token_positions in positions.items():
+                entry = lists.get(token)
+                if entry is None:
+                    entry = lists[token] = ([], [0], [])
+                entry[0].append(number)
+                entry[2].extend(token_positions)
+                entry[1].append(len(entry[2]))
+        self.doc_postings = {token: query_language.PostingList(*entry) for token, entry in lists.items()}
+        self.vocabulary = sorted(self.doc_postings)
+        self.category_docs = {category: array('I', numbers) for category, numbers in categories.items()}
+
+    def _build_facets(self):
+        """计算每篇文档的分面值并建立分面位图"""
+        values = []
+        for doc in self.documents:
+            values.append((doc.number, {
+                'category': [doc.category],
+                'type': [facets.SOURCE if isinstance(doc, SourceDocument) else facets.MARKDOWN],
+                'depth': sorted({section.level for section in doc.sections if section.level > 0}),
+            }))
+        self.facets = facets.FacetIndex(values)
+
+    def _allowed(self, filters):
+        """满足分面过滤条件的文档序号集合，没有过滤条件时返回None"""
+        filters = self.facets.normalize(filters)
+        if not filters:
+            return None
+        return set(facets.members(self.facets.mask(filters)))
+
+    def suggest(self, prefix, limit=suggest.DEFAULT_LIMIT):
+        """按前缀返回补全候选"""
+        return self.suggester.suggest(prefix, limit)
+
+    def find_symbol(self, symbol, prefix=False, limit=symbols.DEFAULT_SYMBOL_LIMIT):
+        """查找C#符号在文档代码块中的定义和引用位置，prefix为True时按前缀查找"""
+        if prefix:
+            return self.symbols.prefix(symbol, limit)
+        return self.symbols.lookup(symbol)
+
+    def _passage_scores(self, query):
+        """查询与各段落块的BM25得分，返回 {段落块序号: 得分}"""
+        count = len(self.passages)
+        scores = {}
+        for term in set(terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for number, frequency in postings:
+                length = self.passages[number].length
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.average_length)
+                scores[number] = scores.get(number, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+    def rank_passages(self, query, filters=None):
+        """按BM25得分从高到低返回 [(得分, 段落块)]，filters为分面过滤条件"""
+        scores = self._passage_scores(query)
+        allowed = self._allowed(filters)
+        if allowed is not None:
+            scores = {number: score for number, score in scores.items()
+                      if self.passages[number].section.doc.number in allowed}
+        return [(score, self.passages[number])
+                for number, score in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+
+    def retrieve_passages(self, query, budget=DEFAULT_TOKEN_BUDGET, filters=None):
+        """返回与查询最相关的段落块，总token数不超过budget（见pack_passages）"""
+        return pack_passages(query, self.rank_passages(query, filters), budget)
+
+    def _match(self, query):
+        """执行查询，返回 (按得分排序的 [(文档, 命中的章节)], {文档路径: 得分}, 命中文档位图)，结果缓存"""
+        with self._matches_lock:
+            cached = self._matches.get(query)
+            if cached is not None:
+                self._matches.move_to_end(query)
+                return cached
+
+        node = query_language.parse_query(query)
+        if node is not None:
+            hits = self._execute(node)
+            scoring = ' '.join(query_language.positive_text(node))
+        else:
+            lowered = query.lower()
+            hits = [(doc, [section for section in doc.sections if section.contains_text(lowered)])
+                    for doc in self.documents if lowered in doc.lowered]
+            scoring = query
+
+        # 结果按文档中得分最高的段落块排序，便于与其他知识库的结果合并
+        best = {}
+        for number, score in self._passage_scores(scoring).items():
+            doc = self.passages[number].section.doc
+            if score > best.get(doc.path, 0.0):
+                best[doc.path] = score
+        hits.sort(key=lambda hit: -best.get(hit[0].path, 0.0))
+
+        match = hits, best, facets.bitset(doc.number for doc, _ in hits)
+        with self._matches_lock:
+            self._matches[query] = match
+            while len(self._matches) > MATCH_CACHE_SIZE:
+                self._matches.popitem(last=False)
+        return match
+
+    def search(self, query, collapse=True, filters=None):
+        """在所有文档中搜索
+
+        不含查询语法的查询按子串搜索（不区分大小写）；使用AND、OR、NOT、短语、前缀或字段过滤的查询
+        在位置倒排索引上执行（见query_language.py），明确使用了查询语法的查询语法错误时抛出QuerySyntaxError。
+        filters为分面过滤条件（见facets.py），条件无效时抛出FacetFilterError；
+        最近的查询结果有缓存，同一查询换用不同的过滤条件时不再重新执行。
+
+        collapse为True时，如果一篇文档命中的章节都与之前结果中的章节近似重复，
+        该文档不再单独返回，而是列在之前结果的alternates中。
+        """
+        hits, best, _ = self._match(query)
+        allowed = self._allowed(filters)
+        if allowed is not None:
+            hits = [hit for hit in hits if hit[0].number in allowed]
+
+        results = []
+        # 簇编号 -> 首次覆盖该簇的结果
+        covered = {}
+        for doc, matched in hits:
+            # 源码中的类型声明包含成员，优先报告命中的成员
+            matched = sorted(matched, key=lambda section: section.container)
+            result = {
+                'category': doc.category,
+                'name': doc.name,
+                'path': doc.path,
+                'preview': doc.preview(),
+                'section': matched[0].heading if matched else '',
+                'score': round(best.get(doc.path, 0.0), 3),
+                'alternates': [],
+            }
+            clusters = [section.cluster for section in matched]
+            if collapse and matched and all(cluster is not None and cluster in covered for cluster in clusters):
+                covered[clusters[0]]['alternates'].append({
+                    'category': doc.category,
+                    'name': doc.name,
+                    'path': doc.path,
+                    'section': matched[0].heading,
+                })
+                continue
+            for cluster in clusters:
+                if cluster is not None:
+                    covered.setdefault(cluster, result)
+            results.append(result)
+        return results
+
+    def facet_counts(self, query, filters=None):
+        """查询命中文档的分面统计（见FacetIndex.counts）"""
+        _, _, matched = self._match(query)
+        return self.facets.counts(matched, self.facets.normalize(filters))
+
+    def match_count(self, query, filters=None):
+        """满足过滤条件的命中文档数量（合并近似重复之前）"""
+        _, _, matched = self._match(query)
+        return (matched & self.facets.mask(self.facets.normalize(filters))).bit_count()
+
+    def _execute(self, node):
+        """执行查询语法树，返回 [(文档, 命中的章节)]，章节按命中位置所在的行确定"""
+        executor = query_language.Executor(self)
+        hits = []
+        for number in executor.documents(node):
+            doc = self.documents[number]
+            lines = executor.hit_lines(node, number)
+            matched = []
+            for line in sorted(lines):
+                section = doc.section_at(line)
+                if section is not None and section not in matched:
+                    matched.append(section)
+            hits.append((doc, matched))
+        return hits
+
+    def get_section(self, path, section=None, line=None):
+        """返回文档或源码文件中的一个章节（按标题、标题路径或包含的行号查找），找不到时返回None"""
+        doc = self.by_path.get(path)
+        if doc is None:
+            return None
+        found = doc.find_section(section) if section else doc.section_at(int(line)) if line else None
+        if found is None:
+            return None
+        result = found.describe()
+        result['kind'] = found.kind
+        result['text'] = found.text
+        return result
+
+    def duplicate_report(self):
+        """近似重复章节报告，按簇大小排序"""
+        report = []
+        for cluster in sorted(self.clusters, key=lambda item: (-len(item['sections']), item['id'])):
+            report.append({
+                'id': cluster['id'],
+                'similarity': cluster['similarity'],
+                'sections': [section.describe() for section in cluster['sections']],
+            })
+        return report
+
+    def stats(self):
+        return {
+            'documents': len(self.documents),
+            'sections': sum(len(doc.sections) for doc in self.documents),
+            'duplicate_clusters': len(self.clusters),
+            'duplicate_sections': sum(len(cluster['sections']) for cluster in self.clusters),
+            'passages': len(self.passages),
+            'passage_tokens': sum(passage.tokens for passage in self.passages),
+            'symbols': len(self.symbols),
+            'suggestions': len(self.suggester),
+            'source_files': self.source_stats['files'],
+            'source_parsed': self.source_stats['parsed'],
+            'source_reused': self.source_stats['reused'],
+            'build_ms': round(self.build_seconds * 1000, 1),
+            'memory_bytes': self.memory_estimate(),
+        }
+
+    def memory_estimate(self):
+        """索引占用内存的估计值（字节）"""
+        return sum(len(doc.content) for doc in self.documents) * MEMORY_FACTOR
+
+
+def pack_passages(query, ranked, budget=DEFAULT_TOKEN_BUDGET, describe=None):
+    """把 [(得分, 段落块)] 按得分从高到低贪心装入token预算
+
+    放不下的段落块跳过并继续尝试后面较短的；与已选段落块属于同一近似重复簇的章节不再重复返回。
+    describe用于生成每个段落块的结果，默认为Passage.describe。
+    """
+    budget = max(0, min(int(budget), MAX_TOKEN_BUDGET))
+    selected = []
+    used = 0
+    # (索引, 簇编号) -> 已选中的章节
+    clusters = {}
+    for score, passage in ranked:
+        if used >= budget:
+            break
+        if used + passage.tokens > budget:
+            continue
+        cluster = passage.section.cluster
+        if cluster is not None:
+            key = (id(passage.section.doc.index), cluster)
+            if clusters.setdefault(key, passage.section.key) != passage.section.key:
+                continue
+        selected.append(describe(score, passage) if describe else passage.describe(score))
+        used += passage.tokens
+    return {
+        'query': query,
+        'budget': budget,
+        'tokens': used,
+        'passages': selected,
+    }
+
+
+def _location(doc, section):
+    return {
+        'category': doc.category,
+        'name': doc.name,
+        'path': doc.path,
+        'section': ' > '.join(section.heading_path) if section else '',
+    }
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description='UGUI知识库内存索引')
+    parser.add_argument('--docs-dir', default=os.environ.get('DOCS_DIR', os.path.join(root_dir, 'Docs')), help='文档目录')
+    parser.add_argument('--duplicates', action='store_true', help='输出近似重复章节报告')
+    parser.add_argument('--passages', metavar='QUERY', help='按token预算检索段落块')
+    parser.add_argument('--budget', type=int, default=DEFAULT_TOKEN_BUDGET, help='--passages的token预算')
+    parser.add_argument('--symbol', help='查找C#符号')
+    parser.add_argument('--prefix', action='store_true', help='--symbol按前缀查找')
+    parser.add_argument('--suggest', metavar='PREFIX', help='输出前缀补全候选和查询耗时')
+    parser.add_argument('--search', metavar='QUERY', help='搜索文档（支持查询语法）并输出查询耗时')
+    parser.add_argument('--section', nargs=2, metavar=('PATH', 'NAME'), help='输出一个章节（NAME为标题或行号）')
+    args = parser.parse_args()
+
+    index = KnowledgeIndex(args.docs_dir).build()
+    stats = index.stats()
+    print(f"文档 {stats['documents']} 篇，章节 {stats['sections']} 个，"
+          f"近似重复簇 {stats['duplicate_clusters']} 个（{stats['duplicate_sections']} 个章节），"
+          f"段落块 {stats['passages']} 个（{stats['passage_tokens']} tokens），符号 {stats['symbols']} 个，"
+          f"源码 {stats['source_files']} 个（解析 {stats['source_parsed']}，复用 {stats['source_reused']}），"
+          f"耗时 {stats['build_ms']} ms")
+    if args.duplicates:
+        for cluster in index.duplicate_report():
+            print(f"\n簇 {cluster['id']}（相似度 ≥ {cluster['similarity']}）")
+            for section in cluster['sections']:
+                print(f"  {section['path']}:{section['start_line']}-{section['end_line']}  {section['section']}")
+    if args.passages:
+        result = index.retrieve_passages(args.passages, args.budget)
+        print(f"\n查询 {args.passages!r}：{len(result['passages'])} 个段落块，{result['tokens']}/{result['budget']} tokens")
+        for passage in result['passages']:
+            print(f"  [{passage['score']:.2f}] {passage['path']}:{passage['start_line']}-{passage['end_line']}"
+                  f"  {passage['section']}  ({passage['tokens']} tokens)")
+    if args.symbol:
+        for match in index.find_symbol(args.symbol, prefix=args.prefix):
+            print(f"\n{match['symbol']}：{match['definitions']} 处定义，共 {match['count']} 处")
+            for occurrence in match['occurrences']:
+                print(f"  {occurrence['kind']:<10} {occurrence['path']}:{occurrence['line']}  {occurrence['context']}")
+    if args.suggest:
+        started = time.perf_counter()
+        suggestions = index.suggest(args.suggest)
+        elapsed = (time.perf_counter() - started) * 1e6
+        print(f"\n补全 {args.suggest!r}：{len(suggestions)} 个候选，耗时 {elapsed:.0f} us")
+        for item in suggestions:
+            print(f"  {item['weight']:>6}  {item['kind']:<8}{item['text']}")
+    if args.search:
+        started = time.perf_counter()
+        try:
+            results = index.search(args.search)
+        except query_language.QuerySyntaxError as e:
+            print(f"\n查询语法错误: {e}")
+            return 1
+        elapsed = (time.perf_counter() - started) * 1e3
+        print(f"\n搜索 {args.search!r}：{len(results)} 个结果，耗时 {elapsed:.2f} ms")
+        for result in results[:20]:
+            print(f"  [{result['score']:.2f}] {result['path']}  {result['section']}")
+    if args.section:
+        path, name = args.section
+        section = index.get_section(path, line=name) if name.isdigit() else index.get_section(path, section=name)
+        if section is None:
+            print(f"\n未找到章节: {path} {name}")
+            return 1
+        print(f"\n{section['path']}:{section['start_line']}-{section['end_line']}  {section['section']}\n")
+        print(section['text'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
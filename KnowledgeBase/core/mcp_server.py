@@ -9,26 +9,70 @@ UGUI知识库MCP服务器
 
 import os
 import sys
-import json
-import glob
-import markdown
-from typing import Dict, List, Optional, Any
-from fastapi import FastAPI, HTTPException, Request
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Any, Tuple, Callable, Awaitable
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-import uvicorn
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 
-# 获取文档目录
+import metrics
+import profiling
+import access_log
+import admission
+import singleflight
+import serialization
+import kb_index
+import query_language
+import facets
+import suggest as suggest_module
+import corpora
+import storage
+
+# 获取文档目录（未设置KB_MOUNTS时作为唯一的知识库）
 DOCS_DIR = os.environ.get("DOCS_DIR", "../Docs")
-if not os.path.exists(DOCS_DIR):
-    print(f"错误: 文档目录不存在: {DOCS_DIR}")
-    print("请设置正确的DOCS_DIR环境变量")
+
+# 挂载的知识库，每个知识库的内存索引在首次使用时建立
+try:
+    registry = corpora.from_environment(DOCS_DIR)
+except (ValueError, storage.StorageError) as e:
+    print(f"错误: {e}")
+    sys.exit(1)
+
+# 启动时校验准入控制配置，避免格式错误的KB_ADMISSION_*在第一个请求时才失败
+try:
+    admission_limits = admission.load_limits()
+except ValueError as e:
+    print(f"错误: {e}")
     sys.exit(1)
 
-print(f"使用文档目录: {DOCS_DIR}")
+for corpus in registry.corpora.values():
+    if corpus.storage.kind == storage.SQLITE:
+        documents = f"数据库 {corpus.storage.db_path}"
+    elif corpus.docs_dir and not os.path.exists(corpus.docs_dir):
+        print(f"错误: 文档目录不存在: {corpus.docs_dir}")
+        print("请设置正确的DOCS_DIR或KB_MOUNTS环境变量")
+        sys.exit(1)
+    else:
+        documents = f"文档目录 {corpus.docs_dir or '（无）'}"
+    print(f"知识库 {corpus.name}: {documents}，源码目录 {', '.join(corpus.source_dirs) or '（无）'}")
+
+metrics.INDEX_SIZE.set_function(registry.documents, "mcp")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """所有知识库共享一个工作线程池（asyncio.to_thread使用默认执行器），并在后台建立索引"""
+    asyncio.get_running_loop().set_default_executor(registry.executor)
+    registry.warm()
+    yield
 
 # 创建FastAPI应用
-app = FastAPI(title="UGUI知识库MCP服务器")
+app = FastAPI(title="UGUI知识库MCP服务器", lifespan=lifespan)
+
+# 按工具进行准入控制，超出并发和等待限制的请求快速返回503
+app.add_middleware(admission.AdmissionMiddleware, server="mcp", routes=app.routes, limits=admission_limits)
 
 # 配置CORS
 app.add_middleware(
@@ -39,157 +83,583 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 请求指标统计
+app.add_middleware(metrics.MetricsMiddleware, server="mcp")
+
+# 按需请求分析，未开启时不安装中间件
+if profiling.is_active():
+    app.add_middleware(profiling.ProfilingMiddleware, server="mcp")
+
+# 结构化访问日志
+if access_log.is_enabled():
+    app.add_middleware(access_log.AccessLogMiddleware, server="mcp")
+
+# 合并相同的并发工具调用
+flights = singleflight.AsyncSingleFlight(server="mcp")
+
+# 一次批量调用最多包含的工具调用数
+BATCH_MAX_CALLS = int(os.environ.get("KB_BATCH_MAX_CALLS", "64"))
+
+BATCH_CALLS = metrics.REGISTRY.counter(
+    "kb_batch_calls_total", "批量调用中的工具调用数", ("server", "tool", "status"))
+
+logger = logging.getLogger("kb.mcp")
+
 # 定义模型
+# 路由不把模型声明为请求体参数，而是在处理请求时用read_body解析：FastAPI注册路由时会为请求体和
+# response_model生成pydantic字段（并导入pydantic.v1做兼容检查），十几个工具路由合计占启动耗时的约30毫秒。
+# 模型的校验逻辑推迟到第一次使用时生成（defer_build）
 class ToolInput(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     args: Dict[str, Any] = Field(default={})
+    # 客户端缓存的结果的ETag，结果没有变化时返回 {"status": 304, "etag"}（见serialization.py）
+    etag: Optional[str] = None
+
+class BatchCall(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
+    tool: str
+    args: Dict[str, Any] = Field(default={})
+    # 客户端缓存的结果的ETag，结果没有变化时该调用返回 {"status": 304, "etag"}
+    etag: Optional[str] = None
+
+class BatchInput(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
+    calls: List[BatchCall] = Field(default=[])
+
+# 接口文档中的请求体和响应结构（与上面的模型一致）
+TOOL_INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "args": {"type": "object", "default": {}, "description": "工具参数"},
+        "etag": {"type": "string", "description": "缓存的结果的ETag，结果没有变化时返回 {\"status\": 304, \"etag\"}"},
+    },
+}
+BATCH_INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {"calls": {"type": "array", "items": {
+        "type": "object",
+        "required": ["tool"],
+        "properties": {
+            "tool": {"type": "string"},
+            "args": {"type": "object", "default": {}},
+            "etag": {"type": "string"},
+        },
+    }}},
+}
+TOOL_OUTPUT_SCHEMA = {"type": "object", "required": ["result"], "properties": {"result": {}}}
+
+def body_docs(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """路由的接口文档参数：JSON请求体和 {"result": ...} 响应"""
+    return {
+        "openapi_extra": {"requestBody": {"required": True, "content": {"application/json": {"schema": schema}}}},
+        "responses": {200: {"content": {"application/json": {"schema": TOOL_OUTPUT_SCHEMA}}}},
+    }
+
+async def read_body(request: Request, model):
+    """按模型解析JSON请求体，格式错误时与FastAPI的请求体参数一样返回422"""
+    body = await request.body()
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError([dict(error, loc=("body", *error["loc"])) for error in e.errors(include_url=False)],
+                                     body=body)
+
+def knowledge_base(input_data: ToolInput) -> Optional[str]:
+    """读取并检查kb参数，未指定时返回None"""
+    kb = input_data.args.get("kb") or None
+    if kb is not None and kb not in registry.corpora:
+        raise HTTPException(status_code=404, detail=f"知识库不存在: {kb}")
+    return kb
+
+def facet_filters(input_data: ToolInput) -> Optional[Dict[str, Any]]:
+    """读取分面过滤条件，未指定时返回None"""
+    filters = input_data.args.get("filters") or None
+    if filters is not None and not isinstance(filters, dict):
+        raise HTTPException(status_code=400, detail="filters参数必须是对象，例如 {\"category\": \"UGUI\"}")
+    return filters
+
+# 布尔参数接受的取值（字符串不区分大小写）
+BOOL_VALUES = {"true": True, "1": True, "false": False, "0": False}
 
-class ToolOutput(BaseModel):
-    result: Any
+def bool_arg(input_data: ToolInput, name: str, default: bool) -> bool:
+    """读取布尔参数：接受true/false/1/0（布尔值、整数或字符串），未指定或为null时返回default，其他取值返回400"""
+    value = input_data.args.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    key = str(value).strip().lower() if isinstance(value, (int, str)) else None
+    if key not in BOOL_VALUES:
+        raise HTTPException(status_code=400, detail=f"{name}参数必须是true、false、1或0")
+    return BOOL_VALUES[key]
 
 # 工具函数
-def get_categories() -> List[str]:
+def get_categories(kb: Optional[str] = None) -> List[str]:
     """获取所有文档分类"""
-    categories = []
-    for dir_path in glob.glob(os.path.join(DOCS_DIR, "*")):
-        if os.path.isdir(dir_path):
-            categories.append(os.path.basename(dir_path))
-    return categories
+    with access_log.timed("io"):
+        return registry.get(kb).storage.categories()
 
-def get_documents(category: str) -> List[Dict[str, str]]:
+def get_documents(category: str, kb: Optional[str] = None) -> List[Dict[str, str]]:
     """获取指定分类下的所有文档"""
-    documents = []
-    category_path = os.path.join(DOCS_DIR, category)
-    if not os.path.exists(category_path):
-        return []
-    
-    for file_path in glob.glob(os.path.join(category_path, "*.md")):
-        doc_name = os.path.basename(file_path).replace(".md", "")
-        documents.append({
-            "name": doc_name,
-            "path": file_path.replace(DOCS_DIR, "").lstrip("/\\"),
-        })
-    return documents
-
-def get_document_content(doc_path: str) -> str:
-    """获取文档内容"""
-    full_path = os.path.join(DOCS_DIR, doc_path)
-    if not os.path.exists(full_path):
-        return ""
-    
-    with open(full_path, "r", encoding="utf-8") as f:
-        content = f.read()
+    with access_log.timed("io"):
+        return registry.get(kb).storage.documents(category)
+
+def get_document_content(doc_path: str, kb: Optional[str] = None) -> str:
+    """获取文档内容，也可以是搜索结果中的源码文件"""
+    with access_log.timed("io"):
+        content = registry.get(kb).storage.read(doc_path)
+        if content is None:
+            index = registry.current(kb)
+            doc = index.by_path.get(doc_path) if index else None
+            return doc.content if doc else ""
     return content
 
+def search_documents(query: str, collapse: bool = True, kb: Optional[str] = None,
+                     filters: Optional[Dict[str, Any]] = None, with_facets: bool = False) -> Any:
+    """在所有文档中搜索关键词，近似重复的命中合并为一个结果（其余列在alternates中；
+    使用SQLite全文索引的普通查询不合并）
+
+    with_facets为True时返回 {"results": 结果, "total": 命中文档数, "facets": 分面统计}。
+    """
+    with access_log.timed("search"):
+        if with_facets:
+            return registry.faceted_search(query, kb=kb, collapse=collapse, filters=filters)
+        return registry.search(query, kb=kb, collapse=collapse, filters=filters)
+
+def retrieve_passages(query: str, budget: int, kb: Optional[str] = None,
+                      filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """按token预算返回与查询最相关的段落块"""
+    with access_log.timed("search"):
+        return registry.retrieve_passages(query, budget, kb=kb, filters=filters)
+
+def find_symbol(symbol: str, prefix: bool, kb: Optional[str] = None) -> List[Dict[str, Any]]:
+    """查找C#符号的定义和引用位置"""
+    with access_log.timed("search"):
+        return registry.find_symbol(symbol, prefix=prefix, kb=kb)
+
+def get_section(doc_path: str, section: str, line: Optional[int], kb: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """获取文档或源码中的一个章节（源码中为一个类型或成员声明）"""
+    generation = registry.pin(kb)
+    with access_log.timed("search"):
+        return generation.index.get_section(doc_path, section=section, line=line)
+
+def suggest(prefix: str, limit: int, kb: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按前缀返回补全候选"""
+    with access_log.timed("search"):
+        return registry.suggest(prefix, limit, kb=kb)
+
+def get_duplicate_clusters(kb: Optional[str] = None) -> List[Dict[str, Any]]:
+    """近似重复章节报告"""
+    return registry.duplicate_report(kb)
+
+def reload_index(kb: Optional[str] = None) -> List[Dict[str, Any]]:
+    """重建索引，建立完成后替换当前一代"""
+    return [dict(generation.describe(), kb=generation.name) for generation in registry.reload(kb)]
+
 # API路由
-@app.post("/mcp/tools/get_categories")
-async def api_get_categories(input_data: ToolInput) -> ToolOutput:
+# 工具函数会读取文件，通过profiling.to_thread（即asyncio.to_thread）在线程池中执行，避免阻塞事件循环
+# 工具返回值由服务器生成，不经过模型校验，直接编码为响应
+# 工具名称 -> 处理函数，路由 /mcp/tools/<名称> 和批量调用共用
+TOOL_HANDLERS: Dict[str, Callable[[ToolInput], Awaitable[Any]]] = {}
+
+def tool_route(name: str):
+    """注册工具处理函数并添加路由，处理函数返回工具结果，由路由编码为响应（支持请求体的etag字段）"""
+    def register(handler):
+        async def endpoint(request: Request) -> Response:
+            input_data = await read_body(request, ToolInput)
+            result = await handler(input_data)
+            access_log.begin("serialize")
+            return serialization.tool_response(result, request.headers.get("accept"), input_data.etag)
+        endpoint.__name__ = handler.__name__
+        endpoint.__doc__ = handler.__doc__
+        app.post(f"/mcp/tools/{name}", **body_docs(TOOL_INPUT_SCHEMA))(endpoint)
+        TOOL_HANDLERS[name] = handler
+        return handler
+    return register
+
+@tool_route("get_categories")
+async def api_get_categories(input_data: ToolInput) -> Any:
     """获取所有文档分类"""
-    categories = get_categories()
-    return ToolOutput(result=categories)
+    kb = knowledge_base(input_data)
+    return await profiling.to_thread(get_categories, kb)
 
-@app.post("/mcp/tools/get_documents")
-async def api_get_documents(input_data: ToolInput) -> ToolOutput:
+@tool_route("get_documents")
+async def api_get_documents(input_data: ToolInput) -> Any:
     """获取指定分类下的所有文档"""
     category = input_data.args.get("category", "")
     if not category:
         raise HTTPException(status_code=400, detail="缺少category参数")
-    
-    documents = get_documents(category)
-    return ToolOutput(result=documents)
+    kb = knowledge_base(input_data)
+
+    return await profiling.to_thread(get_documents, category, kb)
 
-@app.post("/mcp/tools/get_document_content")
-async def api_get_document_content(input_data: ToolInput) -> ToolOutput:
+@tool_route("get_document_content")
+async def api_get_document_content(input_data: ToolInput) -> Any:
     """获取文档内容"""
     doc_path = input_data.args.get("path", "")
     if not doc_path:
         raise HTTPException(status_code=400, detail="缺少path参数")
-    
-    content = get_document_content(doc_path)
-    return ToolOutput(result=content)
+    kb = knowledge_base(input_data)
+
+    return await flights.do("get_document_content", {"path": doc_path, "kb": kb}, profiling.to_thread, get_document_content, doc_path, kb)
 
-@app.post("/mcp/tools/search_documents")
-async def api_search_documents(input_data: ToolInput) -> ToolOutput:
+@tool_route("search_documents")
+async def api_search_documents(input_data: ToolInput) -> Any:
     """搜索文档"""
     query = input_data.args.get("query", "")
     if not query:
         raise HTTPException(status_code=400, detail="缺少query参数")
-    
-    results = []
-    for category in get_categories():
-        for doc in get_documents(category):
-            doc_path = doc["path"]
-            content = get_document_content(doc_path)
-            if query.lower() in content.lower():
-                results.append({
-                    "category": category,
-                    "name": doc["name"],
-                    "path": doc_path,
-                    "preview": content[:200] + "..."
-                })
-    
-    return ToolOutput(result=results)
+    collapse = bool_arg(input_data, "collapse", True)
+    with_facets = bool_arg(input_data, "facets", False)
+    kb = knowledge_base(input_data)
+    filters = facet_filters(input_data)
+
+    key = {"query": query, "collapse": collapse, "kb": kb, "filters": filters, "facets": with_facets}
+    try:
+        results = await flights.do("search_documents", key, profiling.to_thread, search_documents, query, collapse, kb, filters, with_facets)
+    except query_language.QuerySyntaxError as e:
+        raise HTTPException(status_code=400, detail=f"查询语法错误: {e}")
+    except facets.FacetFilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return results
+
+@tool_route("retrieve_passages")
+async def api_retrieve_passages(input_data: ToolInput) -> Any:
+    """按token预算检索段落"""
+    query = input_data.args.get("query", "")
+    if not query:
+        raise HTTPException(status_code=400, detail="缺少query参数")
+    try:
+        budget = int(input_data.args.get("budget", kb_index.DEFAULT_TOKEN_BUDGET))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="budget参数必须是整数")
+    kb = knowledge_base(input_data)
+    filters = facet_filters(input_data)
+
+    try:
+        passages = await flights.do("retrieve_passages", {"query": query, "budget": budget, "kb": kb, "filters": filters}, profiling.to_thread, retrieve_passages, query, budget, kb, filters)
+    except facets.FacetFilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return passages
+
+@tool_route("find_symbol")
+async def api_find_symbol(input_data: ToolInput) -> Any:
+    """查找C#符号"""
+    symbol = input_data.args.get("symbol", "")
+    if not symbol:
+        raise HTTPException(status_code=400, detail="缺少symbol参数")
+    prefix = bool(input_data.args.get("prefix", False))
+    kb = knowledge_base(input_data)
+
+    return await profiling.to_thread(find_symbol, symbol, prefix, kb)
+
+@tool_route("suggest")
+async def api_suggest(input_data: ToolInput) -> Any:
+    """输入补全"""
+    prefix = input_data.args.get("prefix", "")
+    if not prefix:
+        raise HTTPException(status_code=400, detail="缺少prefix参数")
+    try:
+        limit = int(input_data.args.get("limit", suggest_module.DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="limit参数必须是整数")
+    kb = knowledge_base(input_data)
+
+    # 补全在一毫秒内完成，索引建立后直接在事件循环中执行，省去线程切换
+    if registry.loaded(kb):
+        suggestions = suggest(prefix, limit, kb)
+    else:
+        suggestions = await profiling.to_thread(suggest, prefix, limit, kb)
+    return suggestions
+
+@tool_route("get_section")
+async def api_get_section(input_data: ToolInput) -> Any:
+    """获取一个章节"""
+    doc_path = input_data.args.get("path", "")
+    if not doc_path:
+        raise HTTPException(status_code=400, detail="缺少path参数")
+    section = input_data.args.get("section", "")
+    line = input_data.args.get("line")
+    if not section and line is None:
+        raise HTTPException(status_code=400, detail="缺少section或line参数")
+    try:
+        line = int(line) if line is not None else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="line参数必须是整数")
+    kb = knowledge_base(input_data)
+
+    result = await profiling.to_thread(get_section, doc_path, section, line, kb)
+    if result is None:
+        raise HTTPException(status_code=404, detail="章节不存在")
+    return result
+
+@tool_route("get_duplicate_clusters")
+async def api_get_duplicate_clusters(input_data: ToolInput) -> Any:
+    """获取近似重复章节报告"""
+    kb = knowledge_base(input_data)
+    return await profiling.to_thread(get_duplicate_clusters, kb)
+
+@tool_route("reload_index")
+async def api_reload_index(input_data: ToolInput) -> Any:
+    """重建索引，重建期间的请求继续使用旧的一代"""
+    kb = knowledge_base(input_data)
+    # 不使用请求合并：重建期间收到的重建请求需要看到这之后的文件，由Corpus.reload排队处理
+    return await profiling.to_thread(reload_index, kb)
+
+@tool_route("list_knowledge_bases")
+async def api_list_knowledge_bases(input_data: ToolInput) -> Any:
+    """列出挂载的知识库"""
+    return registry.describe()
+
+async def batch_call(call: BatchCall, deadline: Optional[float]) -> Tuple[int, Any, Optional[str]]:
+    """执行批量调用中的一个调用，返回 (状态码, 结果或错误信息, 调用给出的etag)"""
+    # 各调用在gather创建的任务中并发执行，不单独记录访问日志阶段，整个批次计入batch阶段
+    access_log.detach()
+    handler = TOOL_HANDLERS.get(call.tool)
+    if handler is None:
+        return 404, f"工具不存在: {call.tool}", None
+    controller = admission.controller("mcp")
+    try:
+        if controller is None:
+            result = await handler(ToolInput(args=call.args))
+        else:
+            async with controller.admit(call.tool, deadline):
+                result = await handler(ToolInput(args=call.args))
+    except admission.Overloaded:
+        status, value = 503, f"工具 {call.tool} 繁忙，请稍后重试"
+    except HTTPException as e:
+        status, value = e.status_code, e.detail
+    except Exception:
+        logger.exception("批量调用 %s 失败", call.tool)
+        status, value = 500, "服务器内部错误"
+    else:
+        status, value = 200, result
+    BATCH_CALLS.inc("mcp", call.tool, str(status))
+    return status, value, call.etag
+
+@app.post("/mcp/batch", **body_docs(BATCH_INPUT_SCHEMA))
+async def api_batch(request: Request) -> Response:
+    """批量调用工具：各调用并发执行，分别返回结果或错误"""
+    input_data = await read_body(request, BatchInput)
+    if not input_data.calls:
+        raise HTTPException(status_code=400, detail="缺少calls参数")
+    if len(input_data.calls) > BATCH_MAX_CALLS:
+        raise HTTPException(status_code=400, detail=f"一次最多批量调用{BATCH_MAX_CALLS}个工具")
+    deadline = admission.request_deadline(request.scope)
+    with access_log.timed("batch"):
+        entries = await asyncio.gather(*(batch_call(call, deadline) for call in input_data.calls))
+    access_log.begin("serialize")
+    return serialization.batch_response(entries, request.headers.get("accept"))
+
+# 监控指标路由
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus格式的监控指标"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+# 省略kb时在所有知识库中搜索的工具，其他工具省略kb时使用默认知识库
+CROSS_KB_TOOLS = ("search_documents", "retrieve_passages", "find_symbol", "suggest", "get_duplicate_clusters",
+                  "reload_index")
+
+# 分面过滤条件，同一分面的多个值之间为OR，不同分面之间为AND
+FILTERS_SCHEMA = {
+    "type": "object",
+    "description": "分面过滤条件，例如 {\"category\": [\"UGUI\", \"Guide\"], \"type\": \"markdown\", \"depth\": 3}",
+    "properties": {
+        "category": {"type": ["string", "array"], "description": "文档分类"},
+        "type": {"type": ["string", "array"], "description": "文档类型：markdown或source"},
+        "depth": {"type": ["integer", "array"], "description": "文档包含的章节层级"}
+    },
+    "additionalProperties": False
+}
 
 # MCP服务器配置路由
 @app.get("/mcp/config")
 async def get_mcp_config():
     """获取MCP服务器配置"""
-    return {
-        "name": "UGUI知识库MCP服务器",
-        "description": "提供UGUI知识库的访问接口",
-        "tools": [
-            {
-                "name": "get_categories",
-                "description": "获取所有文档分类",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {}
-                }
-            },
-            {
-                "name": "get_documents",
-                "description": "获取指定分类下的所有文档",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "category": {
-                            "type": "string",
-                            "description": "文档分类名称"
-                        }
+    tools = [
+        {
+            "name": "get_categories",
+            "description": "获取所有文档分类",
+            "inputSchema": {
+                "type": "object",
+                "properties": {}
+            }
+        },
+        {
+            "name": "get_documents",
+            "description": "获取指定分类下的所有文档",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "category": {
+                        "type": "string",
+                        "description": "文档分类名称"
+                    }
+                },
+                "required": ["category"]
+            }
+        },
+        {
+            "name": "get_document_content",
+            "description": "获取文档内容",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "文档路径"
+                    }
+                },
+                "required": ["path"]
+            }
+        },
+        {
+            "name": "search_documents",
+            "description": "搜索文档",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "搜索关键词，支持 AND、OR、NOT（大写）、括号、\"短语\"、前缀*、category:分类 和 path:路径 过滤，例如 Canvas AND Rebuild NOT Layout。不加引号的词按子串匹配（不区分大小写），短语和前缀*按整词匹配"
                     },
-                    "required": ["category"]
-                }
-            },
-            {
-                "name": "get_document_content",
-                "description": "获取文档内容",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "文档路径"
-                        }
+                    "collapse": {
+                        "type": "boolean",
+                        "description": "是否合并近似重复的命中，默认为true"
                     },
-                    "required": ["path"]
-                }
-            },
-            {
-                "name": "search_documents",
-                "description": "搜索文档",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "搜索关键词"
-                        }
+                    "facets": {
+                        "type": "boolean",
+                        "description": "是否返回分面统计，为true时返回 {results, total, facets}，默认为false"
                     },
-                    "required": ["query"]
-                }
+                    "filters": FILTERS_SCHEMA
+                },
+                "required": ["query"]
             }
-        ]
+        },
+        {
+            "name": "retrieve_passages",
+            "description": "按token预算返回与查询最相关的段落（包含标题路径和行号），代替搜索后读取整篇文档",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "查询内容"
+                    },
+                    "budget": {
+                        "type": "integer",
+                        "description": f"返回段落的token总数上限，默认为{kb_index.DEFAULT_TOKEN_BUDGET}，最大为{kb_index.MAX_TOKEN_BUDGET}"
+                    },
+                    "filters": FILTERS_SCHEMA
+                },
+                "required": ["query"]
+            }
+        },
+        {
+            "name": "find_symbol",
+            "description": "查找C#类型、方法等符号在文档代码中的定义和引用位置（文档、章节、行号）",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "symbol": {
+                        "type": "string",
+                        "description": "符号名称，可以是限定名，例如Graphic.SetVerticesDirty"
+                    },
+                    "prefix": {
+                        "type": "boolean",
+                        "description": "是否按前缀查找（不区分大小写），默认为false"
+                    }
+                },
+                "required": ["symbol"]
+            }
+        },
+        {
+            "name": "suggest",
+            "description": "输入补全：按前缀返回文档标题、章节标题、代码符号和高频词，按出现次数加权排序",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "prefix": {
+                        "type": "string",
+                        "description": "已输入的前缀（不区分大小写）"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"返回的候选数量，默认为{suggest_module.DEFAULT_LIMIT}，最大为{suggest_module.MAX_LIMIT}"
+                    }
+                },
+                "required": ["prefix"]
+            }
+        },
+        {
+            "name": "get_section",
+            "description": "获取文档中的一个章节，或源码中的一个类型或成员（如ObjectPool.Get）的代码",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "文档或源码路径（搜索结果中的path）"
+                    },
+                    "section": {
+                        "type": "string",
+                        "description": "章节标题、以 > 分隔的标题路径，或源码中的限定名"
+                    },
+                    "line": {
+                        "type": "integer",
+                        "description": "行号，返回包含该行的最内层章节（未指定section时使用）"
+                    }
+                },
+                "required": ["path"]
+            }
+        },
+        {
+            "name": "get_duplicate_clusters",
+            "description": "获取近似重复章节报告",
+            "inputSchema": {
+                "type": "object",
+                "properties": {}
+            }
+        },
+        {
+            "name": "reload_index",
+            "description": "重新读取文档和源码并建立新的索引，建立完成后替换当前索引，期间的请求不受影响",
+            "inputSchema": {
+                "type": "object",
+                "properties": {}
+            }
+        }
+    ]
+    for tool in tools:
+        scope = "省略时在所有知识库中搜索" if tool["name"] in CROSS_KB_TOOLS else f"省略时为{registry.default}"
+        tool["inputSchema"]["properties"]["kb"] = {
+            "type": "string",
+            "enum": registry.names(),
+            "description": f"知识库名称，{scope}"
+        }
+    tools.append({
+        "name": "list_knowledge_bases",
+        "description": "列出挂载的知识库及其索引状态",
+        "inputSchema": {
+            "type": "object",
+            "properties": {}
+        }
+    })
+    return {
+        "name": "UGUI知识库MCP服务器",
+        "description": "提供UGUI知识库的访问接口",
+        "tools": tools
     }
 
 # 主函数
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    if "--profile-startup" in sys.argv:
+        from startup_profile import profile_startup
+        sys.exit(profile_startup(__file__))
+
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("MCP_PORT", "8000")))
\ No newline at end of file
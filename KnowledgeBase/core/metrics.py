@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库监控指标
+
+提供Prometheus文本格式的计数器、直方图和仪表盘指标，以及用于FastAPI（ASGI）和Flask的请求统计。
+每个线程写入自己的分片，请求路径上只有几次字典自增，不需要加锁；只有采集（/metrics）时才汇总各分片。
+"""
+
+import time
+import bisect
+import threading
+
+# Prometheus文本格式的Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 默认的延迟直方图分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _ShardedMetric:
+    """按线程分片存储的指标基类
+
+    每个线程第一次写入时注册一个分片（只有这一步需要加锁），之后只写自己的分片。
+    采集时汇总所有分片，已结束线程的分片会合并到retired中，避免每请求一个线程的服务器无限增长。
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = {}
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+
+    def _new_value(self):
+        return 0
+
+    def _merge(self, target, key, value):
+        target[key] = target.get(key, 0) + value
+
+    def _snapshot(self):
+        """汇总所有分片，返回 {标签值元组: 值}"""
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    for key, value in dict(shard).items():
+                        self._merge(self._retired, key, value)
+            self._shards = alive
+            result = {}
+            for key, value in self._retired.items():
+                self._merge(result, key, value)
+            for _, shard in alive:
+                for key, value in dict(shard).items():
+                    self._merge(result, key, value)
+        return result
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, value in sorted(self._snapshot().items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_ShardedMetric):
+    """只增不减的计数器"""
+
+    kind = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+
+class Gauge(_ShardedMetric):
+    """可增可减的仪表盘指标，也可以在采集时调用函数获取当前值"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def inc(self, *labelvalues, amount=1):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set_function(self, function, *labelvalues):
+        """采集时调用function获取指标值"""
+        self._functions[labelvalues] = function
+
+    def _snapshot(self):
+        result = super()._snapshot()
+        for key, function in list(self._functions.items()):
+            try:
+                result[key] = function()
+            except Exception:
+                continue
+        return result
+
+
+class Histogram(_ShardedMetric):
+    """分桶统计的直方图"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self):
+        # 各分桶计数（最后一个为+Inf）、总和
+        return [[0] * (len(self.buckets) + 1), 0.0]
+
+    def _merge(self, target, key, value):
+        merged = target.get(key)
+        if merged is None:
+            merged = target[key] = self._new_value()
+        counts, total = value
+        for index, count in enumerate(counts):
+            merged[0][index] += count
+        merged[1] += total
+
+    def observe(self, value, *labelvalues):
+        shard = self._shard()
+        entry = shard.get(labelvalues)
+        if entry is None:
+            entry = shard[labelvalues] = self._new_value()
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, (counts, total) in sorted(self._snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        # 同名指标只注册一次，模块被重复导入时返回已有的指标
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """生成Prometheus文本格式"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# 全局注册表
+REGISTRY = Registry()
+
+# 请求指标
+REQUESTS = REGISTRY.counter('kb_requests_total', '请求总数', ('server', 'route', 'status'))
+REQUEST_DURATION = REGISTRY.histogram('kb_request_duration_seconds', '请求处理耗时（秒）', ('server', 'route'))
+RESPONSE_BYTES = REGISTRY.counter('kb_response_bytes_total', '响应体字节数', ('server', 'route'))
+IN_FLIGHT = REGISTRY.gauge('kb_requests_in_flight', '正在处理的请求数', ('server',))
+INDEX_SIZE = REGISTRY.gauge('kb_index_documents', '索引中的文档数量', ('server',))
+
+# 未匹配到路由的请求统一使用该标签，避免标签数量无限增长
+UNMATCHED_ROUTE = 'unmatched'
+
+
+def record_request(server, route, status, duration, response_bytes):
+    """记录一次请求"""
+    REQUESTS.inc(server, route, str(status))
+    REQUEST_DURATION.observe(duration, server, route)
+    if response_bytes:
+        RESPONSE_BYTES.inc(server, route, amount=response_bytes)
+
+
+class MetricsMiddleware:
+    """统计请求指标的ASGI中间件，用于FastAPI"""
+
+    def __init__(self, app, server='mcp'):
+        self.app = app
+        self.server = server
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        state = {'status': 500, 'bytes': 0}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                state['bytes'] += len(message.get('body', b''))
+            await send(message)
+
+        IN_FLIGHT.inc(self.server)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec(self.server)
+            route = scope.get('route')
+            record_request(
+                self.server,
+                getattr(route, 'path', UNMATCHED_ROUTE),
+                state['status'],
+                time.perf_counter() - started,
+                state['bytes'],
+            )
+
+
+def instrument_flask(app, server='api'):
+    """为Flask应用注册请求统计钩子"""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_before_request():
+        IN_FLIGHT.inc(server)
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_after_request(response):
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        record_request(
+            server,
+            route,
+            response.status_code,
+            time.perf_counter() - g.metrics_started,
+            response.content_length or 0,
+        )
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown_request(exc):
+        if 'metrics_started' in g:
+            IN_FLIGHT.dec(server)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库近似重复检测
+
+使用MinHash估计文本之间的Jaccard相似度，用LSH分段找出候选对，再按相似度阈值聚类。
+签名采用单次哈希（one-permutation hashing）：每个shingle只哈希一次并分到固定数量的桶中，
+每个桶保留最小值，计算量与文本长度成正比，纯Python下也能在建立索引时处理整个文档库。
+哈希使用crc32，结果与进程无关，可以随索引一起保存。
+"""
+
+import re
+import zlib
+import operator
+
+# 签名长度（桶数量，必须是2的幂）和LSH分段
+NUM_BINS = 64
+BANDS = 16
+ROWS = NUM_BINS // BANDS
+
+# 字符shingle长度，中英文都按字符切分
+SHINGLE_SIZE = 5
+
+_BIN_BITS = NUM_BINS.bit_length() - 1
+_EMPTY = 1 << 32
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """只保留字母、数字和汉字并转为小写，忽略空白、标点和Markdown符号的差异"""
+    return _NON_WORD.sub('', text.lower())
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """文本的字符shingle哈希集合"""
+    text = normalize(text)
+    if len(text) < size:
+        return set()
+    return {zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)}
+
+
+def signature(hashes):
+    """计算MinHash签名，空桶使用下一个非空桶的值填充（densification）"""
+    bins = [_EMPTY] * NUM_BINS
+    for value in hashes:
+        index = value & (NUM_BINS - 1)
+        rest = value >> _BIN_BITS
+        if rest < bins[index]:
+            bins[index] = rest
+    filled = [index for index, value in enumerate(bins) if value != _EMPTY]
+    if not filled or len(filled) == NUM_BINS:
+        return tuple(bins)
+    result = list(bins)
+    for index in range(NUM_BINS):
+        if result[index] == _EMPTY:
+            # 向后循环查找第一个非空桶，加上距离作为偏移，避免不同空桶得到相同的值
+            for step in range(1, NUM_BINS):
+                source = (index + step) % NUM_BINS
+                if bins[source] != _EMPTY:
+                    result[index] = bins[source] + step * _EMPTY
+                    break
+    return tuple(result)
+
+
+def similarity(first, second):
+    """由两个签名估计Jaccard相似度"""
+    return sum(map(operator.eq, first, second)) / NUM_BINS
+
+
+def candidate_pairs(signatures):
+    """LSH：任意一段完全相同的签名成为候选对，signatures为 {键: 签名}"""
+    pairs = set()
+    for band in range(BANDS):
+        buckets = {}
+        for key, sig in signatures.items():
+            buckets.setdefault(sig[band * ROWS:(band + 1) * ROWS], []).append(key)
+        for keys in buckets.values():
+            for i in range(len(keys)):
+                for j in range(i + 1, len(keys)):
+                    pairs.add((keys[i], keys[j]) if keys[i] < keys[j] else (keys[j], keys[i]))
+    return pairs
+
+
+def find_clusters(signatures, threshold):
+    """找出相似度不低于threshold的签名并用并查集聚类，返回 [[键, ...], ...]（每个簇至少两个成员）"""
+    parent = {}
+
+    def find(key):
+        root = key
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while key != root:
+            parent[key], key = root, parent.get(key, key)
+        return root
+
+    for first, second in candidate_pairs(signatures):
+        root_first, root_second = find(first), find(second)
+        # 已经在同一个簇中的候选对不需要再比较
+        if root_first != root_second and similarity(signatures[first], signatures[second]) >= threshold:
+            parent[max(root_first, root_second)] = min(root_first, root_second)
+
+    clusters = {}
+    for key in set(parent) | set(parent.values()):
+        clusters.setdefault(find(key), []).append(key)
+    return [sorted(members) for _, members in sorted(clusters.items()) if len(members) > 1]
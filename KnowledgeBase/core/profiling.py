@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库按需请求分析
+
+为单个请求开启cProfile，把分析结果（.prof）和请求信息（.json）写入分析目录，用于定位某个搜索请求为什么慢。
+
+触发方式（通过环境变量配置）:
+    KB_PROFILE_ENABLED=true       允许客户端通过请求头（默认X-KB-Profile: 1）要求分析该请求
+    KB_PROFILE_SAMPLE_RATE=0.01   按比例随机抽样分析请求
+    KB_PROFILE_DIR                分析结果目录，默认为KnowledgeBase/profiles
+    KB_PROFILE_KEEP               最多保留的分析结果数量，超出后删除最旧的
+
+两种方式都未开启时不会安装中间件，请求路径上没有任何额外开销。
+cProfile同一时间只能分析一个请求，已有请求正在分析时，新请求直接跳过分析。
+
+MCP服务器的工具函数在工作线程中执行，事件循环线程上的分析器看不到这部分耗时。
+工具函数通过 to_thread() 派发：被分析的请求在工作线程中另外开启一个分析器，
+请求结束后合并到该请求的分析结果中。
+"""
+
+import io
+import os
+import json
+import time
+import random
+import logging
+import asyncio
+import threading
+import contextvars
+from datetime import datetime
+
+import access_log
+
+# 目录配置
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROFILE_ENABLED = os.environ.get('KB_PROFILE_ENABLED', 'false').lower() == 'true'
+PROFILE_HEADER = os.environ.get('KB_PROFILE_HEADER', 'X-KB-Profile')
+PROFILE_SAMPLE_RATE = float(os.environ.get('KB_PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('KB_PROFILE_DIR', os.path.join(os.path.dirname(SCRIPT_DIR), 'profiles'))
+PROFILE_KEEP = int(os.environ.get('KB_PROFILE_KEEP', '100'))
+
+# 请求体最多记录的字节数
+MAX_BODY_BYTES = 64 * 1024
+# 请求信息中附带的最耗时函数数量
+TOP_FUNCTIONS = 30
+
+# 记录请求头时隐藏值的请求头（小写）
+SENSITIVE_HEADERS = frozenset({'authorization', 'proxy-authorization', 'cookie', 'x-api-key', 'x-auth-token'})
+REDACTED = '[已隐藏]'
+
+logger = logging.getLogger('kb.profile')
+
+# cProfile同一时间只能有一个分析器处于活动状态
+_profile_lock = threading.Lock()
+
+# 正在分析的请求在工作线程中收集的分析器，未分析时为None（asyncio.to_thread会把上下文复制到工作线程）
+_worker_profilers = contextvars.ContextVar('kb_worker_profilers', default=None)
+
+
+def is_active():
+    """是否需要安装分析中间件"""
+    return PROFILE_ENABLED or PROFILE_SAMPLE_RATE > 0
+
+
+def should_profile(header_value):
+    """根据请求头和抽样比例决定是否分析该请求，返回触发原因或None"""
+    if PROFILE_ENABLED and header_value and header_value.strip().lower() not in ('0', 'false', 'no'):
+        return 'header'
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sample'
+    return None
+
+
+def new_profiler():
+    """创建cProfile分析器；只在分析请求时导入cProfile，缩短服务器启动时间"""
+    import cProfile
+
+    return cProfile.Profile()
+
+
+def _run_profiled(func, *args, **kwargs):
+    profilers = _worker_profilers.get()
+    if profilers is None:
+        return func(*args, **kwargs)
+    profiler = new_profiler()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12起cProfile基于sys.monitoring，对所有线程生效，请求的分析器已经包含工作线程
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profilers.append(profiler)
+
+
+async def to_thread(func, *args, **kwargs):
+    """与asyncio.to_thread相同；请求正在被分析时，工作线程中的调用也计入该请求的分析结果
+
+    等待工作线程开始执行的耗时计入访问日志的queue阶段。
+    """
+    func = access_log.queued(func)
+    if not is_active():
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return await asyncio.to_thread(_run_profiled, func, *args, **kwargs)
+
+
+def merge_stats(profilers):
+    """合并多个分析器的结果"""
+    import pstats
+
+    stats = pstats.Stats(profilers[0])
+    for profiler in profilers[1:]:
+        stats.add(profiler)
+    return stats
+
+
+def redact_headers(headers):
+    """隐藏认证信息和Cookie等敏感请求头的值"""
+    return {name: REDACTED if name.lower() in SENSITIVE_HEADERS else value for name, value in headers.items()}
+
+
+def _safe_name(text):
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in text.strip('/'))[:60] or 'root'
+
+
+def top_functions(stats, limit=TOP_FUNCTIONS):
+    """按累计耗时排序的函数列表"""
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+def rotate(directory=PROFILE_DIR, keep=PROFILE_KEEP):
+    """只保留最新的keep个分析结果"""
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.prof'))
+    for name in names[:max(len(names) - keep, 0)]:
+        for path in (name, name[:-len('.prof')] + '.json'):
+            try:
+                os.remove(os.path.join(directory, path))
+            except FileNotFoundError:
+                pass
+
+
+def save_profile(profiler, request_info, directory=PROFILE_DIR, worker_profilers=()):
+    """保存分析结果（合并工作线程中的分析器）和请求信息，返回.prof文件路径
+
+    在响应路径上执行：分析目录无法写入时只记录警告并返回None，不影响请求。
+    """
+    request_info['headers'] = redact_headers(request_info.get('headers', {}))
+    # 文件名以时间开头，按名称排序即按时间排序
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    base = os.path.join(directory, f"{stamp}_{_safe_name(request_info['path'])}")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        stats = merge_stats([profiler, *worker_profilers])
+        stats.dump_stats(base + '.prof')
+        request_info['worker_profiles'] = len(worker_profilers)
+        request_info['top_functions'] = top_functions(stats)
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(request_info, f, ensure_ascii=False, indent=2)
+        rotate(directory)
+    except OSError as e:
+        logger.warning("无法保存请求分析结果到 %s: %s", directory, e)
+        return None
+    return base + '.prof'
+
+
+def _decode_body(body):
+    text = body[:MAX_BODY_BYTES].decode('utf-8', errors='replace')
+    if len(body) > MAX_BODY_BYTES:
+        text += f'...（共 {len(body)} 字节）'
+    return text
+
+
+class ProfilingMiddleware:
+    """按需分析请求的ASGI中间件，用于FastAPI
+
+    分析期间同一事件循环上的其他协程也会被计入结果；通过 to_thread() 派发到工作线程的调用
+    单独分析后合并到结果中。
+    """
+
+    def __init__(self, app, server='mcp'):
+        self.app = app
+        self.server = server
+        self.header = PROFILE_HEADER.lower().encode('latin-1')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        header_value = None
+        for name, value in scope.get('headers', ()):
+            if name == self.header:
+                header_value = value.decode('latin-1')
+                break
+        reason = should_profile(header_value)
+        if reason is None or not _profile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        body = bytearray()
+        status = {'code': None}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message['type'] == 'http.request' and len(body) < MAX_BODY_BYTES:
+                body.extend(message.get('body', b''))
+            return message
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        profiler = new_profiler()
+        worker_profilers = []
+        token = _worker_profilers.set(worker_profilers)
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive_wrapper, send_wrapper)
+            finally:
+                profiler.disable()
+                _worker_profilers.reset(token)
+            save_profile(profiler, {
+                'server': self.server,
+                'reason': reason,
+                'method': scope['method'],
+                'path': scope['path'],
+                'query': scope.get('query_string', b'').decode('latin-1'),
+                'headers': {name.decode('latin-1'): value.decode('latin-1') for name, value in scope.get('headers', ())},
+                'body': _decode_body(bytes(body)),
+                'status': status['code'],
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            }, worker_profilers=worker_profilers)
+        finally:
+            _profile_lock.release()
+
+
+class WSGIProfilingMiddleware:
+    """按需分析请求的WSGI中间件，用于Flask"""
+
+    def __init__(self, app, server='api'):
+        self.app = app
+        self.server = server
+        self.environ_key = 'HTTP_' + PROFILE_HEADER.upper().replace('-', '_')
+
+    def __call__(self, environ, start_response):
+        reason = should_profile(environ.get(self.environ_key))
+        if reason is None or not _profile_lock.acquire(blocking=False):
+            return self.app(environ, start_response)
+
+        try:
+            # 先读出请求体以便记录，再替换为新的输入流交给应用
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            body = environ['wsgi.input'].read(length) if length else b''
+            environ['wsgi.input'] = io.BytesIO(body)
+
+            status = {'code': None}
+
+            def start_response_wrapper(status_line, headers, exc_info=None):
+                status['code'] = int(status_line.split(' ', 1)[0])
+                return start_response(status_line, headers, exc_info)
+
+            profiler = new_profiler()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                # 在分析期间消费完响应，使生成响应体的代码也计入结果
+                chunks = list(self.app(environ, start_response_wrapper))
+            finally:
+                profiler.disable()
+            save_profile(profiler, {
+                'server': self.server,
+                'reason': reason,
+                'method': environ.get('REQUEST_METHOD'),
+                'path': environ.get('PATH_INFO', ''),
+                'query': environ.get('QUERY_STRING', ''),
+                'headers': {key[5:].replace('_', '-').title(): value for key, value in environ.items() if key.startswith('HTTP_')},
+                'body': _decode_body(body),
+                'status': status['code'],
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+            return chunks
+        finally:
+            _profile_lock.release()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库查询语言
+
+search_documents的查询可以使用以下语法（运算符必须大写）：
+
+    Canvas AND Rebuild NOT Layout      同时包含Canvas和Rebuild、不包含Layout的文档
+    Canvas Rebuild                     相邻的词之间默认为AND
+    Image OR RawImage                  任意一个
+    "SetVerticesDirty"                 短语，按整词匹配，词必须按顺序相邻出现
+    Layout*                            前缀，匹配以layout开头的整词
+    category:UGUI                      按分类过滤（不区分大小写），path:Core/ 按路径包含的文本过滤
+    (Image OR Text) AND NOT category:Guide
+
+优先级从高到低为 NOT、AND、OR，可以用括号改变。不含以上语法的查询仍按原来的子串方式搜索。
+
+不加引号的词与普通查询一样按子串匹配（不区分大小写）：Canvas 也匹配 CanvasGroup，
+NOT Canvas 同样排除只出现CanvasGroup的文档，C# 和 Graphic.SetVerticesDirty 按原样匹配。
+
+紧跟在标识符后面的括号是代码调用，不是分组：SetVerticesDirty()、Find("Canvas") 和
+OnPopulateMesh(VertexHelper vh) 按原样作为普通文本（子串）搜索；在使用了查询语法的查询中，整个调用作为一个词。
+没有使用运算符、字段和短语的查询出现语法错误（如未闭合的引号或括号）时，同样按原样作为子串搜索。
+
+执行在文档级的倒排索引上进行：每个词项的倒排表是排好序的文档序号，以及每篇文档中的词位置。
+    - AND从最短的倒排表开始，逐个与较长的倒排表求交集，较长的一方用指数步长（galloping）查找跳过，
+      代价与最短的倒排表成正比，而不是所有倒排表的长度之和
+    - OR求并集，NOT从结果中跳过被排除的文档（同样使用galloping查找）
+    - 短语先对各词的倒排表求交集，再在候选文档中用位置检查是否相邻出现
+    - 子串匹配的词先用包含其中最长的词的词项的倒排表得到候选文档，再在候选文档的文本中确认
+"""
+
+import re
+import bisect
+from array import array
+
+# 可以过滤的字段
+FIELDS = ('category', 'path')
+
+# 前缀查询最多展开的词项数量
+MAX_PREFIX_TERMS = 128
+
+OPERATORS = ('AND', 'OR', 'NOT')
+
+# 位置索引的词：小写英文单词（或数字），每个汉字单独作为一个词
+_POSITION_TOKEN = re.compile(r'[a-z0-9_]+|[\u3400-\u9fff\uf900-\ufaff]')
+# 查询语法的标记：引号、括号、大写运算符、字段名（不区分大小写）和词尾的前缀通配符
+_SYNTAX = re.compile(r'["()]|(?<!\S)(?:AND|OR|NOT)(?!\S)|(?<![^\s(])(?i:%s):|\w\*(?=[\s()]|$)' % '|'.join(FIELDS))
+# 明确使用查询语法的标记：运算符、字段和闭合的短语，这类查询的语法错误不退回子串搜索
+_EXPLICIT = re.compile(r'"[^"]*"|(?<!\S)(?:AND|OR|NOT)(?!\S)|(?<![^\s(])(?i:%s):' % '|'.join(FIELDS))
+_PREFIX = re.compile(r'[A-Za-z0-9_]+\*')
+_WORD_END = re.compile(r'[\s()"]')
+# 代码调用的括号：紧跟在标识符（或泛型参数、下标）后面的左括号，以及（有的话）对应的参数和右括号
+_CALL = re.compile(r'(?<=[\w>\]])\((?:(?:[^()"]|"[^"]*")*\))?')
+
+
+class QuerySyntaxError(ValueError):
+    """查询语法错误"""
+
+
+def tokenize(text):
+    """把文本切分为位置索引的词"""
+    return _POSITION_TOKEN.findall(text.lower())
+
+
+def is_structured(query):
+    """查询是否使用了查询语法，不使用时按原来的子串方式搜索"""
+    return _SYNTAX.search(_CALL.sub('_', query)) is not None
+
+
+def parse_query(query):
+    """解析查询，按原来的子串方式搜索时返回None
+
+    没有明确使用运算符、字段和短语的查询语法错误时（如 "Canvas 或 Find("Canvas"），按原样作为子串搜索；
+    明确使用了查询语法的查询语法错误时抛出QuerySyntaxError。
+    """
+    if not is_structured(query):
+        return None
+    try:
+        return parse(query)
+    except QuerySyntaxError:
+        if _EXPLICIT.search(_CALL.sub('_', query)):
+            raise
+        return None
+
+
+class PostingList:
+    """一个词项的倒排表：排好序的文档序号，以及每篇文档中的词位置（所有文档的位置连续存放）"""
+
+    __slots__ = ('docs', 'offsets', 'positions')
+
+    def __init__(self, docs, offsets, positions):
+        self.docs = array('I', docs)
+        # 第i篇文档的位置为 positions[offsets[i]:offsets[i + 1]]
+        self.offsets = array('I', offsets)
+        self.positions = array('I', positions)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def positions_in(self, doc, start=0):
+        """词在文档中的位置，文档不在倒排表中时返回空"""
+        i = gallop(self.docs, doc, start)
+        if i < len(self.docs) and self.docs[i] == doc:
+            return self.positions[self.offsets[i]:self.offsets[i + 1]]
+        return ()
+
+
+def gallop(seq, target, low=0):
+    """返回seq[low:]中第一个不小于target的位置：先按1、2、4……的步长向后跳，再在最后一步内二分"""
+    n = len(seq)
+    if low >= n or seq[low] >= target:
+        return low
+    step = 1
+    while low + step < n and seq[low + step] < target:
+        low += step
+        step *= 2
+    return bisect.bisect_left(seq, target, low + 1, min(low + step, n))
+
+
+def intersect(a, b):
+    """两个有序序列的交集，遍历较短的一方，在较长的一方中galloping查找"""
+    if len(a) > len(b):
+        a, b = b, a
+    result = []
+    position, n = 0, len(b)
+    for value in a:
+        position = gallop(b, value, position)
+        if position >= n:
+            break
+        if b[position] == value:
+            result.append(value)
+    return result
+
+
+def intersect_all(lists):
+    """多个有序序列的交集，从最短的开始，结果为空时提前结束"""
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    result = lists[0]
+    for other in lists[1:]:
+        if not result:
+            break
+        result = intersect(result, other)
+    return list(result)
+
+
+def union_all(lists):
+    """多个有序序列的并集"""
+    if len(lists) == 1:
+        return list(lists[0])
+    return sorted(set().union(*lists))
+
+
+def difference(a, b):
+    """a中不在b里的元素，在b中galloping查找"""
+    if not b:
+        return list(a)
+    result = []
+    position, n = 0, len(b)
+    for value in a:
+        position = gallop(b, value, position)
+        if position >= n or b[position] != value:
+            result.append(value)
+    return result
+
+
+def _read_quoted(query, start):
+    """读取从start（引号之后）开始到下一个引号的内容，返回 (内容, 结束位置)"""
+    end = query.find('"', start)
+    if end < 0:
+        raise QuerySyntaxError('引号没有闭合')
+    return query[start:end], end + 1
+
+
+def _lex(query):
+    """把查询切分为 [(类别, 值)]，类别为 ( ) AND OR NOT PHRASE FIELD WORD"""
+    lexemes = []
+    position, n = 0, len(query)
+    while position < n:
+        char = query[position]
+        if char.isspace():
+            position += 1
+        elif char in '()':
+            lexemes.append((char, char))
+            position += 1
+        elif char == '"':
+            text, position = _read_quoted(query, position + 1)
+            lexemes.append(('PHRASE', text))
+        else:
+            match = _WORD_END.search(query, position)
+            end = match.start() if match else n
+            # 代码调用的括号属于这个词，例如 GetComponent<Image>().color
+            while end < n and query[end] == '(':
+                call = _CALL.match(query, end)
+                if call is None:
+                    break
+                match = _WORD_END.search(query, call.end())
+                end = match.start() if match else n
+            word = query[position:end]
+            position = end
+            name, colon, value = word.partition(':')
+            if word in OPERATORS:
+                lexemes.append((word, word))
+            elif colon and name.lower() in FIELDS:
+                if not value and position < n and query[position] == '"':
+                    value, position = _read_quoted(query, position + 1)
+                if not value.strip():
+                    raise QuerySyntaxError(f'字段{name}缺少值')
+                lexemes.append(('FIELD', (name.lower(), value.strip())))
+            else:
+                lexemes.append(('WORD', word))
+    return lexemes
+
+
+class _Parser:
+    """递归下降解析：expr := and (OR and)*；and := unary ([AND] unary)*；unary := NOT unary | primary"""
+
+    def __init__(self, lexemes):
+        self.lexemes = lexemes
+        self.position = 0
+
+    def peek(self):
+        return self.lexemes[self.position][0] if self.position < len(self.lexemes) else None
+
+    def take(self):
+        lexeme = self.lexemes[self.position]
+        self.position += 1
+        return lexeme
+
+    def expression(self):
+        children = [self.conjunction()]
+        while self.peek() == 'OR':
+            self.take()
+            children.append(self.conjunction())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def conjunction(self):
+        children = [self.unary()]
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.take()
+            children.append(self.unary())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def unary(self):
+        if self.peek() == 'NOT':
+            self.take()
+            return ('not', self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind = self.peek()
+        if kind is None:
+            raise QuerySyntaxError('查询不完整，运算符后缺少内容')
+        if kind in ('AND', 'OR', ')'):
+            raise QuerySyntaxError(f'位置{self.position + 1}不应出现 {kind}')
+        kind, value = self.take()
+        if kind == '(':
+            node = self.expression()
+            if self.peek() != ')':
+                raise QuerySyntaxError('括号没有闭合')
+            self.take()
+            return node
+        if kind == 'FIELD':
+            return ('field',) + value
+        if kind == 'WORD':
+            if _PREFIX.fullmatch(value):
+                return ('prefix', value[:-1].lower(), value)
+            # 不加引号的词与普通查询一样按子串匹配
+            return ('substring', value.lower(), value)
+        tokens = tokenize(value)
+        if not tokens:
+            # 只有标点的短语不参与匹配
+            return ('all',)
+        return ('phrase' if len(tokens) > 1 else 'term', tokens, value)
+
+
+def parse(query):
+    """解析查询，返回语法树（元组），语法错误时抛出QuerySyntaxError"""
+    lexemes = _lex(query)
+    if not lexemes:
+        raise QuerySyntaxError('查询为空')
+    parser = _Parser(lexemes)
+    node = parser.expression()
+    if parser.position < len(lexemes):
+        raise QuerySyntaxError(f'位置{parser.position + 1}不应出现 {lexemes[parser.position][1]}')
+    return node
+
+
+def positive_text(node):
+    """不在NOT之下的词和短语的原文，用于对结果排序"""
+    kind = node[0]
+    if kind in ('term', 'phrase', 'prefix', 'substring'):
+        return [node[-1]]
+    if kind in ('and', 'or'):
+        return [text for child in node[1] for text in positive_text(child)]
+    return []
+
+
+class Executor:
+    """在索引的文档级倒排表上执行查询
+
+    index需要提供：documents、doc_postings（词 -> PostingList）、vocabulary（有序的词表）、
+    category_docs（小写分类 -> 有序的文档序号）；文档需要提供lowered（小写的内容）和
+    line_starts（每行第一个词的位置）。
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def documents(self, node):
+        """返回满足查询的文档序号（有序）"""
+        kind = node[0]
+        if kind == 'term':
+            postings = self.index.doc_postings.get(node[1][0])
+            return postings.docs if postings is not None else ()
+        if kind == 'phrase':
+            return [doc for doc in self._candidates(node[1]) if self._phrase_starts(node[1], doc)]
+        if kind == 'prefix':
+            return union_all([postings.docs for postings in self._expand(node[1])] or [()])
+        if kind == 'substring':
+            documents = self.index.documents
+            return [doc for doc in self._containing(node[1]) if node[1] in documents[doc].lowered]
+        if kind == 'field':
+            return self._field(node[1], node[2])
+        if kind == 'all':
+            return range(len(self.index.documents))
+        if kind == 'or':
+            return union_all([self.documents(child) for child in node[1]])
+        if kind == 'not':
+            return difference(range(len(self.index.documents)), self.documents(node[1]))
+        # and：先求肯定条件的交集（从最短的开始），再依次排除否定条件
+        positives = [child for child in node[1] if child[0] != 'not']
+        negatives = [child[1] for child in node[1] if child[0] == 'not']
+        if positives:
+            result = intersect_all([self.documents(child) for child in positives])
+        else:
+            result = range(len(self.index.documents))
+        for child in negatives:
+            if not result:
+                break
+            result = difference(result, self.documents(child))
+        return result
+
+    def _candidates(self, tokens):
+        lists = []
+        for token in set(tokens):
+            postings = self.index.doc_postings.get(token)
+            if postings is None:
+                return []
+            lists.append(postings.docs)
+        return intersect_all(lists)
+
+    def _phrase_starts(self, tokens, doc):
+        """短语在文档中出现的起始位置"""
+        positions = [self.index.doc_postings[token].positions_in(doc) for token in tokens]
+        # 以出现次数最少的词为锚点，检查其他词是否在对应的位置出现
+        anchor = min(range(len(tokens)), key=lambda i: len(positions[i]))
+        starts = []
+        for position in positions[anchor]:
+            start = position - anchor
+            if start < 0:
+                continue
+            for i, candidates in enumerate(positions):
+                if i == anchor:
+                    continue
+                j = bisect.bisect_left(candidates, start + i)
+                if j >= len(candidates) or candidates[j] != start + i:
+                    break
+            else:
+                starts.append(start)
+        return starts
+
+    def _expand(self, prefix):
+        """前缀对应的词项倒排表，最多MAX_PREFIX_TERMS个（按文档数从多到少）"""
+        vocabulary = self.index.vocabulary
+        low = bisect.bisect_left(vocabulary, prefix)
+        high = bisect.bisect_left(vocabulary, prefix + '\U0010ffff', low)
+        postings = [self.index.doc_postings[term] for term in vocabulary[low:high]]
+        if len(postings) > MAX_PREFIX_TERMS:
+            postings = sorted(postings, key=len, reverse=True)[:MAX_PREFIX_TERMS]
+        return postings
+
+    def _containing(self, text):
+        """可能包含子串text的文档：包含text中最长的词的词项的倒排表的并集（子串中的词一定是某个词项的一部分）"""
+        tokens = tokenize(text)
+        if not tokens:
+            return range(len(self.index.documents))
+        longest = max(tokens, key=len)
+        return union_all([self.index.doc_postings[term].docs for term in self.index.vocabulary if longest in term] or [()])
+
+    def _field(self, name, value):
+        if name == 'category':
+            return self.index.category_docs.get(value.lower(), ())
+        value = value.lower()
+        return [number for number, doc in enumerate(self.index.documents) if value in doc.path.lower()]
+
+    def hit_lines(self, node, doc):
+        """文档中肯定条件（不在NOT之下的词、短语和前缀）出现的行号（从1开始），用于定位命中的章节"""
+        line_starts = self.index.documents[doc].line_starts
+        lines = {bisect.bisect_right(line_starts, position) for position in self.hit_positions(node, doc)}
+        lines.update(self._substring_lines(node, doc))
+        return lines
+
+    def _substring_lines(self, node, doc):
+        """子串匹配的词出现的行号，在文档的小写内容中查找"""
+        kind = node[0]
+        if kind in ('and', 'or'):
+            return [line for child in node[1] for line in self._substring_lines(child, doc)]
+        if kind != 'substring':
+            return []
+        text, lowered = node[1], self.index.documents[doc].lowered
+        lines = []
+        line, previous = 1, 0
+        position = lowered.find(text)
+        while position >= 0:
+            line += lowered.count('\n', previous, position)
+            lines.append(line)
+            previous = position
+            position = lowered.find(text, position + max(len(text), 1))
+        return lines
+
+    def hit_positions(self, node, doc):
+        """文档中肯定条件中的词、短语和前缀出现的位置（子串匹配的词见_substring_lines）"""
+        kind = node[0]
+        if kind == 'term':
+            postings = self.index.doc_postings.get(node[1][0])
+            return list(postings.positions_in(doc)) if postings is not None else []
+        if kind == 'phrase':
+            if any(token not in self.index.doc_postings for token in node[1]):
+                return []
+            return self._phrase_starts(node[1], doc)
+        if kind == 'prefix':
+            return [position for postings in self._expand(node[1]) for position in postings.positions_in(doc)]
+        if kind in ('and', 'or'):
+            return [position for child in node[1] for position in self.hit_positions(child, doc)]
+        return []
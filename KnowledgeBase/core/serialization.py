@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库工具响应序列化
+
+工具函数的返回值只包含str、list和dict，结构由服务器自己保证，不需要再经过Pydantic模型校验
+和jsonable_encoder的逐字段转换。这里直接把 {"result": ...} 编码为响应体：
+    - 默认使用orjson编码JSON（未安装时退回标准库json）
+    - 请求头Accept明确接受application/msgpack（或application/x-msgpack，q值大于0且不低于JSON）
+      且安装了msgpack时，返回MessagePack
+
+响应带有按响应体计算的ETag。请求体的etag字段与之相同时只返回 {"status": 304, "etag": ...}，
+客户端（mcp_client.py）使用本地缓存的结果，省去传输和解码。工具调用都是只读查询，相同参数、
+相同索引得到的响应体相同，因此可以按内容判断结果是否变化。这是服务器和客户端之间约定的方式，
+不是HTTP条件请求：工具调用使用POST，按RFC 9110，POST请求的If-None-Match匹配时应返回412而不是304，
+因此请求头If-None-Match不起作用，HTTP状态码始终为200。
+
+orjson和msgpack都是可选依赖。
+"""
+
+import json
+import hashlib
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, 'application/x-msgpack')
+
+
+def dumps_json(payload):
+    """编码为UTF-8 JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_msgpack(payload):
+    """编码为MessagePack字节串"""
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def media_ranges(accept):
+    """解析Accept请求头，返回 {媒体范围: q值}，q值格式错误的范围忽略"""
+    ranges = {}
+    for item in accept.split(','):
+        media_range, *params = item.split(';')
+        media_range = media_range.strip().lower()
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = None
+                break
+        if quality is not None:
+            ranges[media_range] = max(quality, ranges.get(media_range, 0.0))
+    return ranges
+
+
+def media_quality(ranges, media_type):
+    """媒体类型的q值：取最具体的匹配范围（完全匹配、type/*、*/*），没有匹配时为0"""
+    for media_range in (media_type, media_type.split('/')[0] + '/*', '*/*'):
+        if media_range in ranges:
+            return ranges[media_range]
+    return 0.0
+
+
+def wants_msgpack(accept):
+    """客户端是否接受MessagePack
+
+    Accept必须明确列出MessagePack媒体类型（通配符不算），q值大于0且不低于JSON的q值，
+    例如 application/msgpack;q=0 表示不接受MessagePack。
+    """
+    if msgpack is None or not accept:
+        return False
+    ranges = media_ranges(accept)
+    msgpack_quality = max(ranges.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    return msgpack_quality > 0 and msgpack_quality >= media_quality(ranges, JSON_MEDIA_TYPE)
+
+
+def etag(body):
+    """响应体的ETag"""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(cached_etag, tag):
+    """客户端给出的ETag（可以是逗号分隔的多个ETag或*）是否与tag相同，按弱比较忽略W/前缀"""
+    if not cached_etag:
+        return False
+    for candidate in cached_etag.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == tag:
+            return True
+    return False
+
+
+def tool_response(result, accept=None, cached_etag=None):
+    """生成工具响应，结构为 {"result": ...}；cached_etag（请求体的etag字段）与ETag相同时为 {"status": 304, "etag"}"""
+    dumps, media_type = (dumps_msgpack, MSGPACK_MEDIA_TYPE) if wants_msgpack(accept) else (dumps_json, JSON_MEDIA_TYPE)
+    body = dumps({'result': result})
+    tag = etag(body)
+    # 响应内容随Accept变化，缓存需要区分
+    headers = {'Vary': 'Accept', 'ETag': tag}
+    if etag_matches(cached_etag, tag):
+        body = dumps({'status': 304, 'etag': tag})
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def batch_response(entries, accept=None):
+    """生成批量调用的响应：{"result": [每个调用的结果]}
+
+    entries为每个调用的 (状态码, 结果或错误信息, 调用给出的etag)。成功的调用返回
+    {"status": 200, "etag", "result"}，ETag与单独调用该工具时的ETag相同（相同编码下），
+    与调用给出的ETag相同时返回 {"status": 304, "etag"}；失败的调用返回 {"status", "detail"}。
+    """
+    use_msgpack = wants_msgpack(accept)
+    dumps = dumps_msgpack if use_msgpack else dumps_json
+    items = []
+    for status, value, cached_etag in entries:
+        if status != 200:
+            items.append({'status': status, 'detail': value})
+            continue
+        tag = etag(dumps({'result': value}))
+        if etag_matches(cached_etag, tag):
+            items.append({'status': 304, 'etag': tag})
+        else:
+            items.append({'status': 200, 'etag': tag, 'result': value})
+    media_type = MSGPACK_MEDIA_TYPE if use_msgpack else JSON_MEDIA_TYPE
+    return Response(dumps({'result': items}), media_type=media_type, headers={'Vary': 'Accept'})
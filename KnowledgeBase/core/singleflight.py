@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库请求合并（single-flight）
+
+多个客户端同时发起相同的工具调用（工具名称和规范化后的参数相同）时，只执行一次计算，
+所有调用共享同一个结果或异常。计算完成后立即移除，不缓存结果，因此不会返回过期数据。
+
+AsyncSingleFlight用于asyncio（MCP服务器），SingleFlight用于多线程（Flask API服务器）。
+共享的结果对象会被多个请求同时序列化，调用方不能修改它。
+"""
+
+import json
+import asyncio
+import threading
+
+import metrics
+
+SINGLEFLIGHT_CALLS = metrics.REGISTRY.counter(
+    'kb_singleflight_calls_total', '实际执行的工具调用次数', ('server', 'tool'))
+SINGLEFLIGHT_COALESCED = metrics.REGISTRY.counter(
+    'kb_singleflight_coalesced_total', '合并到正在执行的相同调用上的次数', ('server', 'tool'))
+
+
+def call_key(tool, args):
+    """工具名称和规范化后的参数，参数顺序不影响结果"""
+    return tool, json.dumps(args, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+class AsyncSingleFlight:
+    """合并相同的并发协程调用"""
+
+    def __init__(self, server='mcp'):
+        self.server = server
+        self._calls = {}
+
+    async def do(self, tool, args, function, *function_args):
+        """执行 await function(*function_args)，相同的调用正在执行时等待其结果"""
+        key = call_key(tool, args)
+        task = self._calls.get(key)
+        if task is None:
+            SINGLEFLIGHT_CALLS.inc(self.server, tool)
+            # 计算放在独立的任务中，发起调用的请求被取消（客户端断开）时不影响其他等待者
+            task = asyncio.ensure_future(function(*function_args))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            SINGLEFLIGHT_COALESCED.inc(self.server, tool)
+        return await asyncio.shield(task)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并相同的并发线程调用"""
+
+    def __init__(self, server='api'):
+        self.server = server
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, tool, args, function, *function_args):
+        """执行 function(*function_args)，相同的调用正在执行时等待其结果"""
+        key = call_key(tool, args)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SINGLEFLIGHT_COALESCED.inc(self.server, tool)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLEFLIGHT_CALLS.inc(self.server, tool)
+        try:
+            call.result = function(*function_args)
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库启动耗时分析工具
+
+在新的Python进程中使用 -X importtime 执行入口脚本的模块级代码（不启动服务器），
+统计每个顶层模块的导入耗时，并与启动预算比较。
+
+用法:
+    python startup_profile.py api.py mcp_server.py
+    python api.py --profile-startup
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+# 冷启动预算（毫秒），可以通过环境变量覆盖
+STARTUP_BUDGET_MS = float(os.environ.get('KB_STARTUP_BUDGET_MS', '500'))
+
+# 默认显示耗时最多的模块数量
+TOP_MODULES = 15
+
+# 在子进程中执行脚本的模块级代码，run_name不是__main__，因此不会启动服务器
+RUNNER = "import runpy, sys; sys.argv = [sys.argv[1]]; runpy.run_path(sys.argv[0], run_name='__startup_profile__')"
+
+
+def parse_importtime(output):
+    """解析 -X importtime 的输出，返回 {顶层模块: 累计耗时(微秒)}"""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            # 表头行
+            continue
+        name = parts[2]
+        # 只统计由入口脚本直接导入的模块（没有缩进）
+        if name.startswith('  '):
+            continue
+        name = name.strip()
+        modules[name] = modules.get(name, 0) + cumulative
+    return modules
+
+
+def measure_script(script_path, env=None):
+    """测量脚本的启动耗时，返回 (总耗时毫秒, {模块: 耗时毫秒})"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', RUNNER, script_path],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(script_path)),
+    )
+    total_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{script_path} 启动失败:\n{result.stderr[-2000:]}")
+    modules = {name: us / 1000 for name, us in parse_importtime(result.stderr).items()}
+    return total_ms, modules
+
+
+def profile_startup(*script_paths, budget_ms=STARTUP_BUDGET_MS, top=TOP_MODULES):
+    """分析脚本的启动耗时并输出报告，全部在预算内时返回0，否则返回1"""
+    env = os.environ.copy()
+    env.setdefault('DOCS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'Docs'))
+
+    # Python解释器自身的启动耗时，从总耗时中扣除
+    baseline_ms, baseline_modules = measure_script(os.devnull, env)
+
+    exit_code = 0
+    for script_path in script_paths:
+        total_ms, modules = measure_script(script_path, env)
+        startup_ms = max(total_ms - baseline_ms, 0)
+        within_budget = startup_ms <= budget_ms
+        if not within_budget:
+            exit_code = 1
+
+        print(f"=== {os.path.basename(script_path)} ===")
+        print(f"启动耗时: {startup_ms:.1f} ms（预算 {budget_ms:.0f} ms，{'通过' if within_budget else '超出预算'}）")
+        print(f"{'模块':<40} {'耗时(ms)':>10}")
+        script_modules = {name: ms for name, ms in modules.items() if name not in baseline_modules}
+        for name, ms in sorted(script_modules.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"{name:<40} {ms:>10.1f}")
+        print()
+    return exit_code
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    sys.exit(profile_startup(*sys.argv[1:]))
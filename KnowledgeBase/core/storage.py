@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库文档存储
+
+文档的分类、列表、内容和全文搜索通过存储后端读取，KB_STORAGE选择后端：
+    - filesystem（默认）  直接读取文档目录（分类为子目录，文档为其中的 .md 文件）
+    - sqlite              读取由文档目录同步生成的SQLite数据库（单个文件），全文搜索使用FTS5
+
+SQLite后端适合较大的语料：服务器不需要文档目录，也不需要把所有文档读入内存——
+搜索和读取文档直接查询数据库，内存索引只在使用段落检索、符号查找等工具时才建立。
+数据库以只读方式打开，每个工作线程一个连接，并通过mmap映射（KB_SQLITE_MMAP_MB，默认256）
+由操作系统在进程之间共享页缓存。
+
+全文索引使用FTS5的trigram分词器（不区分大小写），与原来的子串搜索语义一致：
+三个字符及以上的查询通过全文索引匹配并按BM25排序，更短的查询（如两个汉字）逐行扫描文档表。
+
+同步是增量的：大小和修改时间都没有变化的文件跳过，内容哈希没有变化的文件只更新修改时间，
+已删除的文件从数据库中删除。同步在一个事务中完成，正在读取的服务器看到的是同步前或同步后的完整数据，
+同步后调用reload_index重建内存索引。
+
+用法:
+    python storage.py build                                  # 同步 Docs/ 到默认知识库的数据库
+    python storage.py build --docs-dir ../../Docs --db /data/ugui.sqlite
+    python storage.py search Canvas --db /data/ugui.sqlite
+"""
+
+import os
+import re
+import sys
+import glob
+import time
+import hashlib
+import threading
+
+# 数据库结构版本，结构变化时修改，旧的数据库需要重新同步
+SCHEMA_VERSION = 1
+
+# 默认数据库位置（每个知识库一个），以及每个连接的mmap大小
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
+MMAP_SIZE = int(float(os.environ.get('KB_SQLITE_MMAP_MB', '256')) * 1024 * 1024)
+
+# 搜索结果预览长度，以及trigram全文索引能匹配的最短查询长度
+PREVIEW_LENGTH = 200
+MIN_FTS_QUERY = 3
+
+FILESYSTEM = 'filesystem'
+SQLITE = 'sqlite'
+
+_HEADING = re.compile(r'^#{1,6}\s+(.*?)\s*#*\s*$', re.MULTILINE)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    content TEXT NOT NULL,
+    sha1 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_category ON documents (category, path);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    name, content, content='documents', content_rowid='id', tokenize='trigram case_sensitive 0'
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, name, content) VALUES (new.id, new.name, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, name, content) VALUES ('delete', old.id, old.name, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE OF name, content ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, name, content) VALUES ('delete', old.id, old.name, old.content);
+    INSERT INTO documents_fts (rowid, name, content) VALUES (new.id, new.name, new.content);
+END;
+'''
+
+
+class StorageError(RuntimeError):
+    """存储后端无法使用（如数据库不存在或版本不匹配）"""
+
+
+def content_hash(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def document_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def section_of(content, query):
+    """查询在文档中第一次出现的位置所在章节的标题，找不到时返回空字符串"""
+    position = content.lower().find(query.lower())
+    if position < 0:
+        return ''
+    heading = ''
+    for match in _HEADING.finditer(content, 0, position + len(query)):
+        heading = match.group(1)
+    return heading
+
+
+def _result(category, path, content, score, query):
+    """content至少包含文档开头到第一次命中的位置"""
+    return {
+        'category': category,
+        'name': document_name(path),
+        'path': path,
+        'preview': content[:PREVIEW_LENGTH] + '...',
+        'section': section_of(content, query),
+        'score': round(score, 3),
+        'alternates': [],
+    }
+
+
+class Storage:
+    """存储后端接口，路径为相对于文档目录、以/分隔的路径（如 UGUI/UGUIArchitecture.md）"""
+
+    kind = ''
+    # 是否提供全文搜索（提供时普通查询不需要建立内存索引）
+    full_text = False
+
+    def categories(self):
+        """所有分类"""
+        raise NotImplementedError
+
+    def documents(self, category):
+        """分类下的文档，返回 [{'name', 'path'}]"""
+        raise NotImplementedError
+
+    def read(self, path):
+        """文档内容，不存在时返回None"""
+        raise NotImplementedError
+
+    def manifest(self):
+        """所有文档的清单，返回 [{'path', 'category', 'size', 'mtime_ns'}]（按路径排序）"""
+        raise NotImplementedError
+
+    def iter_documents(self):
+        """按路径顺序返回 (分类, 路径, 内容)，用于建立内存索引"""
+        raise NotImplementedError
+
+    def search(self, query):
+        """搜索包含query的文档（不区分大小写），结果格式与内存索引的search相同"""
+        raise NotImplementedError
+
+    def describe(self):
+        return {'kind': self.kind}
+
+
+class FileSystemStorage(Storage):
+    """直接读取文档目录"""
+
+    kind = FILESYSTEM
+
+    def __init__(self, docs_dir):
+        self.docs_dir = docs_dir
+
+    def _inside(self, path):
+        """path是否在文档目录内：解析..和符号链接后比较，拒绝绝对路径和指向目录外的路径"""
+        root = os.path.realpath(self.docs_dir)
+        return os.path.commonpath([root, os.path.realpath(os.path.join(root, path))]) == root
+
+    def _files(self):
+        """[(分类, 路径, 完整路径)]，按路径排序"""
+        files = []
+        if not self.docs_dir:
+            return files
+        for category_dir in sorted(glob.glob(os.path.join(self.docs_dir, '*'))):
+            if not os.path.isdir(category_dir):
+                continue
+            category = os.path.basename(category_dir)
+            for file_path in sorted(glob.glob(os.path.join(category_dir, '*.md'))):
+                files.append((category, os.path.relpath(file_path, self.docs_dir).replace(os.sep, '/'), file_path))
+        return files
+
+    def categories(self):
+        if not self.docs_dir:
+            return []
+        return [os.path.basename(dir_path) for dir_path in glob.glob(os.path.join(self.docs_dir, '*'))
+                if os.path.isdir(dir_path)]
+
+    def documents(self, category):
+        category_path = os.path.join(self.docs_dir, category)
+        if not self.docs_dir or not self._inside(category) or not os.path.exists(category_path):
+            return []
+        return [{'name': document_name(file_path), 'path': file_path.replace(self.docs_dir, '').lstrip('/\\')}
+                for file_path in glob.glob(os.path.join(category_path, '*.md'))]
+
+    def read(self, path):
+        full_path = os.path.join(self.docs_dir, path)
+        if not self.docs_dir or not self._inside(path) or not os.path.isfile(full_path):
+            return None
+        with open(full_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def manifest(self):
+        manifest = []
+        for category, path, full_path in self._files():
+            stat = os.stat(full_path)
+            manifest.append({'path': path, 'category': category, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+        return manifest
+
+    def iter_documents(self):
+        for category, path, full_path in self._files():
+            with open(full_path, 'r', encoding='utf-8') as f:
+                yield category, path, f.read()
+
+    def search(self, query):
+        results = []
+        lowered = query.lower()
+        for category, path, content in self.iter_documents():
+            if lowered in content.lower():
+                results.append(_result(category, path, content, 0.0, query))
+        return results
+
+    def describe(self):
+        return {'kind': self.kind, 'docs_dir': self.docs_dir}
+
+
+class SQLiteStorage(Storage):
+    """只读的SQLite数据库，每个线程一个连接"""
+
+    kind = SQLITE
+    full_text = True
+
+    def __init__(self, db_path, mmap_size=MMAP_SIZE):
+        self.db_path = os.path.abspath(db_path)
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        if not os.path.exists(self.db_path):
+            raise StorageError(f"数据库不存在: {self.db_path}（请先运行 python storage.py build）")
+        version = self._connection().execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if version is None or int(version[0]) != SCHEMA_VERSION:
+            raise StorageError(f"数据库版本不匹配: {self.db_path}（请重新运行 python storage.py build）")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            import sqlite3
+
+            connection = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, check_same_thread=False)
+            connection.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+            connection.execute('PRAGMA query_only = 1')
+            self._local.connection = connection
+        return connection
+
+    def categories(self):
+        rows = self._connection().execute('SELECT DISTINCT category FROM documents ORDER BY category')
+        return [row[0] for row in rows]
+
+    def documents(self, category):
+        rows = self._connection().execute('SELECT name, path FROM documents WHERE category = ? ORDER BY path',
+                                          (category,))
+        return [{'name': name, 'path': path} for name, path in rows]
+
+    def read(self, path):
+        row = self._connection().execute('SELECT content FROM documents WHERE path = ?',
+                                         (path.replace('\\', '/'),)).fetchone()
+        return row[0] if row else None
+
+    def manifest(self):
+        rows = self._connection().execute('SELECT path, category, size, mtime_ns, sha1 FROM documents ORDER BY path')
+        return [{'path': path, 'category': category, 'size': size, 'mtime_ns': mtime_ns, 'sha1': sha1}
+                for path, category, size, mtime_ns, sha1 in rows]
+
+    def iter_documents(self):
+        yield from self._connection().execute('SELECT category, path, content FROM documents ORDER BY path')
+
+    def search(self, query):
+        query = query.strip()
+        connection = self._connection()
+        if len(query) >= MIN_FTS_QUERY:
+            # 整个查询作为一个FTS5字符串，trigram分词器按子串匹配；
+            # 只取出文档开头到第一次命中的部分（用于预览和定位章节），不传输整篇文档
+            rows = connection.execute(
+                'SELECT d.category, d.path, '
+                'substr(d.content, 1, max(instr(lower(d.content), lower(:query)) + length(:query), :preview)), '
+                '-bm25(documents_fts) FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid '
+                'WHERE documents_fts MATCH :match ORDER BY bm25(documents_fts)',
+                {'query': query, 'preview': PREVIEW_LENGTH, 'match': '"' + query.replace('"', '""') + '"'})
+            return [_result(category, path, content, score, query) for category, path, content, score in rows]
+        lowered = query.lower()
+        rows = connection.execute('SELECT category, path, content FROM documents ORDER BY path')
+        return [_result(category, path, content, 0.0, query)
+                for category, path, content in rows if lowered in content.lower()]
+
+    def describe(self):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'synced_at'").fetchone()
+        return {
+            'kind': self.kind,
+            'db_path': self.db_path,
+            'synced_at': row[0] if row else None,
+            'size_bytes': os.path.getsize(self.db_path),
+        }
+
+
+def default_db_path(name):
+    """知识库的默认数据库位置"""
+    return os.path.join(CACHE_DIR, name, 'documents.sqlite')
+
+
+def open_storage(kind, docs_dir, db_path):
+    """按类型创建存储后端，类型无效或数据库无法使用时抛出StorageError"""
+    if kind == SQLITE:
+        return SQLiteStorage(db_path)
+    if kind == FILESYSTEM:
+        return FileSystemStorage(docs_dir)
+    raise StorageError(f"不支持的存储后端: {kind}（可用: {FILESYSTEM}, {SQLITE}）")
+
+
+def sync(docs_dir, db_path):
+    """把文档目录增量同步到数据库，返回各类文件的数量"""
+    import sqlite3
+
+    source = FileSystemStorage(docs_dir)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    connection = sqlite3.connect(db_path)
+    stats = {'added': 0, 'updated': 0, 'touched': 0, 'unchanged': 0, 'removed': 0}
+    try:
+        connection.executescript(_SCHEMA)
+        version = connection.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if version is not None and int(version[0]) != SCHEMA_VERSION:
+            raise StorageError(f"数据库版本不匹配: {db_path}，请删除后重新同步")
+        with connection:
+            existing = {path: (size, mtime_ns, sha1) for path, size, mtime_ns, sha1
+                        in connection.execute('SELECT path, size, mtime_ns, sha1 FROM documents')}
+            for category, path, full_path in source._files():
+                stat = os.stat(full_path)
+                stored = existing.pop(path, None)
+                if stored is not None and stored[:2] == (stat.st_size, stat.st_mtime_ns):
+                    stats['unchanged'] += 1
+                    continue
+                with open(full_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                digest = content_hash(content)
+                if stored is None:
+                    connection.execute(
+                        'INSERT INTO documents (path, category, name, content, sha1, size, mtime_ns) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (path, category, document_name(path), content, digest, stat.st_size, stat.st_mtime_ns))
+                    stats['added'] += 1
+                elif stored[2] == digest:
+                    # 内容没有变化，只更新修改时间（不触发全文索引更新）
+                    connection.execute('UPDATE documents SET size = ?, mtime_ns = ? WHERE path = ?',
+                                       (stat.st_size, stat.st_mtime_ns, path))
+                    stats['touched'] += 1
+                else:
+                    connection.execute(
+                        'UPDATE documents SET content = ?, sha1 = ?, size = ?, mtime_ns = ? WHERE path = ?',
+                        (content, digest, stat.st_size, stat.st_mtime_ns, path))
+                    stats['updated'] += 1
+            for path in existing:
+                connection.execute('DELETE FROM documents WHERE path = ?', (path,))
+                stats['removed'] += 1
+            connection.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', [
+                ('schema_version', str(SCHEMA_VERSION)),
+                ('docs_dir', os.path.abspath(docs_dir)),
+                ('synced_at', time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ])
+        if stats['added'] or stats['updated'] or stats['removed']:
+            connection.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+            connection.commit()
+    finally:
+        connection.close()
+    return stats
+
+
+def main():
+    """主函数：同步数据库或测试搜索"""
+    import argparse
+
+    root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    default_name = os.environ.get('KB_DEFAULT_NAME', 'ugui')
+    parser = argparse.ArgumentParser(description='UGUI知识库文档存储')
+    parser.add_argument('command', choices=('build', 'search'), help='build：同步数据库；search：在数据库中搜索')
+    parser.add_argument('query', nargs='?', help='search的查询')
+    parser.add_argument('--docs-dir', default=os.environ.get('DOCS_DIR', os.path.join(root_dir, 'Docs')), help='文档目录')
+    parser.add_argument('--db', default=os.environ.get('KB_SQLITE_PATH', default_db_path(default_name)), help='数据库文件')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            if not os.path.isdir(args.docs_dir):
+                print(f"错误: 文档目录不存在: {args.docs_dir}")
+                return 1
+            started = time.perf_counter()
+            stats = sync(args.docs_dir, args.db)
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"{args.docs_dir} -> {args.db}")
+            print(f"新增 {stats['added']}，更新 {stats['updated']}，仅修改时间 {stats['touched']}，"
+                  f"未变化 {stats['unchanged']}，删除 {stats['removed']}，耗时 {elapsed:.0f} ms")
+            return 0
+        if not args.query:
+            parser.error('search需要查询')
+        storage = SQLiteStorage(args.db)
+        started = time.perf_counter()
+        results = storage.search(args.query)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"搜索 {args.query!r}：{len(results)} 个结果，耗时 {elapsed:.2f} ms")
+        for result in results[:20]:
+            print(f"  [{result['score']:.2f}] {result['path']}  {result['section']}")
+        return 0
+    except StorageError as e:
+        print(f"错误: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
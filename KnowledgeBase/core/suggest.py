@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库输入补全
+
+按前缀返回权重最高的补全候选（文档标题、章节标题、代码符号和高频词），用于边输入边搜索。
+
+候选按小写文本排成有序数组，前缀对应数组中的一段连续区间，用二分查找定位：
+    - 区间不超过SCAN_LIMIT时直接在区间内取权重最高的若干项
+    - 更大的区间（通常是一两个字符的前缀）在建立时预先计算好前MAX_LIMIT项
+因此每次查询的工作量有上限，与候选总数无关。
+"""
+
+import re
+import heapq
+import bisect
+
+# 每次最多返回的候选数量，以及查询时允许直接扫描的区间大小
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 20
+SCAN_LIMIT = 256
+
+# 不同来源的权重系数，权重 = 出现次数 × 系数
+KIND_WEIGHTS = {
+    'title': 8,
+    'heading': 4,
+    'symbol': 2,
+    'term': 1,
+}
+
+# 章节标题前的编号，如 “2.1 ”、“三、”
+_NUMBERING = re.compile(r'^(?:[\d.]+|[一二三四五六七八九十]+、|第[一二三四五六七八九十\d]+[章节部分])\s*')
+# 前缀的上界：所有以prefix开头的字符串都小于 prefix + _MAX_CHAR
+_MAX_CHAR = '\U0010ffff'
+
+
+def normalize_heading(heading):
+    """去掉章节标题前的编号，便于按标题内容补全"""
+    return _NUMBERING.sub('', heading.strip()).strip()
+
+
+class Suggester:
+    """前缀补全，候选在建立后不再变化"""
+
+    def __init__(self, entries):
+        """entries为 [(文本, 类别, 出现次数, 路径或None)]，相同文本（不区分大小写）的权重合并"""
+        merged = {}
+        for text, kind, count, path in entries:
+            text = text.strip()
+            if not text:
+                continue
+            key = text.lower()
+            weight = count * KIND_WEIGHTS.get(kind, 1)
+            item = merged.get(key)
+            if item is None:
+                merged[key] = [weight, text, kind, path, weight]
+            else:
+                item[0] += weight
+                # 显示文本、类别和路径取权重最高的来源
+                if weight > item[4]:
+                    item[1:] = [text, kind, path or item[3], weight]
+        self.keys = sorted(merged)
+        self.weights = [merged[key][0] for key in self.keys]
+        self.items = [{'text': merged[key][1], 'kind': merged[key][2], 'path': merged[key][3], 'weight': merged[key][0]}
+                      for key in self.keys]
+        self._top = self._precompute()
+
+    def _range(self, prefix):
+        low = bisect.bisect_left(self.keys, prefix)
+        high = bisect.bisect_left(self.keys, prefix + _MAX_CHAR, low)
+        return low, high
+
+    def _best(self, low, high, limit):
+        return heapq.nlargest(limit, range(low, high), key=lambda position: (self.weights[position], -position))
+
+    def _precompute(self):
+        """为区间超过SCAN_LIMIT的前缀预先计算前MAX_LIMIT项"""
+        top = {}
+        # 只有在有序数组中每隔SCAN_LIMIT个位置出现的前缀才可能覆盖超过SCAN_LIMIT项
+        for position in range(0, len(self.keys), SCAN_LIMIT):
+            key = self.keys[position]
+            for length in range(1, len(key) + 1):
+                prefix = key[:length]
+                if prefix in top:
+                    continue
+                low, high = self._range(prefix)
+                if high - low <= SCAN_LIMIT:
+                    break
+                top[prefix] = self._best(low, high, MAX_LIMIT)
+        return top
+
+    def __len__(self):
+        return len(self.keys)
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        """返回以prefix开头（不区分大小写）的候选，按权重从高到低排序"""
+        prefix = prefix.strip().lower()
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        if not prefix:
+            return []
+        positions = self._top.get(prefix)
+        if positions is None:
+            low, high = self._range(prefix)
+            positions = self._best(low, high, limit)
+        return [self.items[position] for position in positions[:limit]]
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库C#符号索引
+
+从文档中的代码提取标识符，建立 符号 -> [(文档, 章节, 行号)] 的符号表：
+    - C#代码块中类型、方法、字段等声明记为definition，类中声明的成员同时记为 类名.成员（如 Graphic.SetVerticesDirty）
+    - 其他出现记为reference，类型名开头的调用链（如 CanvasUpdateRegistry.RegisterCanvasElementForLayoutRebuild）同时记录完整名称
+    - 字符串和字符常量中的内容不参与提取，注释中的标识符保留
+    - 其他代码块（mermaid时序图等）和正文中的行内代码只记录reference，并且只保留大写开头的标识符和调用链，
+      UGUI的类型和方法大多只出现在这些地方
+
+精确查找是一次字典访问（区分大小写，找不到时再按不区分大小写查找）；
+前缀查找在排好序的小写符号数组上二分查找。
+"""
+
+import re
+import bisect
+
+# C#代码块的语言标记
+CSHARP_LANGUAGES = ('csharp', 'cs', 'c#')
+
+# 每个符号最多返回的出现位置数量，以及前缀查找最多返回的符号数量
+DEFAULT_OCCURRENCE_LIMIT = 20
+DEFAULT_SYMBOL_LIMIT = 20
+
+# 行内上下文的最大长度
+CONTEXT_LENGTH = 160
+
+KEYWORDS = frozenset('''
+    abstract as base bool break byte case catch char checked class const continue decimal default delegate do
+    double else enum event explicit extern false finally fixed float for foreach goto if implicit in int interface
+    internal is lock long namespace new null object operator out override params private protected public readonly
+    ref return sbyte sealed short sizeof stackalloc static string struct switch this throw true try typeof uint
+    ulong unchecked unsafe ushort using virtual void volatile while var async await get set value yield partial
+    where nameof when dynamic record init global
+'''.split())
+
+MODIFIERS = frozenset('''
+    public private protected internal static virtual override abstract sealed async extern unsafe new partial
+    readonly const volatile event
+'''.split())
+
+_FENCE = re.compile(r'^\s*(```|~~~)\s*([\w#+-]*)')
+# 字符串、字符常量（包括逐字字符串和内插字符串）
+_STRING = re.compile(r'@?\$?"(?:[^"\\]|\\.|"")*"|\'(?:[^\'\\]|\\.)\'')
+_INLINE_CODE = re.compile(r'`([^`\n]+)`')
+_CHAIN = re.compile(r'[A-Za-z_]\w*(?:\s*\.\s*[A-Za-z_]\w*)*')
+_TYPE_DECLARATION = re.compile(r'\b(class|struct|interface|enum)\s+([A-Za-z_]\w*)')
+_MEMBER_DECLARATION = re.compile(
+    r'^\s*(?:\[[^\]]*\]\s*)*((?:[A-Za-z_]\w*\s+)*)'    # 修饰符
+    r'[A-Za-z_][\w.]*(?:<[^;(){}]*>)?(?:\[\s*,*\s*\])?\??\s+'  # 类型
+    r'([A-Za-z_]\w*)\s*(\(|=>|=|;|\{|$)'               # 名称和后面的符号
+)
+
+
+def is_csharp(language):
+    """代码块的语言标记是否表示C#"""
+    return language.lower() in CSHARP_LANGUAGES
+
+
+def code_blocks(lines, first_line=1):
+    """提取Markdown中的代码块，返回 [(起始行号, [代码行], 语言标记)]，起始行号是代码块第一行代码的行号"""
+    blocks = []
+    current = None
+    language = ''
+    start = first_line
+    for number, line in enumerate(lines, first_line):
+        match = _FENCE.match(line)
+        if match:
+            if current is None:
+                current, language, start = [], match.group(2), number + 1
+            else:
+                blocks.append((start, current, language))
+                current = None
+            continue
+        if current is not None:
+            current.append(line)
+    # 未闭合的代码块到文件末尾为止
+    if current:
+        blocks.append((start, current, language))
+    return blocks
+
+
+def inline_code(lines, first_line=1):
+    """提取代码块之外的行内代码，返回 [(行号, 代码)]"""
+    spans = []
+    fenced = False
+    for number, line in enumerate(lines, first_line):
+        if _FENCE.match(line):
+            fenced = not fenced
+            continue
+        if not fenced and '`' in line:
+            spans.extend((number, span) for span in _INLINE_CODE.findall(line))
+    return spans
+
+
+def strip_code(line, in_comment):
+    """去掉字符串常量和块注释标记，返回 (代码, 注释, 是否仍在块注释中)"""
+    code, comments = [], []
+    line = _STRING.sub('""', line)
+    while line:
+        if in_comment:
+            end = line.find('*/')
+            if end < 0:
+                comments.append(line)
+                return ''.join(code), ' '.join(comments), True
+            comments.append(line[:end])
+            line, in_comment = line[end + 2:], False
+            continue
+        start = line.find('/*')
+        single = line.find('//')
+        if single >= 0 and (start < 0 or single < start):
+            code.append(line[:single])
+            comments.append(line[single + 2:])
+            break
+        if start < 0:
+            code.append(line)
+            break
+        code.append(line[:start])
+        line, in_comment = line[start + 2:], True
+    return ''.join(code), ' '.join(comments), in_comment
+
+
+def _chain_symbols(chain):
+    """调用链中需要记录的符号：每个标识符，以及以类型名（大写开头）开始的完整链和前两段"""
+    parts = [part for part in re.split(r'\s*\.\s*', chain) if part]
+    symbols = [part for part in parts if part not in KEYWORDS and len(part) > 1]
+    if len(parts) > 1 and parts[0][0].isupper() and parts[0] not in KEYWORDS:
+        symbols.append('.'.join(parts[:2]))
+        if len(parts) > 2:
+            symbols.append('.'.join(parts))
+    return symbols
+
+
+def extract_references(lines, first_line=1):
+    """宽松提取：只保留大写开头的标识符和以类型名开头的调用链，返回格式与extract相同"""
+    occurrences = []
+    for number, line in enumerate(lines, first_line):
+        context = line.strip()[:CONTEXT_LENGTH]
+        for chain in _CHAIN.findall(_STRING.sub('""', line)):
+            if not chain[0].isupper():
+                continue
+            for symbol in _chain_symbols(chain):
+                if symbol[0].isupper() and len(symbol) > 2:
+                    occurrences.append((symbol, number, 'reference', context))
+    return occurrences
+
+
+def extract(lines, first_line=1):
+    """从C#代码行中提取符号，返回 [(符号, 行号, 类别, 行内容)]，类别为definition或reference"""
+    occurrences = []
+    # 类型栈：[(类型名, 类型体所在的花括号深度)]
+    types = []
+    pending_type = None
+    depth = 0
+    in_comment = False
+    for number, line in enumerate(lines, first_line):
+        code, comment, in_comment = strip_code(line, in_comment)
+        context = line.strip()[:CONTEXT_LENGTH]
+        defined = set()
+
+        match = _TYPE_DECLARATION.search(code)
+        if match:
+            name = match.group(2)
+            qualified = f'{types[-1][0]}.{name}' if types and types[-1][1] == depth else None
+            occurrences.append((name, number, 'definition', context))
+            if qualified:
+                occurrences.append((qualified, number, 'definition', context))
+            defined.add(name)
+            pending_type = name
+        elif types and types[-1][1] == depth:
+            # 直接位于类型体中的成员声明
+            member = _MEMBER_DECLARATION.match(code)
+            if member:
+                modifiers = member.group(1).split()
+                name = member.group(2)
+                is_method = member.group(3) == '('
+                if name not in KEYWORDS and all(word in MODIFIERS for word in modifiers) and (modifiers or is_method):
+                    occurrences.append((name, number, 'definition', context))
+                    occurrences.append((f'{types[-1][0]}.{name}', number, 'definition', context))
+                    defined.add(name)
+
+        for text in (code, comment):
+            for chain in _CHAIN.findall(text):
+                for symbol in _chain_symbols(chain):
+                    if symbol not in defined:
+                        occurrences.append((symbol, number, 'reference', context))
+
+        for char in code:
+            if char == '{':
+                depth += 1
+                if pending_type:
+                    types.append((pending_type, depth))
+                    pending_type = None
+            elif char == '}':
+                if types and types[-1][1] == depth:
+                    types.pop()
+                depth = max(depth - 1, 0)
+        if pending_type and code.rstrip().endswith(';'):
+            # 没有类型体的声明（如前向声明或record）
+            pending_type = None
+    return occurrences
+
+
+class SymbolTable:
+    """符号 -> 出现位置，出现位置为dict（由调用方提供的位置信息加上line、kind、context）"""
+
+    def __init__(self):
+        self.exact = {}
+        # 小写符号 -> [原始符号]
+        self.folded = {}
+        self.sorted_keys = []
+        self._seen = set()
+
+    def add(self, symbol, line, kind, context, location):
+        """记录一次出现，同一符号在同一文件同一行只记录一次（definition优先）"""
+        key = (symbol, location.get('path'), line)
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        occurrence = dict(location, line=line, kind=kind, context=context)
+        if symbol not in self.exact:
+            self.exact[symbol] = []
+            self.folded.setdefault(symbol.lower(), []).append(symbol)
+        self.exact[symbol].append(occurrence)
+
+    def add_block(self, lines, first_line, location, language='csharp'):
+        """记录一个代码块中的符号，非C#代码块只做宽松提取"""
+        occurrences = extract(lines, first_line) if is_csharp(language) else extract_references(lines, first_line)
+        for symbol, line, kind, context in occurrences:
+            self.add(symbol, line, kind, context, location)
+
+    def add_markdown(self, lines, first_line, location):
+        """记录Markdown片段中所有代码块和行内代码的符号"""
+        for start_line, block, language in code_blocks(lines, first_line):
+            self.add_block(block, start_line, location, language)
+        for line, span in inline_code(lines, first_line):
+            for symbol, _, kind, _ in extract_references([span], line):
+                self.add(symbol, line, kind, span[:CONTEXT_LENGTH], location)
+
+    def freeze(self):
+        """建立前缀查找用的有序数组，definition排在reference前面"""
+        for occurrences in self.exact.values():
+            occurrences.sort(key=lambda item: (item['kind'] != 'definition', item.get('path', ''), item['line']))
+        self.sorted_keys = sorted(self.folded)
+        return self
+
+    def __len__(self):
+        return len(self.exact)
+
+    def _match(self, symbol, limit):
+        occurrences = self.exact[symbol]
+        return {
+            'symbol': symbol,
+            'definitions': sum(1 for item in occurrences if item['kind'] == 'definition'),
+            'count': len(occurrences),
+            'occurrences': occurrences[:limit],
+        }
+
+    def lookup(self, symbol, limit=DEFAULT_OCCURRENCE_LIMIT):
+        """精确查找，先区分大小写，找不到时不区分大小写；限定名（Graphic.SetVerticesDirty）都找不到时查找成员名"""
+        if symbol in self.exact:
+            return [self._match(symbol, limit)]
+        matches = [self._match(name, limit) for name in self.folded.get(symbol.lower(), ())]
+        if not matches and '.' in symbol:
+            return self.lookup(symbol.rsplit('.', 1)[1], limit)
+        return matches
+
+    def prefix(self, prefix, limit=DEFAULT_SYMBOL_LIMIT, occurrence_limit=DEFAULT_OCCURRENCE_LIMIT):
+        """前缀查找（不区分大小写），按符号排序返回最多limit个符号"""
+        prefix = prefix.lower()
+        matches = []
+        position = bisect.bisect_left(self.sorted_keys, prefix)
+        while position < len(self.sorted_keys) and len(matches) < limit:
+            key = self.sorted_keys[position]
+            if not key.startswith(prefix):
+                break
+            for name in self.folded[key]:
+                matches.append(self._match(name, occurrence_limit))
+            position += 1
+        return matches[:limit]
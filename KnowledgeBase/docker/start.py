@@ -5,86 +5,304 @@
 UGUI知识库启动脚本
 
 这个脚本用于一键启动UGUI知识库系统，包括API服务器、WebViewer服务器和MCP服务器。
+所有服务器由Supervisor统一管理：启动后轮询端口或健康检查地址判断是否就绪，
+子进程崩溃后按指数退避自动重启，退出时优雅地关闭所有子进程。
 """
 
 import os
 import sys
-import subprocess
-import threading
-import webbrowser
+import json
 import time
+import signal
+import socket
 import argparse
-import json
+import threading
+import subprocess
+import urllib.error
+import urllib.request
 
 # 获取项目根目录
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR = os.path.dirname(SCRIPT_DIR)
+CORE_DIR = os.path.join(ROOT_DIR, 'core')
+PROJECT_DIR = os.path.dirname(ROOT_DIR)
+
+# 服务端口
+API_PORT = 5000
+MCP_PORT = 8000
+WEB_PORT = 8080
+
+# 就绪检查与重启策略
+READY_TIMEOUT = 30.0
+PROBE_INTERVAL = 0.1
+RESTART_BACKOFF_INITIAL = 1.0
+RESTART_BACKOFF_MAX = 30.0
+# 进程稳定运行超过该时间后重置退避时间
+RESTART_BACKOFF_RESET = 60.0
+SHUTDOWN_TIMEOUT = 5.0
+
+# 依赖模块，只检查是否已安装，不实际导入
+DEPENDENCIES = ['flask', 'flask_cors', 'markdown', 'requests', 'rich']
+MCP_DEPENDENCIES = ['fastapi', 'uvicorn', 'pydantic']
 
 def check_dependencies(mcp_mode=False):
     """检查依赖是否已安装"""
-    try:
-        import flask
-        import flask_cors
-        import markdown
-        import requests
-        import rich
-        
-        # 如果是MCP模式，还需要检查MCP相关依赖
-        if mcp_mode:
-            import fastapi
-            import uvicorn
-            import pydantic
-        return True
-    except ImportError as e:
-        print(f"错误: 缺少依赖 {e.name}")
+    import importlib.util
+
+    modules = DEPENDENCIES + (MCP_DEPENDENCIES if mcp_mode else [])
+    missing = [name for name in modules if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"错误: 缺少依赖 {', '.join(missing)}")
         print("请先安装所有依赖:")
-        print("pip install -r KnowledgeBase/requirements.txt")
+        print("pip install -r KnowledgeBase/core/requirements.txt")
         return False
+    return True
+
+def get_docs_dir():
+    """获取文档目录"""
+    return os.environ.get('DOCS_DIR', os.path.join(PROJECT_DIR, 'Docs'))
+
+class ManagedProcess:
+    """由Supervisor管理的子进程"""
+
+    def __init__(self, name, command, port, health_path=None, env=None, cwd=None):
+        self.name = name
+        self.command = command
+        self.port = port
+        self.health_path = health_path
+        self.env = env
+        self.cwd = cwd
+        self.process = None
+        self.started_at = None
+        self.ready_at = None
+        self.restarts = 0
+        self.backoff = RESTART_BACKOFF_INITIAL
+        self.next_restart_at = None
+        self.terminating = False
+
+    def start(self):
+        """启动子进程"""
+        kwargs = {}
+        if os.name == 'posix':
+            # 使用独立的进程组，关闭时可以连同其派生的子进程一起结束
+            kwargs['start_new_session'] = True
+        self.process = subprocess.Popen(self.command, env=self.env, cwd=self.cwd, **kwargs)
+        self.started_at = time.monotonic()
+        self.ready_at = None
+        self.next_restart_at = None
+        self.terminating = False
+
+    def is_running(self):
+        """子进程是否仍在运行"""
+        return self.process is not None and self.process.poll() is None
+
+    def probe(self):
+        """检查服务是否就绪：有健康检查地址时请求该地址，否则检查端口是否可连接"""
+        if self.health_path:
+            url = f'http://127.0.0.1:{self.port}{self.health_path}'
+            try:
+                request = urllib.request.Request(url, method='GET')
+                with urllib.request.urlopen(request, timeout=1) as response:
+                    return 200 <= response.status < 500
+            except urllib.error.HTTPError as e:
+                # 服务已经能处理请求，只是返回了错误状态
+                return e.code < 500
+            except OSError:
+                return False
+        try:
+            with socket.create_connection(('127.0.0.1', self.port), timeout=0.5):
+                return True
+        except OSError:
+            return False
+
+    def check_ready(self):
+        """检查服务是否就绪，首次就绪时记录时间"""
+        if self.ready_at is None and self.is_running() and self.probe():
+            self.ready_at = time.monotonic()
+        return self.ready_at is not None
+
+    def time_to_ready(self):
+        """从启动到就绪的时间（秒）"""
+        if self.ready_at is None:
+            return None
+        return self.ready_at - self.started_at
+
+    def schedule_restart(self, now):
+        """子进程退出后按指数退避安排重启"""
+        uptime = now - self.started_at
+        if uptime >= RESTART_BACKOFF_RESET:
+            self.backoff = RESTART_BACKOFF_INITIAL
+        self.next_restart_at = now + self.backoff
+        delay = self.backoff
+        self.backoff = min(self.backoff * 2, RESTART_BACKOFF_MAX)
+        return delay
+
+    def terminate(self):
+        """请求子进程退出；SIGTERM只发送一次，uvicorn收到第二个信号会跳过优雅关闭立即退出"""
+        if self.is_running() and not self.terminating:
+            self.terminating = True
+            self.send_signal(signal.SIGTERM)
+
+    def wait_stopped(self, deadline):
+        """等待子进程退出，到deadline（time.monotonic()）仍未退出时强制结束"""
+        if not self.is_running():
+            return
+        try:
+            self.process.wait(timeout=max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            print(f"{self.name} 未在 {SHUTDOWN_TIMEOUT:.0f} 秒内退出，强制结束")
+            self.send_signal(signal.SIGKILL if hasattr(signal, 'SIGKILL') else signal.SIGTERM)
+            self.process.wait()
+
+    def stop(self, timeout=SHUTDOWN_TIMEOUT):
+        """优雅地停止子进程，超时后强制结束"""
+        self.terminate()
+        self.wait_stopped(time.monotonic() + timeout)
+
+    def send_signal(self, sig):
+        """向子进程（及其进程组）发送信号"""
+        try:
+            if os.name == 'posix':
+                os.killpg(self.process.pid, sig)
+            elif sig == signal.SIGTERM:
+                self.process.terminate()
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+class Supervisor:
+    """启动并监控所有服务器子进程"""
+
+    def __init__(self, processes, ready_timeout=READY_TIMEOUT):
+        self.processes = processes
+        self.ready_timeout = ready_timeout
+        self.stop_event = threading.Event()
+        self.started_at = None
+        self.ready_at = None
+
+    def start_all(self):
+        """启动所有子进程并等待它们就绪，返回是否全部就绪"""
+        self.started_at = time.monotonic()
+        for proc in self.processes:
+            print(f"正在启动{proc.name}...")
+            proc.start()
+
+        deadline = self.started_at + self.ready_timeout
+        pending = list(self.processes)
+        while pending and not self.stop_event.is_set():
+            for proc in list(pending):
+                if proc.check_ready():
+                    print(f"{proc.name}已就绪: 端口 {proc.port}，用时 {proc.time_to_ready():.2f} 秒")
+                    pending.remove(proc)
+                elif not proc.is_running():
+                    print(f"错误: {proc.name}启动失败，退出码 {proc.process.returncode}")
+                    return False
+            if pending and time.monotonic() > deadline:
+                names = '、'.join(proc.name for proc in pending)
+                print(f"错误: {names}在 {self.ready_timeout:.0f} 秒内未就绪")
+                return False
+            self.stop_event.wait(PROBE_INTERVAL)
 
-def run_api_server():
-    """运行API服务器"""
-    api_script = os.path.join(SCRIPT_DIR, 'api.py')
-    print("正在启动API服务器...")
-    subprocess.Popen([sys.executable, api_script])
+        self.ready_at = time.monotonic()
+        return not pending
 
-def run_web_viewer():
-    """运行WebViewer服务器"""
-    web_script = os.path.join(ROOT_DIR, 'WebViewer', 'server.py')
-    print("正在启动WebViewer服务器...")
-    subprocess.Popen([sys.executable, web_script])
+    def time_to_ready(self):
+        """从启动到全部就绪的时间（秒）"""
+        if self.ready_at is None:
+            return None
+        return self.ready_at - self.started_at
+
+    def ready_report(self):
+        """就绪时间报告，用于追踪启动耗时的变化"""
+        return {
+            'total_seconds': self.time_to_ready(),
+            'services': {
+                proc.name: {
+                    'port': proc.port,
+                    'seconds': proc.time_to_ready(),
+                    'restarts': proc.restarts,
+                }
+                for proc in self.processes
+            },
+        }
+
+    def monitor(self):
+        """监控子进程，崩溃后按退避时间重启，直到收到停止信号"""
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            for proc in self.processes:
+                if proc.next_restart_at is not None:
+                    if now >= proc.next_restart_at:
+                        proc.restarts += 1
+                        print(f"正在重启{proc.name}（第 {proc.restarts} 次）...")
+                        proc.start()
+                elif not proc.is_running():
+                    delay = proc.schedule_restart(now)
+                    print(f"警告: {proc.name}已退出，退出码 {proc.process.returncode}，{delay:.0f} 秒后重启")
+                elif proc.ready_at is None and proc.check_ready():
+                    print(f"{proc.name}已重新就绪，用时 {proc.time_to_ready():.2f} 秒")
+            self.stop_event.wait(0.5)
+
+    def shutdown(self):
+        """优雅地关闭所有子进程"""
+        self.stop_event.set()
+        for proc in self.processes:
+            proc.next_restart_at = None
+            if proc.is_running():
+                print(f"正在关闭{proc.name}...")
+                # 先向所有子进程发送一次信号，再在同一个宽限期内逐个等待
+                proc.terminate()
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for proc in self.processes:
+            proc.wait_stopped(deadline)
+
+    def request_stop(self, signum=None, frame=None):
+        """信号处理函数"""
+        self.stop_event.set()
+
+def create_processes(mcp_mode):
+    """创建需要管理的服务器进程"""
+    env = os.environ.copy()
+    env['DOCS_DIR'] = get_docs_dir()
+    # 子进程输出不缓冲，日志可以实时显示
+    env['PYTHONUNBUFFERED'] = '1'
+
+    processes = [
+        ManagedProcess(
+            'API服务器',
+            [sys.executable, os.path.join(CORE_DIR, 'api.py')],
+            API_PORT,
+            health_path='/api/docs',
+            env=env,
+            cwd=CORE_DIR,
+        )
+    ]
+
+    if mcp_mode:
+        processes.append(ManagedProcess(
+            'MCP服务器',
+            [sys.executable, os.path.join(CORE_DIR, 'mcp_server.py')],
+            MCP_PORT,
+            health_path='/mcp/config',
+            env=env,
+            cwd=CORE_DIR,
+        ))
+    else:
+        processes.append(ManagedProcess(
+            'WebViewer服务器',
+            [sys.executable, os.path.join(PROJECT_DIR, 'WebViewer', 'server.py'), str(WEB_PORT)],
+            WEB_PORT,
+            env=env,
+        ))
+    return processes
 
 def open_documentation():
     """打开文档查看器"""
-    # 等待服务器启动
-    time.sleep(2)
-    print("正在打开文档查看器...")
-    webbrowser.open('http://localhost:8080/WebViewer/UGUIDocumentationViewer.html')
+    import webbrowser
 
-def run_mcp_server():
-    """运行MCP服务器"""
-    try:
-        from fastapi import FastAPI
-        import uvicorn
-        
-        print("正在启动MCP服务器...")
-        # 使用子进程启动MCP服务器
-        mcp_script = os.path.join(SCRIPT_DIR, 'mcp_server.py')
-        if not os.path.exists(mcp_script):
-            # 如果mcp_server.py不存在，使用test_fastmcp_server.py作为替代
-            mcp_script = os.path.join(SCRIPT_DIR, 'test_fastmcp_server.py')
-        
-        # 设置环境变量
-        env = os.environ.copy()
-        if 'DOCS_DIR' in os.environ:
-            docs_dir = os.environ['DOCS_DIR']
-        else:
-            docs_dir = os.path.join(ROOT_DIR, 'Docs')
-        env['DOCS_DIR'] = docs_dir
-        
-        subprocess.Popen([sys.executable, mcp_script], env=env)
-        print(f"MCP服务器已启动，使用文档目录: {docs_dir}")
-    except Exception as e:
-        print(f"启动MCP服务器时出错: {str(e)}")
+    print("正在打开文档查看器...")
+    webbrowser.open(f'http://localhost:{WEB_PORT}/WebViewer/UGUIDocumentationViewer.html')
 
 def main():
     """主函数"""
@@ -92,66 +310,69 @@ def main():
     parser = argparse.ArgumentParser(description='UGUI知识库系统启动工具')
     parser.add_argument('--mcp-server', action='store_true', help='启动MCP服务器模式')
     parser.add_argument('--no-browser', action='store_true', help='不自动打开浏览器')
+    parser.add_argument('--ready-timeout', type=float, default=READY_TIMEOUT, help='等待服务就绪的超时时间（秒）')
+    parser.add_argument('--ready-report', help='将就绪时间报告以JSON格式写入指定文件')
+    parser.add_argument('--profile-startup', action='store_true', help='分析各服务器入口的模块导入耗时后退出')
     args = parser.parse_args()
-    
+
+    if args.profile_startup:
+        sys.path.insert(0, CORE_DIR)
+        from startup_profile import profile_startup
+        return profile_startup(
+            os.path.join(CORE_DIR, 'api.py'),
+            os.path.join(CORE_DIR, 'mcp_server.py'),
+            os.path.join(PROJECT_DIR, 'WebViewer', 'server.py'),
+        )
+
     # 检查是否为MCP服务器模式
     mcp_mode = args.mcp_server or os.environ.get('MCP_SERVER_ENABLED', '').lower() == 'true'
-    
+
     print("=== UGUI知识库系统启动工具 ===")
     if mcp_mode:
         print("运行模式: MCP服务器")
-    
+
     # 检查依赖
     if not check_dependencies(mcp_mode):
-        return
-    
-    # 启动API服务器
-    api_thread = threading.Thread(target=run_api_server)
-    api_thread.daemon = True
-    api_thread.start()
-    
-    # 如果是MCP模式，启动MCP服务器
-    if mcp_mode:
-        mcp_thread = threading.Thread(target=run_mcp_server)
-        mcp_thread.daemon = True
-        mcp_thread.start()
-    else:
-        # 非MCP模式才启动WebViewer和打开浏览器
-        web_thread = threading.Thread(target=run_web_viewer)
-        web_thread.daemon = True
-        web_thread.start()
-        
-        # 打开文档查看器（除非指定了--no-browser）
-        if not args.no_browser:
-            doc_thread = threading.Thread(target=open_documentation)
-            doc_thread.daemon = True
-            doc_thread.start()
-    
-    print("\n知识库系统已启动!")
-    print("API服务器运行在: http://localhost:5000")
-    
-    if mcp_mode:
-        print("MCP服务器运行在: http://localhost:8000")
-        print("\n使用MCP客户端工具:")
-        print("python KnowledgeBase/mcp_client.py categories")
-    else:
-        print("WebViewer服务器运行在: http://localhost:8080")
-        print("\n可用的WebViewer页面:")
-        print("- 文档查看器: http://localhost:8080/WebViewer/UGUIDocumentationViewer.html")
-        print("- 架构可视化: http://localhost:8080/WebViewer/UGUIArchitectureViewer.html")
-        print("- 动画可视化: http://localhost:8080/WebViewer/UGUIAnimation.html")
-        print("\n使用MCP客户端工具:")
-        print("python KnowledgeBase/mcp_client.py categories")
-    
-    print("\n按Ctrl+C退出")
-    
+        return 1
+
+    supervisor = Supervisor(create_processes(mcp_mode), ready_timeout=args.ready_timeout)
+    signal.signal(signal.SIGINT, supervisor.request_stop)
+    signal.signal(signal.SIGTERM, supervisor.request_stop)
+
     try:
-        # 保持主线程运行
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
+        if not supervisor.start_all():
+            return 1
+
+        report = supervisor.ready_report()
+        print(f"\n知识库系统已启动! 全部服务就绪用时 {report['total_seconds']:.2f} 秒")
+        if args.ready_report:
+            with open(args.ready_report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        print(f"API服务器运行在: http://localhost:{API_PORT}")
+        if mcp_mode:
+            print(f"MCP服务器运行在: http://localhost:{MCP_PORT}")
+            print("\n使用MCP客户端工具:")
+            print("python KnowledgeBase/mcp_client.py categories")
+        else:
+            print(f"WebViewer服务器运行在: http://localhost:{WEB_PORT}")
+            print("\n可用的WebViewer页面:")
+            print(f"- 文档查看器: http://localhost:{WEB_PORT}/WebViewer/UGUIDocumentationViewer.html")
+            print(f"- 架构可视化: http://localhost:{WEB_PORT}/WebViewer/UGUIArchitectureViewer.html")
+            print(f"- 动画可视化: http://localhost:{WEB_PORT}/WebViewer/UGUIAnimation.html")
+            print("\n使用MCP客户端工具:")
+            print("python KnowledgeBase/mcp_client.py categories")
+
+            # 服务就绪后再打开文档查看器（除非指定了--no-browser）
+            if not args.no_browser:
+                open_documentation()
+
+        print("\n按Ctrl+C退出")
+        supervisor.monitor()
+    finally:
         print("\n正在关闭知识库系统...")
-        sys.exit(0)
+        supervisor.shutdown()
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
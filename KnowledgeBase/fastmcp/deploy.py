@@ -15,9 +15,9 @@ import shutil
 import argparse
 import subprocess
 import time
+import importlib.util
 from rich.console import Console
 from rich.panel import Panel
-from rich.progress import Progress
 
 # 控制台输出美化
 console = Console()
@@ -32,10 +32,8 @@ def check_dependencies():
     has_uv = False
     has_npx = False
     
-    # 检查Python依赖
-    try:
-        import fastmcp
-    except ImportError:
+    # 检查Python依赖（只查找模块，不实际导入）
+    if importlib.util.find_spec("fastmcp") is None:
         missing_deps.append("fastmcp")
     
     # 检查uv是否可用
@@ -148,6 +146,9 @@ UGUI知识库MCP服务器
 import os
 import sys
 import json
+import time
+import pickle
+import hashlib
 
 # 尝试导入rich模块，如果失败则安装
 try:
@@ -182,6 +183,179 @@ mcp = FastMCP("UGUI知识库", dependencies=["flask", "flask_cors", "markdown",
 with open(os.path.join(SCRIPT_DIR, 'mcp_config.json'), 'r', encoding='utf-8') as f:
     config = json.load(f)
 
+
+def find_path(env_name, candidates):
+    """按环境变量和候选路径查找第一个存在的路径"""
+    value = os.environ.get(env_name)
+    if value:
+        return value
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return candidates[0]
+
+
+# 文档目录和知识库索引（服务器脚本位于KnowledgeBase或KnowledgeBase/fastmcp下）
+DOCS_DIR = find_path('UGUI_KB_DOCS_DIR', [
+    os.path.join(SCRIPT_DIR, '..', 'Docs'),
+    os.path.join(SCRIPT_DIR, '..', '..', 'Docs'),
+])
+INDEX_FILE = find_path('UGUI_KB_INDEX_FILE', [
+    os.path.join(SCRIPT_DIR, 'docs', '知识库索引.md'),
+    os.path.join(SCRIPT_DIR, '..', 'docs', '知识库索引.md'),
+])
+
+
+def parse_index(index_file, config):
+    """解析知识库索引.md，返回 {(分类, 文档ID): 相对于Docs目录的路径}"""
+    names = {info['name']: category for category, info in config['categories'].items()}
+    paths = {}
+    if not os.path.exists(index_file):
+        return paths
+
+    category = None
+    with open(index_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('### '):
+                # 例如“### 1. UGUI架构与原理”
+                category = names.get(line[4:].split('.', 1)[-1].strip())
+            elif category and line.startswith('|') and '](' in line:
+                cells = [cell.strip() for cell in line.strip('|').split('|')]
+                link = cells[-1]
+                path = link[link.find('](') + 2:link.rfind(')')]
+                parts = [part for part in path.split('/') if part not in ('..', '.', 'Docs')]
+                paths[(category, cells[0])] = os.path.join(*parts)
+    return paths
+
+
+class KnowledgeStore:
+    """启动时一次性加载的文档库
+
+    每篇文档只读取和转换小写一次；搜索时先用字符二元组倒排索引筛选候选文档，
+    再在候选文档的小写内容中确认关键词，结果与逐篇扫描相同。
+    """
+
+    def __init__(self, config, docs_dir, index_file):
+        self.config = config
+        self.contents = {}
+        self.entries = []
+        self.postings = {}
+
+        index_paths = parse_index(index_file, config)
+        for category, info in config['categories'].items():
+            for doc_id, title in info['documents'].items():
+                content = self._read(docs_dir, index_paths.get((category, doc_id)), category, doc_id)
+                if content is None:
+                    continue
+                self.contents[(category, doc_id)] = content
+                position = len(self.entries)
+                lowered = content.lower()
+                self.entries.append((lowered, {
+                    "category": category,
+                    "doc_id": doc_id,
+                    "title": title,
+                    "preview": content[:200] + "...",
+                }))
+                for gram in set(self._bigrams(lowered)):
+                    self.postings.setdefault(gram, []).append(position)
+
+    @staticmethod
+    def _read(docs_dir, index_path, category, doc_id):
+        # 优先使用知识库索引中的路径，其次是 Docs/分类/文档ID.md
+        for relative in (index_path, os.path.join(category, f"{doc_id}.md")):
+            if relative and os.path.exists(os.path.join(docs_dir, relative)):
+                with open(os.path.join(docs_dir, relative), 'r', encoding='utf-8') as f:
+                    return f.read()
+        return None
+
+    @staticmethod
+    def _bigrams(text):
+        return (text[i:i + 2] for i in range(len(text) - 1))
+
+    def document(self, category, doc_id):
+        return self.contents.get((category, doc_id))
+
+    def search(self, keyword):
+        keyword = keyword.lower()
+        if len(keyword) < 2:
+            candidates = range(len(self.entries))
+        else:
+            candidates = None
+            # 从最短的倒排列表开始求交集
+            for posting in sorted((self.postings.get(gram, ()) for gram in set(self._bigrams(keyword))), key=len):
+                candidates = set(posting) if candidates is None else candidates.intersection(posting)
+                if not candidates:
+                    return []
+            candidates = sorted(candidates)
+        return [dict(self.entries[i][1]) for i in candidates if keyword in self.entries[i][0]]
+
+
+# 构建镜像时预先生成的文档库，语料清单一致时直接加载
+BAKED_INDEX = os.environ.get('UGUI_KB_BAKED_INDEX', os.path.join(SCRIPT_DIR, 'baked', 'store.pickle'))
+# KnowledgeStore的数据结构变化时递增，使旧的预生成文件失效
+STORE_VERSION = 2
+
+
+def corpus_manifest():
+    """文档、索引和配置文件的清单 {相对路径: 内容的SHA-256}
+
+    按内容而不是大小和修改时间计算：COPY和git checkout不保留修改时间，修改时间不能说明内容是否变化。
+    """
+    files = [os.path.join(SCRIPT_DIR, 'mcp_config.json'), INDEX_FILE]
+    for dir_path, dir_names, file_names in os.walk(DOCS_DIR):
+        dir_names.sort()
+        files.extend(os.path.join(dir_path, name) for name in sorted(file_names))
+    manifest = {}
+    for path in files:
+        if os.path.isfile(path):
+            relative = os.path.relpath(path, DOCS_DIR) if path.startswith(DOCS_DIR) else os.path.basename(path)
+            with open(path, 'rb') as f:
+                manifest[relative.replace(os.sep, '/')] = hashlib.sha256(f.read()).hexdigest()
+    return manifest
+
+
+def bake_store(output_path):
+    """构建文档库并连同语料清单一起保存，供Docker构建阶段调用"""
+    store = KnowledgeStore(config, DOCS_DIR, INDEX_FILE)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    baked = {'version': STORE_VERSION, 'manifest': corpus_manifest(), 'state': store.__dict__}
+    with open(output_path, 'wb') as f:
+        pickle.dump(baked, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return store
+
+
+def load_store():
+    """加载文档库：预生成文件的语料清单与当前文件的内容哈希一致时直接使用，否则重新构建"""
+    if os.path.exists(BAKED_INDEX):
+        try:
+            with open(BAKED_INDEX, 'rb') as f:
+                baked = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            baked = None
+        if baked and baked.get('version') == STORE_VERSION and baked.get('manifest') == corpus_manifest():
+            store = KnowledgeStore.__new__(KnowledgeStore)
+            store.__dict__.update(baked['state'])
+            return store, 'baked'
+    return KnowledgeStore(config, DOCS_DIR, INDEX_FILE), 'built'
+
+
+if __name__ == "__main__" and "--build-index" in sys.argv:
+    output = sys.argv[sys.argv.index("--build-index") + 1]
+    store = bake_store(output)
+    print(f"已生成文档库: {output}（{len(store.entries)} 篇文档）", file=sys.stderr)
+    sys.exit(0)
+
+# 启动时加载文档库，之后的工具调用不再读取文件
+load_started = time.perf_counter()
+store, store_source = load_store()
+# MCP通过标准输出通信，日志写到标准错误
+print(
+    f"已加载 {len(store.entries)} 篇文档（{'预生成' if store_source == 'baked' else '启动时构建'}，"
+    f"{(time.perf_counter() - load_started) * 1000:.0f} ms）: {os.path.abspath(DOCS_DIR)}",
+    file=sys.stderr,
+)
+
 # 定义工具：获取文档分类
 @mcp.tool()
 def categories() -> list:
@@ -220,14 +394,9 @@ def document(category: str, doc_id: str) -> str:
     if API_KEY and os.environ.get('UGUI_KB_API_KEY') != API_KEY:
         return {"error": "API密钥验证失败"}
     
-    # 实现文档读取逻辑
-    doc_path = os.path.join(SCRIPT_DIR, '..', 'Docs', category, f"{doc_id}.md")
-    if not os.path.exists(doc_path):
+    content = store.document(category, doc_id)
+    if content is None:
         return f"文档不存在: {category}/{doc_id}"
-    
-    with open(doc_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
     return content
 
 # 定义工具：搜索文档
@@ -242,22 +411,7 @@ def search(keyword: str) -> list:
     if API_KEY and os.environ.get('UGUI_KB_API_KEY') != API_KEY:
         return {"error": "API密钥验证失败"}
     
-    # 实现搜索逻辑
-    results = []
-    for category, info in config['categories'].items():
-        for doc_id in info['documents']:
-            doc_path = os.path.join(SCRIPT_DIR, '..', 'Docs', category, f"{doc_id}.md")
-            if os.path.exists(doc_path):
-                with open(doc_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                if keyword.lower() in content.lower():
-                    results.append({
-                        "category": category,
-                        "doc_id": doc_id,
-                        "title": info['documents'][doc_id],
-                        "preview": content[:200] + "..."
-                    })
-    return results
+    return store.search(keyword)
 
 # 定义工具：获取所有可视化图表
 @mcp.tool()
@@ -312,26 +466,38 @@ def create_dockerfile():
             console.print("[yellow]跳过创建 Dockerfile[/yellow]")
             return
     
-    dockerfile_content = '''FROM python:3.9-slim
+    dockerfile_content = '''# 构建阶段：预先生成文档库
+FROM python:3.9-slim AS builder
 
 WORKDIR /app
 
+RUN pip install --no-cache-dir fastmcp rich
+
 # 复制必要的文件
 COPY KnowledgeBase/ /app/KnowledgeBase/
 COPY Docs/ /app/Docs/
-COPY WebViewer/ /app/WebViewer/
+
+# 生成文档库和语料清单（文件内容的哈希），运行时内容一致即可直接加载
+RUN python KnowledgeBase/fastmcp/ugui_kb_server.py --build-index KnowledgeBase/fastmcp/baked/store.pickle
+
+# 运行阶段
+FROM python:3.9-slim
+
+WORKDIR /app
 
 # 安装依赖 - 使用pip安装所有必要的依赖
 RUN pip install --no-cache-dir fastmcp flask flask_cors markdown requests rich
 
-# 确保rich模块正确安装
-RUN pip install --no-cache-dir rich --upgrade
+# 从构建阶段复制文档库和文档
+COPY --from=builder /app/KnowledgeBase/ /app/KnowledgeBase/
+COPY --from=builder /app/Docs/ /app/Docs/
+COPY WebViewer/ /app/WebViewer/
 
 # 设置工作目录
 WORKDIR /app/KnowledgeBase
 
 # 命令将由smithery.yaml提供
-CMD ["python", "ugui_kb_server.py"]
+CMD ["python", "fastmcp/ugui_kb_server.py"]
 '''
     
     with open(dockerfile_path, 'w', encoding='utf-8') as f:
@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+UGUI知识库MCP客户端
+
+调用MCP服务器的工具（/mcp/tools/*），代替各个集成自己拼接HTTP请求：
+    - AsyncKnowledgeBaseClient  异步客户端（asyncio）
+    - KnowledgeBaseClient       同步客户端，在后台线程中运行异步客户端，供脚本使用
+
+传输只依赖标准库：
+    - 连接池（默认最多8个连接），HTTP/1.1 keep-alive复用连接；空闲超过4秒的连接不再复用
+      （uvicorn默认5秒关闭空闲连接），复用的连接已被服务器关闭时自动换一个新连接重试一次
+    - 同一轮事件循环中发起的并发调用合并为一个批量请求（/mcp/batch），参数相同的并发调用只发送一次；
+      服务器不支持批量调用时退回逐个请求
+    - 结果按 (工具, 参数) 缓存在本地，下次调用在请求体的etag字段中带上ETag，结果没有变化时服务器只返回
+      {"status": 304}，不再传输和解码结果。缓存的结果在调用之间共享，不要修改
+    - 安装了msgpack时请求MessagePack响应
+
+用法:
+    python KnowledgeBase/mcp_client.py categories
+    python KnowledgeBase/mcp_client.py documents UGUI
+    python KnowledgeBase/mcp_client.py document UGUI/UGUIArchitecture.md
+    python KnowledgeBase/mcp_client.py search "Canvas AND Rebuild" --facets
+    python KnowledgeBase/mcp_client.py --url http://kb.example.com:8000 --kb engine passages "合批" --budget 800
+
+库:
+    from mcp_client import KnowledgeBaseClient
+
+    with KnowledgeBaseClient('http://localhost:8000') as client:
+        client.search_documents('Canvas')
+        # 一个批量请求
+        client.batch([('get_document_content', {'path': path}) for path in paths])
+"""
+
+import os
+import ssl
+import sys
+import json
+import time
+import asyncio
+import argparse
+import functools
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEFAULT_URL = os.environ.get('MCP_SERVER_URL', f"http://localhost:{os.environ.get('MCP_PORT', '8000')}")
+
+# 连接池大小、空闲连接的最长复用时间（秒）和单个请求的超时时间（秒）
+MAX_CONNECTIONS = 8
+KEEPALIVE_IDLE = 4.0
+TIMEOUT = 30.0
+
+# 合并并发调用的等待时间（秒），0表示只合并同一轮事件循环中发起的调用；一个批量请求最多包含的调用数（与服务器的KB_BATCH_MAX_CALLS一致）
+BATCH_WINDOW = 0.0
+MAX_BATCH_CALLS = 64
+
+# 本地缓存的结果数量，0表示不缓存
+CACHE_SIZE = 256
+
+# 不缓存结果、参数相同的并发调用也不合并的工具（每次调用都需要在服务器上执行）
+UNCACHED_TOOLS = frozenset({'reload_index'})
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+
+class ClientError(Exception):
+    """无法连接服务器或响应无效"""
+
+
+class ToolError(ClientError):
+    """工具调用失败（服务器返回的错误状态码）"""
+
+    def __init__(self, tool, status, detail):
+        super().__init__(f"{tool}: {status} {detail}")
+        self.tool = tool
+        self.status = status
+        self.detail = detail
+
+
+class ServerBusy(ToolError):
+    """服务器准入控制拒绝了调用（503），可以在retry_after秒后重试"""
+
+    def __init__(self, tool, detail, retry_after=None):
+        super().__init__(tool, 503, detail)
+        self.retry_after = retry_after
+
+
+def _decode(body, content_type):
+    if not body:
+        return None
+    if msgpack is not None and content_type.startswith(MSGPACK_MEDIA_TYPE):
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
+
+
+class _Connection:
+    """一个HTTP/1.1连接"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+        self.idle_since = time.monotonic()
+
+    @classmethod
+    async def open(cls, host, port, ssl_context):
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        return cls(reader, writer)
+
+    def expired(self):
+        return time.monotonic() - self.idle_since > KEEPALIVE_IDLE or self.reader.at_eof()
+
+    async def request(self, method, target, headers, body):
+        """发送请求并读取完整响应，返回 (状态码, 响应头, 响应体)，响应头名称为小写"""
+        lines = [f'{method} {target} HTTP/1.1']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        lines.append(f'Content-Length: {len(body)}')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('服务器关闭了连接')
+        version, status = status_line.split(None, 2)[:2]
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        status = int(status)
+        if status in (204, 304) or 100 <= status < 200:
+            data = b''
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await self.reader.read()
+            self.reusable = False
+        if version == b'HTTP/1.0' or response_headers.get('connection', '').lower() == 'close':
+            self.reusable = False
+        return status, response_headers, data
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';', 1)[0], 16)
+            if size == 0:
+                # 跳过trailer
+                while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def close(self):
+        self.reusable = False
+        self.writer.close()
+
+
+class ConnectionPool:
+    """到一个服务器的HTTP/1.1连接池"""
+
+    def __init__(self, url, max_connections=MAX_CONNECTIONS, timeout=TIMEOUT):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"无效的服务器地址: {url}")
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.base_path = parts.path.rstrip('/')
+        self.host_header = parts.netloc.rpartition('@')[2]
+        self.ssl_context = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_connections)
+        self._idle = []
+
+    def _checkout(self):
+        """取出最近使用的空闲连接，丢弃已过期的"""
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection.expired():
+                return connection
+            connection.close()
+        return None
+
+    async def request(self, method, path, headers, body=b''):
+        headers = dict(headers, Host=self.host_header, Connection='keep-alive')
+        async with self._slots:
+            connection = self._checkout()
+            reused = connection is not None
+            while True:
+                if connection is None:
+                    connection = await asyncio.wait_for(
+                        _Connection.open(self.host, self.port, self.ssl_context), self.timeout)
+                try:
+                    response = await asyncio.wait_for(
+                        connection.request(method, self.base_path + path, headers, body), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    connection.close()
+                    # 复用的连接可能已被服务器关闭，换一个新连接重试一次
+                    if not reused:
+                        raise
+                    connection, reused = None, False
+                    continue
+                except BaseException:
+                    connection.close()
+                    raise
+                break
+            if connection.reusable:
+                connection.idle_since = time.monotonic()
+                self._idle.append(connection)
+            else:
+                connection.close()
+            return response
+
+    def close(self):
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
+
+
+class ResponseCache:
+    """工具结果的本地缓存：(工具, 参数) -> (ETag, 结果)，按最近最少使用淘汰"""
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # 服务器返回304、直接使用缓存结果的次数
+        self.hits = 0
+
+    @staticmethod
+    def key(tool, args):
+        return tool, json.dumps(args, sort_keys=True, ensure_ascii=False)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, etag, result):
+        self.entries[key] = (etag, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class _Call:
+    """等待发送或正在进行的一次调用，参数相同的并发调用共享"""
+
+    __slots__ = ('tool', 'args', 'key', 'future', 'cached')
+
+    def __init__(self, tool, args, key, future):
+        self.tool = tool
+        self.args = args
+        self.key = key
+        self.future = future
+        self.cached = None
+
+
+class AsyncKnowledgeBaseClient:
+    """异步客户端，需要在同一个事件循环中使用"""
+
+    def __init__(self, url=DEFAULT_URL, max_connections=MAX_CONNECTIONS, timeout=TIMEOUT,
+                 batch_window=BATCH_WINDOW, max_batch=MAX_BATCH_CALLS, cache_size=CACHE_SIZE):
+        self.url = url
+        self.pool = ConnectionPool(url, max_connections, timeout)
+        self.cache = ResponseCache(cache_size) if cache_size else None
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.accept = MSGPACK_MEDIA_TYPE if msgpack is not None else JSON_MEDIA_TYPE
+        # 服务器是否支持 /mcp/batch，返回404时改为逐个请求
+        self.batch_supported = True
+        # 等待发送的调用，以及所有未完成的调用（用于合并参数相同的调用）
+        self._pending = []
+        self._calls = {}
+        self._flush_handle = None
+        self._tasks = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.pool.close()
+
+    async def call(self, tool, args=None):
+        """调用工具并返回结果，参数为None的项不发送（使用服务器的默认值）"""
+        args = {name: value for name, value in (args or {}).items() if value is not None}
+        key = ResponseCache.key(tool, args)
+        call = self._calls.get(key) if tool not in UNCACHED_TOOLS else None
+        if call is None:
+            loop = asyncio.get_running_loop()
+            call = _Call(tool, args, key, loop.create_future())
+            if tool not in UNCACHED_TOOLS:
+                self._calls[key] = call
+                call.future.add_done_callback(lambda _: self._calls.pop(key, None))
+            self._pending.append(call)
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                if self.batch_window > 0:
+                    self._flush_handle = loop.call_later(self.batch_window, self._flush)
+                else:
+                    self._flush_handle = loop.call_soon(self._flush)
+        # 一个调用方取消时不影响共享该调用的其他调用方
+        return await asyncio.shield(call.future)
+
+    async def batch(self, calls, return_exceptions=False):
+        """并发调用多个工具，calls为 [(工具, 参数)]，结果按顺序返回"""
+        return await asyncio.gather(*(self.call(tool, args) for tool, args in calls),
+                                    return_exceptions=return_exceptions)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self.max_batch):
+            task = asyncio.ensure_future(self._send(pending[start:start + self.max_batch]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, calls):
+        for call in calls:
+            if self.cache is not None and call.tool not in UNCACHED_TOOLS:
+                call.cached = self.cache.get(call.key)
+        try:
+            if len(calls) > 1 and self.batch_supported:
+                await self._send_batch(calls)
+            else:
+                await asyncio.gather(*(self._send_one(call) for call in calls))
+        except Exception as e:
+            error = e if isinstance(e, ClientError) else ClientError(f"请求 {self.url} 失败: {e!r}")
+            for call in calls:
+                if not call.future.done():
+                    call.future.set_exception(error)
+
+    async def _post(self, path, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = dict(headers or {}, Accept=self.accept)
+        headers['Content-Type'] = JSON_MEDIA_TYPE
+        return await self.pool.request('POST', path, headers, body)
+
+    async def _send_one(self, call):
+        payload = {'args': call.args}
+        if call.cached:
+            payload['etag'] = call.cached[0]
+        try:
+            status, response_headers, body = await self._post(f'/mcp/tools/{call.tool}', payload)
+            data = _decode(body, response_headers.get('content-type', ''))
+        except Exception as e:
+            if not call.future.done():
+                call.future.set_exception(ClientError(f"请求 {self.url} 失败: {e!r}"))
+            return
+        if status == 200:
+            # 结果没有变化时响应体为 {"status": 304, "etag"}
+            self._settle(call, data.get('status', 200), data.get('result'), response_headers.get('etag'))
+            return
+        detail = data.get('detail') if isinstance(data, dict) else data
+        try:
+            retry_after = int(response_headers['retry-after'])
+        except (KeyError, ValueError):
+            retry_after = None
+        self._settle(call, status, detail, None, retry_after)
+
+    async def _send_batch(self, calls):
+        payload = {'calls': []}
+        for call in calls:
+            entry = {'tool': call.tool, 'args': call.args}
+            if call.cached:
+                entry['etag'] = call.cached[0]
+            payload['calls'].append(entry)
+        status, response_headers, body = await self._post('/mcp/batch', payload)
+        if status in (404, 405):
+            # 旧版本的服务器没有批量接口
+            self.batch_supported = False
+            await asyncio.gather(*(self._send_one(call) for call in calls))
+            return
+        data = _decode(body, response_headers.get('content-type', ''))
+        if status != 200:
+            detail = data.get('detail') if isinstance(data, dict) else data
+            raise ToolError('batch', status, detail)
+        for call, item in zip(calls, data['result']):
+            if item['status'] in (200, 304):
+                self._settle(call, item['status'], item.get('result'), item.get('etag'))
+            else:
+                self._settle(call, item['status'], item.get('detail'), None)
+
+    def _settle(self, call, status, value, etag, retry_after=None):
+        """根据状态码完成调用：200保存到缓存，304使用缓存的结果，其他为错误"""
+        if call.future.done():
+            return
+        if status == 304 and call.cached:
+            self.cache.hits += 1
+            call.future.set_result(call.cached[1])
+        elif status == 200:
+            if etag and self.cache is not None and call.tool not in UNCACHED_TOOLS:
+                self.cache.put(call.key, etag, value)
+            call.future.set_result(value)
+        elif status == 503:
+            call.future.set_exception(ServerBusy(call.tool, value, retry_after))
+        else:
+            call.future.set_exception(ToolError(call.tool, status, value))
+
+    # 工具，参数与 /mcp/config 中的inputSchema相同，kb为None时使用服务器的默认行为
+    async def get_categories(self, kb=None):
+        return await self.call('get_categories', {'kb': kb})
+
+    async def get_documents(self, category, kb=None):
+        return await self.call('get_documents', {'category': category, 'kb': kb})
+
+    async def get_document_content(self, path, kb=None):
+        return await self.call('get_document_content', {'path': path, 'kb': kb})
+
+    async def search_documents(self, query, collapse=None, facets=None, filters=None, kb=None):
+        return await self.call('search_documents', {'query': query, 'collapse': collapse, 'facets': facets,
+                                                    'filters': filters, 'kb': kb})
+
+    async def retrieve_passages(self, query, budget=None, filters=None, kb=None):
+        return await self.call('retrieve_passages', {'query': query, 'budget': budget, 'filters': filters, 'kb': kb})
+
+    async def find_symbol(self, symbol, prefix=None, kb=None):
+        return await self.call('find_symbol', {'symbol': symbol, 'prefix': prefix, 'kb': kb})
+
+    async def get_section(self, path, section=None, line=None, kb=None):
+        return await self.call('get_section', {'path': path, 'section': section, 'line': line, 'kb': kb})
+
+    async def suggest(self, prefix, limit=None, kb=None):
+        return await self.call('suggest', {'prefix': prefix, 'limit': limit, 'kb': kb})
+
+    async def get_duplicate_clusters(self, kb=None):
+        return await self.call('get_duplicate_clusters', {'kb': kb})
+
+    async def list_knowledge_bases(self):
+        return await self.call('list_knowledge_bases')
+
+    async def reload_index(self, kb=None):
+        return await self.call('reload_index', {'kb': kb})
+
+
+def _synchronous(name):
+    """把异步客户端的方法包装为在后台事件循环中执行的同步方法"""
+    method = getattr(AsyncKnowledgeBaseClient, name)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self._run(getattr(self._client, name)(*args, **kwargs))
+    return wrapper
+
+
+class KnowledgeBaseClient:
+    """同步客户端：在后台线程中运行事件循环和异步客户端
+
+    可以在多个线程中同时使用，不同线程的并发调用同样会合并为批量请求
+    （需要设置batch_window，例如0.002）。参数与AsyncKnowledgeBaseClient相同。
+    """
+
+    def __init__(self, url=DEFAULT_URL, **options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='kb-client', daemon=True)
+        self._thread.start()
+        self._client = self._run(self._create(url, options))
+
+    @staticmethod
+    async def _create(url, options):
+        return AsyncKnowledgeBaseClient(url, **options)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    @property
+    def cache(self):
+        return self._client.cache
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    call = _synchronous('call')
+    batch = _synchronous('batch')
+    get_categories = _synchronous('get_categories')
+    get_documents = _synchronous('get_documents')
+    get_document_content = _synchronous('get_document_content')
+    search_documents = _synchronous('search_documents')
+    retrieve_passages = _synchronous('retrieve_passages')
+    find_symbol = _synchronous('find_symbol')
+    get_section = _synchronous('get_section')
+    suggest = _synchronous('suggest')
+    get_duplicate_clusters = _synchronous('get_duplicate_clusters')
+    list_knowledge_bases = _synchronous('list_knowledge_bases')
+    reload_index = _synchronous('reload_index')
+
+
+def _print_json(value):
+    print(json.dumps(value, ensure_ascii=False, indent=2))
+
+
+def main():
+    """主函数：命令行访问MCP服务器"""
+    parser = argparse.ArgumentParser(description='UGUI知识库MCP客户端')
+    parser.add_argument('--url', default=DEFAULT_URL, help=f'MCP服务器地址（MCP_SERVER_URL），默认为 {DEFAULT_URL}')
+    parser.add_argument('--kb', help='知识库名称')
+    parser.add_argument('--json', action='store_true', help='输出工具返回的JSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('categories', help='所有文档分类')
+    commands.add_parser('documents', help='分类下的文档').add_argument('category')
+    commands.add_parser('document', help='文档内容').add_argument('path')
+    search = commands.add_parser('search', help='搜索文档')
+    search.add_argument('query')
+    search.add_argument('--facets', action='store_true', help='同时返回分面统计')
+    search.add_argument('--category', action='append', help='只搜索指定分类（可以重复）')
+    passages = commands.add_parser('passages', help='按token预算检索段落')
+    passages.add_argument('query')
+    passages.add_argument('--budget', type=int)
+    symbol = commands.add_parser('symbol', help='查找C#符号')
+    symbol.add_argument('symbol')
+    symbol.add_argument('--prefix', action='store_true')
+    section = commands.add_parser('section', help='文档章节或源码成员')
+    section.add_argument('path')
+    section.add_argument('section')
+    commands.add_parser('suggest', help='输入补全').add_argument('prefix')
+    commands.add_parser('kbs', help='挂载的知识库')
+    commands.add_parser('reload', help='重建索引')
+    args = parser.parse_args()
+
+    try:
+        with KnowledgeBaseClient(args.url) as client:
+            if args.command == 'categories':
+                result = client.get_categories(kb=args.kb)
+            elif args.command == 'documents':
+                result = client.get_documents(args.category, kb=args.kb)
+            elif args.command == 'document':
+                result = client.get_document_content(args.path, kb=args.kb)
+            elif args.command == 'search':
+                filters = {'category': args.category} if args.category else None
+                result = client.search_documents(args.query, facets=args.facets or None, filters=filters, kb=args.kb)
+            elif args.command == 'passages':
+                result = client.retrieve_passages(args.query, budget=args.budget, kb=args.kb)
+            elif args.command == 'symbol':
+                result = client.find_symbol(args.symbol, prefix=args.prefix or None, kb=args.kb)
+            elif args.command == 'section':
+                result = client.get_section(args.path, section=args.section, kb=args.kb)
+            elif args.command == 'suggest':
+                result = client.suggest(args.prefix, kb=args.kb)
+            elif args.command == 'kbs':
+                result = client.list_knowledge_bases()
+            else:
+                result = client.reload_index(kb=args.kb)
+    except (ClientError, ValueError) as e:
+        print(f"错误: {e}")
+        return 1
+
+    if args.json:
+        _print_json(result)
+    elif args.command in ('categories', 'documents'):
+        for item in result:
+            print(item['path'] if isinstance(item, dict) else item)
+    elif args.command == 'document':
+        print(result)
+    elif args.command == 'search':
+        results = result['results'] if args.facets else result
+        print(f"{len(results)} 个结果")
+        for item in results:
+            print(f"  [{item['score']:.2f}] {item['path']}  {item['section']}")
+        if args.facets:
+            for facet, values in result['facets'].items():
+                print(f"{facet}: " + '，'.join(f"{value['value']} ({value['count']})" for value in values))
+    elif args.command == 'passages':
+        for passage in result['passages']:
+            print(f"--- {passage['path']}:{passage['start_line']}-{passage['end_line']}  {passage['section']}")
+            print(passage['text'])
+    elif args.command == 'section':
+        print(result.get('text', ''))
+    else:
+        _print_json(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+WebViewer构建脚本
+
+1. 将Docs目录下的Markdown文档预渲染为HTML片段（增量构建，只重新渲染内容变化的文件），
+   页面直接加载片段，无需在浏览器中解析Markdown。
+2. 将查看器页面引用的本地资源（文档片段、脚本、样式等）复制为带内容哈希的文件名，
+   并重写页面中的引用，输出到dist目录。内容不变则URL不变，配合server.py的
+   Cache-Control: immutable，浏览器重复访问时无需再发起网络请求。
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import argparse
+
+# 目录配置
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPT_DIR)
+DOCS_DIR = os.path.join(ROOT_DIR, 'Docs')
+DIST_DIR = os.path.join(SCRIPT_DIR, 'dist')
+ASSETS_DIR = os.path.join(DIST_DIR, 'assets')
+FRAGMENTS_DIR = os.path.join(DIST_DIR, 'fragments')
+VENDOR_DIR = os.path.join(SCRIPT_DIR, 'vendor')
+
+# 随仓库提交的第三方库，固定版本；页面只从vendor目录加载，不访问CDN
+MARKED_VERSION = '4.3.0'
+MARKED_URL = f'https://cdn.jsdelivr.net/npm/marked@{MARKED_VERSION}/marked.min.js'
+MARKED_PATH = os.path.join(VENDOR_DIR, 'marked.min.js')
+# marked.min.js开头的版权注释中的版本标识
+MARKED_BANNER = f'marked v{MARKED_VERSION}'
+
+# 哈希长度（十六进制字符数）
+HASH_LENGTH = 12
+
+# 预渲染使用的Markdown扩展，修改后所有片段都会重新渲染
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'toc', 'sane_lists']
+FRAGMENT_MANIFEST = 'manifest.json'
+
+# 页面中需要哈希化的本地资源引用，例如 src="vendor/marked.min.js" 或 file: '../Docs/UGUI/xxx.md'
+ASSET_REF_PATTERN = re.compile(
+    r"""(['"])((?!https?:|//|data:)[^'"\s<>]+?\.(?:md|js|css|json|png|jpg|jpeg|gif|svg))\1"""
+)
+
+
+def content_hash(data):
+    """计算内容哈希"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(file_path, data):
+    """生成带内容哈希的文件名，例如 marked.min.3f2a9c1b0d4e.js"""
+    stem, ext = os.path.splitext(os.path.basename(file_path))
+    return f'{stem}.{content_hash(data)}{ext}'
+
+
+def update_marked():
+    """重新下载固定版本的marked.js到vendor目录，仅在升级或修复提交的文件时使用"""
+    from urllib.request import urlopen
+
+    print(f"正在下载 marked@{MARKED_VERSION} ...")
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    with urlopen(MARKED_URL, timeout=30) as response:
+        data = response.read()
+    with open(MARKED_PATH, 'wb') as f:
+        f.write(data)
+    print(f"已保存: {os.path.relpath(MARKED_PATH, ROOT_DIR)}")
+    return MARKED_PATH
+
+
+def check_marked():
+    """检查vendor目录中的marked.js存在且版本与MARKED_VERSION一致，否则返回错误信息"""
+    rel_path = os.path.relpath(MARKED_PATH, ROOT_DIR)
+    if not os.path.exists(MARKED_PATH):
+        return f"缺少 {rel_path}，请运行 build.py --update-vendor 下载 marked@{MARKED_VERSION} 并提交"
+    with open(MARKED_PATH, 'r', encoding='utf-8', errors='replace') as f:
+        banner = f.read(200)
+    if MARKED_BANNER not in banner:
+        return f"{rel_path} 不是 marked@{MARKED_VERSION}，请运行 build.py --update-vendor 重新下载"
+    return None
+
+
+def renderer_signature():
+    """预渲染器签名，渲染器版本或扩展变化时使缓存的片段失效"""
+    import markdown
+    return f"markdown-{markdown.__version__};{','.join(MARKDOWN_EXTENSIONS)}"
+
+
+def prerender_docs(docs_dir=DOCS_DIR, out_dir=FRAGMENTS_DIR, force=False):
+    """将文档目录下的所有Markdown文件预渲染为HTML片段
+
+    manifest.json记录每个源文件的内容哈希，只有哈希变化的文件才会重新渲染。
+    返回 {源文件绝对路径: 片段绝对路径} 映射。
+    """
+    import markdown
+
+    docs_dir = os.path.abspath(docs_dir)
+    manifest_path = os.path.join(out_dir, FRAGMENT_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    signature = renderer_signature()
+    previous = manifest.get('files', {}) if manifest.get('renderer') == signature else {}
+
+    files = {}
+    fragments = {}
+    rendered = 0
+    md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    for dir_path, _, file_names in os.walk(docs_dir):
+        for file_name in sorted(file_names):
+            if not file_name.endswith('.md'):
+                continue
+            source_path = os.path.join(dir_path, file_name)
+            rel_path = os.path.relpath(source_path, docs_dir).replace(os.sep, '/')
+            fragment_rel = rel_path[:-len('.md')] + '.html'
+            fragment_path = os.path.join(out_dir, fragment_rel)
+
+            with open(source_path, 'rb') as f:
+                data = f.read()
+            source_hash = hashlib.sha256(data).hexdigest()
+
+            entry = previous.get(rel_path)
+            if not entry or entry['hash'] != source_hash or not os.path.exists(fragment_path):
+                html = md.reset().convert(data.decode('utf-8'))
+                os.makedirs(os.path.dirname(fragment_path), exist_ok=True)
+                with open(fragment_path, 'w', encoding='utf-8') as f:
+                    f.write(html)
+                rendered += 1
+
+            files[rel_path] = {'hash': source_hash, 'fragment': fragment_rel}
+            fragments[os.path.normpath(source_path)] = fragment_path
+
+    # 删除源文件已不存在的片段
+    for rel_path, entry in previous.items():
+        if rel_path not in files:
+            stale_path = os.path.join(out_dir, entry['fragment'])
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'renderer': signature, 'files': files}, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    print(f"预渲染完成: {rendered} 个文件已重新渲染，{len(files) - rendered} 个文件未变化")
+    return fragments
+
+
+def publish_asset(source_path, manifest):
+    """将资源以哈希文件名复制到assets目录，返回相对dist目录的URL"""
+    source_key = os.path.relpath(source_path, ROOT_DIR).replace(os.sep, '/')
+    if source_key in manifest:
+        return manifest[source_key]
+
+    with open(source_path, 'rb') as f:
+        data = f.read()
+
+    name = hashed_name(source_path, data)
+    target_path = os.path.join(ASSETS_DIR, name)
+    if not os.path.exists(target_path):
+        with open(target_path, 'wb') as f:
+            f.write(data)
+
+    manifest[source_key] = f'assets/{name}'
+    return manifest[source_key]
+
+
+def rewrite_page(page_path, manifest, fragments=None):
+    """重写页面中的本地资源引用，返回新的页面内容
+
+    如果Markdown文档已预渲染，引用会被替换为对应HTML片段的哈希URL。
+    """
+    with open(page_path, 'r', encoding='utf-8') as f:
+        html = f.read()
+
+    page_dir = os.path.dirname(page_path)
+
+    def replace(match):
+        quote, ref = match.group(1), match.group(2)
+        source_path = os.path.normpath(os.path.join(page_dir, ref))
+        if not os.path.isfile(source_path):
+            return match.group(0)
+        if fragments and source_path in fragments:
+            source_path = fragments[source_path]
+        return f'{quote}{publish_asset(source_path, manifest)}{quote}'
+
+    return ASSET_REF_PATTERN.sub(replace, html)
+
+
+def build_assets(fragments=None):
+    """构建所有查看器页面"""
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+
+    manifest = {}
+    pages = sorted(
+        name for name in os.listdir(SCRIPT_DIR) if name.endswith('.html')
+    )
+    for name in pages:
+        html = rewrite_page(os.path.join(SCRIPT_DIR, name), manifest, fragments)
+        with open(os.path.join(DIST_DIR, name), 'w', encoding='utf-8') as f:
+            f.write(html)
+        print(f"已构建页面: {name}")
+
+    # 清理不再被引用的旧哈希文件
+    referenced = {os.path.basename(url) for url in manifest.values()}
+    for name in os.listdir(ASSETS_DIR):
+        if name not in referenced:
+            os.remove(os.path.join(ASSETS_DIR, name))
+
+    with open(os.path.join(DIST_DIR, 'asset-manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    print(f"共发布 {len(manifest)} 个资源到 {os.path.relpath(ASSETS_DIR, ROOT_DIR)}")
+    return manifest
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='WebViewer构建工具')
+    parser.add_argument('--clean', action='store_true', help='构建前清空dist目录')
+    parser.add_argument('--update-vendor', action='store_true', help='重新下载vendor目录中固定版本的第三方库')
+    parser.add_argument('--force', action='store_true', help='忽略manifest，重新渲染所有文档')
+    parser.add_argument('--prerender-only', action='store_true', help='只预渲染文档，不构建页面')
+    parser.add_argument('--docs-dir', default=DOCS_DIR, help='Markdown文档目录')
+    parser.add_argument('--out-dir', default=FRAGMENTS_DIR, help='HTML片段输出目录')
+    args = parser.parse_args()
+
+    if args.clean and os.path.exists(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    fragments = prerender_docs(args.docs_dir, args.out_dir, force=args.force)
+    if args.prerender_only:
+        return
+
+    if args.update_vendor:
+        update_marked()
+    error = check_marked()
+    if error:
+        parser.exit(1, f"错误: {error}\n")
+
+    build_assets(fragments)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,28 @@
 import http.server
 import socketserver
 import os
+import re
 import sys
 
 # 默认端口
 PORT = 8080
 
+# build.py输出的带内容哈希的资源，例如 /WebViewer/dist/assets/marked.min.3f2a9c1b0d4e.js
+HASHED_ASSET_PATTERN = re.compile(r'^/WebViewer/dist/assets/[^/]+\.[0-9a-f]{12}\.[A-Za-z0-9]+$')
+
+class CachingRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """为哈希资源添加长期缓存头的请求处理器"""
+
+    def end_headers(self):
+        path = self.path.split('?', 1)[0]
+        if HASHED_ASSET_PATTERN.match(path):
+            # 文件名包含内容哈希，内容变化时URL随之变化，可以永久缓存
+            self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        else:
+            # 页面等非哈希资源每次都需要重新验证
+            self.send_header('Cache-Control', 'no-cache')
+        super().end_headers()
+
 def run_server(port=PORT):
     """运行HTTP服务器"""
     # 获取当前脚本所在目录
@@ -16,10 +33,12 @@ def run_server(port=PORT):
     # 将工作目录设置为项目根目录（即Assets的上一级目录）
     os.chdir(os.path.join(current_dir, '..'))
     
-    handler = http.server.SimpleHTTPRequestHandler
+    handler = CachingRequestHandler
     with socketserver.TCPServer(("", port), handler) as httpd:
         print(f"服务器运行在 http://localhost:{port}/")
         print("在浏览器中访问: http://localhost:{}/WebViewer/UGUIArchitectureViewer.html".format(port))
+        if os.path.isdir(os.path.join('WebViewer', 'dist')):
+            print("构建版本（带缓存）: http://localhost:{}/WebViewer/dist/UGUIArchitectureViewer.html".format(port))
         print("按 Ctrl+C 停止服务器")
         httpd.serve_forever()
 